@@ -3,15 +3,25 @@ from rich.panel import Panel
 from rich.console import Console
 from rich import print as rprint
 from flask_cors import CORS
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from utils.embedding_pdf import PDFEmbedder
 from utils.crop import crop_image_left_side
-from utils.translate import translate_text, TranslationError, SUPPORTED_LANGUAGES
+from utils.translate import translate_text_cached, translation_cache, translation_chain, TranslationError, SUPPORTED_LANGUAGES
+from utils.translation_batch import translate_segments
 from utils.chatlog import ChatLogger
+from utils.chat_search import ChatSearchIndex
+from utils.index_store import save_and_hash
+from utils.ingestion_jobs import IngestionJobQueue
+from utils.pretranslate import PretranslationQueue, PretranslationStore
+from utils.paper_digest import PaperDigester
 import os
 import datetime
 import base64
 import json
+import time
+import math
+import tempfile
+import threading
 from utils.Agent import ResearchAgent
 
 # RAG Function狀態
@@ -44,10 +54,42 @@ if not os.path.exists(DIALOG_DIR):
     os.makedirs(DIALOG_DIR)
 
 # PDFEmbedder instance
-embedder = PDFEmbedder()
+embedder = PDFEmbedder(
+    batch_size=int(os.getenv('EMBED_BATCH_SIZE', 32)),
+    max_concurrency=int(os.getenv('EMBED_MAX_CONCURRENCY', 4)),
+    index_type=os.getenv('FAISS_INDEX_TYPE', 'flat')
+)
+
+# Batch translation limits
+TRANSLATE_BATCH_MAX_SEGMENTS = int(os.getenv('TRANSLATE_BATCH_MAX_SEGMENTS', 200))
+TRANSLATE_BATCH_WORKERS = int(os.getenv('TRANSLATE_BATCH_WORKERS', 4))
+
+# Upload-time pre-translation (optional)
+PRETRANSLATE_ON_UPLOAD = os.getenv(
+    'PRETRANSLATE_ON_UPLOAD', 'false').lower() in ('1', 'true', 'yes')
+pretranslation_store = PretranslationStore(embedder.index_store)
+pretranslation_queue = PretranslationQueue(
+    pretranslation_store,
+    languages=[lang.strip() for lang in os.getenv(
+        'PRETRANSLATE_LANGUAGES', ','.join(SUPPORTED_LANGUAGES)).split(',') if lang.strip()]
+)
+
+# Background ingestion worker pool
+# 建立 index 後以研究用 LLM 產生論文摘要，供階層式檢索使用
+PAPER_DIGEST_ON_INGEST = os.getenv(
+    'PAPER_DIGEST_ON_INGEST', 'true').lower() in ('1', 'true', 'yes')
+paper_digester = PaperDigester(embedder.index_store) if PAPER_DIGEST_ON_INGEST else None
+ingestion_queue = IngestionJobQueue(
+    embedder, max_workers=int(os.getenv('INGEST_WORKERS', 2)),
+    on_complete=(lambda job: pretranslation_queue.submit(job.content_hash, job.pdf_path))
+    if PRETRANSLATE_ON_UPLOAD else None,
+    digester=paper_digester)
+
+# 檢查檔案與送出工作之間持有，避免兩個上傳同時取代同一個 PDF
+upload_lock = threading.Lock()
 
 # Initialize ChatLogger
-chat_logger = ChatLogger(DIALOG_DIR)
+chat_logger = ChatLogger(DIALOG_DIR, search_index=ChatSearchIndex())
 
 # Initialize the Research Agent
 agent = ResearchAgent()
@@ -64,63 +106,93 @@ def upload_file():
 
     if file and file.filename.endswith('.pdf'):
         filename = os.path.join(UPLOAD_FOLDER, file.filename)
+        # 每個上傳使用唯一的臨時檔名，同名檔案同時上傳時不會互相覆寫
+        temp_fd, temp_filename = tempfile.mkstemp(
+            dir=UPLOAD_FOLDER, prefix='upload_', suffix='.pdf.tmp')
+        os.close(temp_fd)
 
-        # 檢查檔案是否已存在
-        if os.path.exists(filename):
-            try:
-                # 儲存新上傳的檔案到臨時位置
-                temp_filename = os.path.join(
-                    UPLOAD_FOLDER, 'temp_' + file.filename)
-                file.save(temp_filename)
-
-                # 比較檔案內容
-                import filecmp
-                if filecmp.cmp(filename, temp_filename, shallow=False):
-                    # 如果內容相同，刪除臨時檔案
+        try:
+            # 儲存上傳檔案到臨時位置，同時以串流方式計算內容雜湊
+            content_hash = save_and_hash(file.stream, temp_filename)
+
+            with upload_lock:
+                # 檔案已存在且內容雜湊相同時不需重新處理
+                if (os.path.exists(filename) and
+                        embedder.index_store.get_hash(file.filename) == content_hash):
                     os.remove(temp_filename)
-                    return jsonify({
+                    response = {
                         'message': 'File already exists and content is identical',
                         'filename': file.filename,
                         'status': 'exists'
-                    }), 200
-                else:
-                    # 如果內容不同，使用新檔案取代舊檔案
-                    os.replace(temp_filename, filename)
-            except Exception as e:
-                if os.path.exists(temp_filename):
+                    }
+                    if paper_digester is not None and not embedder.index_store.has_digest(content_hash):
+                        # 較早建立的 index 沒有論文摘要，送出工作補上（建立 index 的階段會略過）
+                        job, _ = ingestion_queue.submit(filename, content_hash)
+                        response['jobId'] = job.id
+                    elif PRETRANSLATE_ON_UPLOAD:
+                        pretranslation_queue.submit(content_hash, filename)
+                    return jsonify(response), 200
+
+                # 仍有工作在讀取舊內容時不取代檔案，由用戶端稍後重試
+                running_job = ingestion_queue.find_active(pdf_path=filename)
+                if running_job is not None:
                     os.remove(temp_filename)
-                console.print(Panel(
-                    f"[red]Error during file comparison:[/red]\n"
-                    f"[yellow]{str(e)}[/yellow]",
-                    title="File Comparison Error",
-                    border_style="red"
-                ))
-        else:
-            # 如果檔案不存在，直接儲存
-            file.save(filename)
-
-        rprint(f"[bold green]Starting embedding process...[/bold green]")
-        # Embedding process
-        try:
-            embd_time = embedder.create_embeddings(filename, force=False)
-            if embd_time:
-                print("\nEmbedding process completed successfully!")
-                print(f"Total processing time: {
-                    embedder._format_time(embd_time['total'])}")
-        except FileNotFoundError as e:
-            print(f"Error: {e}")
+                    return jsonify({
+                        'error': 'A previous upload of this file is still being processed',
+                        'filename': file.filename,
+                        'status': 'processing',
+                        'jobId': running_job.id
+                    }), 409
+
+                # 新檔案或內容不同時，以新檔案取代舊檔案
+                os.replace(temp_filename, filename)
+
+                # 將 embedding 流程送入背景工作佇列，立即返回工作 ID
+                job, created = ingestion_queue.submit(filename, content_hash)
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            console.print(Panel(
+                f"[red]Error during file hashing:[/red]\n"
+                f"[yellow]{str(e)}[/yellow]",
+                title="File Comparison Error",
+                border_style="red"
+            ))
+            return jsonify({'error': f'Error saving file: {str(e)}'}), 500
+
+        rprint(f"[bold green]{'Queued' if created else 'Joined'} ingestion job "
+               f"{job.id} for {file.filename}[/bold green]")
 
         return jsonify({
-            'message': 'File uploaded successfully and processed',
+            'message': 'File uploaded successfully and queued for processing',
             'filename': file.filename,
-            'status': 'uploaded'
-        }), 200
+            'status': 'queued',
+            'jobId': job.id,
+            'contentHash': content_hash
+        }), 202
 
     return jsonify({'error': 'Invalid file type'}), 400
 
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+
+def lookup_pretranslation(pdf_filename, target_language, text, page_number):
+    """查詢選取文字所在段落的預翻譯結果，沒有預翻譯時返回 None"""
+    if not pdf_filename:
+        return None
+    content_hash = embedder.index_store.get_hash(pdf_filename)
+    if content_hash is None:
+        return None
+    page_hint = page_number if isinstance(page_number, int) else None
+    return pretranslation_store.lookup(content_hash, target_language, text, page_hint)
+
+
 @app.route('/selected-text', methods=['POST'])
 def handle_selected_text():
     try:
@@ -165,6 +237,7 @@ def handle_selected_text():
 
         page_number = data.get('pageNumber', 'unknown')
         target_language = data.get('targetLanguage', 'zh-TW')
+        pdf_filename = data.get('pdfFilename')
 
         # 5. 語言支援驗證
         if target_language not in SUPPORTED_LANGUAGES:
@@ -177,7 +250,16 @@ def handle_selected_text():
 
         # 6. 執行翻譯
         try:
-            translated_text = translate_text(selected_text, target_language)
+            translate_start = time.perf_counter()
+            # 先查詢上傳時預先翻譯的段落，再查詢翻譯快取或即時翻譯
+            pretranslated = lookup_pretranslation(
+                pdf_filename, target_language, selected_text, page_number)
+            if pretranslated is not None:
+                translated_text, cache_tier = pretranslated['translatedText'], 'pretranslated'
+            else:
+                translated_text, cache_tier = translate_text_cached(
+                    selected_text, target_language)
+            translate_time = time.perf_counter() - translate_start
 
             # 輸出詳細日誌
             console.print(Panel(
@@ -185,7 +267,9 @@ def handle_selected_text():
                 f"[yellow]{selected_text}[/yellow]\n\n"
                 f"[cyan]目標語言:[/cyan] [green]{target_language}[/green]\n\n"
                 f"[cyan]翻譯結果:[/cyan]\n"
-                f"[blue]{translated_text}[/blue]",
+                f"[blue]{translated_text}[/blue]\n\n"
+                f"[cyan]快取:[/cyan] {cache_tier or '未命中'}"
+                f"（{translate_time * 1000:.2f} ms）",
                 title="翻譯詳情",
                 border_style="green"
             ))
@@ -196,6 +280,10 @@ def handle_selected_text():
                 'translatedText': translated_text,
                 'targetLanguage': target_language,
                 'pageNumber': page_number,
+                'cached': cache_tier is not None,
+                'cacheTier': cache_tier,
+                'paragraphText': pretranslated['originalText']
+                if pretranslated and not pretranslated['exact'] else None,
                 'message': '文本已成功翻譯'
             }), 200
 
@@ -212,11 +300,16 @@ def handle_selected_text():
             console.print(f"[red]錯誤：翻譯服務錯誤 - {error_msg}[/red]")
 
             if "服務暫時不可用" in error_msg:
-                return jsonify({
+                response = jsonify({
                     'status': 'error',
                     'error_code': 'SERVICE_UNAVAILABLE',
-                    'message': error_msg
-                }), 503
+                    'message': error_msg,
+                    'retryAfter': e.retry_after
+                })
+                # 斷路器開啟時告知用戶端何時再試，而不是在請求中等待重試
+                if e.retry_after is not None:
+                    response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+                return response, 503
 
             return jsonify({
                 'status': 'error',
@@ -245,6 +338,67 @@ def handle_selected_text():
         }), 500
 
 
+@app.route('/translate-batch', methods=['POST'])
+def handle_translate_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({
+            'status': 'error',
+            'error_code': 'INVALID_CONTENT_TYPE',
+            'message': '請求必須是 JSON 格式'
+        }), 415
+
+    segments = data.get('segments')
+    if (not isinstance(segments, list) or not segments
+            or not all(isinstance(segment, str) for segment in segments)):
+        return jsonify({
+            'status': 'error',
+            'error_code': 'MISSING_SEGMENTS',
+            'message': 'segments 必須是非空的字串列表'
+        }), 400
+
+    if len(segments) > TRANSLATE_BATCH_MAX_SEGMENTS:
+        return jsonify({
+            'status': 'error',
+            'error_code': 'TOO_MANY_SEGMENTS',
+            'message': f'片段數量超過限制（最多{TRANSLATE_BATCH_MAX_SEGMENTS}個）'
+        }), 400
+
+    target_language = data.get('targetLanguage', 'zh-TW')
+    if target_language not in SUPPORTED_LANGUAGES:
+        return jsonify({
+            'status': 'error',
+            'error_code': 'UNSUPPORTED_LANGUAGE',
+            'message': f'不支援的目標語言。支援的語言：{", ".join(SUPPORTED_LANGUAGES.keys())}'
+        }), 400
+
+    start_time = time.perf_counter()
+    outcome = translate_segments(segments, target_language, translation_chain,
+                                 max_workers=TRANSLATE_BATCH_WORKERS)
+    results = [{**result, 'originalText': segments[result['index']]}
+               for result in outcome['results']]
+    failed = sum(1 for result in results if result['error'])
+
+    console.print(Panel(
+        f"[cyan]片段數量:[/cyan] {len(segments)}\n"
+        f"[cyan]目標語言:[/cyan] [green]{target_language}[/green]\n"
+        f"[cyan]快取命中:[/cyan] {sum(1 for result in results if result['cached'])}\n"
+        f"[cyan]翻譯請求:[/cyan] {outcome['requests']}\n"
+        f"[cyan]失敗片段:[/cyan] {failed}\n"
+        f"[cyan]耗時:[/cyan] {(time.perf_counter() - start_time) * 1000:.2f} ms",
+        title="批次翻譯",
+        border_style="green" if not failed else "yellow"
+    ))
+
+    return jsonify({
+        'status': 'success' if not failed else ('partial' if failed < len(results) else 'error'),
+        'targetLanguage': target_language,
+        'results': results,
+        'requests': outcome['requests'],
+        'failed': failed
+    }), 200
+
+
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
@@ -270,11 +424,18 @@ def chat():
         if not message:
             return jsonify({'error': 'Empty message'}), 400
 
+        conflict = ingestion_conflict(pdf_filename)
+        if conflict is not None:
+            return conflict
+
         # 使用 ChatLogger 處理完整的對話流程
         def generate_response(msg: str, pdf_filename: str = None,
                               enable_web_research: bool = False,
                               enable_chat_with_picture: bool = False,
-                              image_data: str = None) -> str:
+                              image_data: str = None,
+                              search_corpus: bool = False) -> str:
+            if cached_answer is not None:
+                return cached_answer['answer']
             try:
                 try:
                     result = agent.process_input(
@@ -282,9 +443,12 @@ def chat():
                         image_data=image_data,
                         enable_web_research=enable_web_research,
                         enable_chat_with_picture=enable_chat_with_picture,
-                        pdf_filename=pdf_filename
+                        pdf_filename=pdf_filename,
+                        search_corpus=search_corpus
                     )
-                    return result.get('running_summary', "抱歉，生成回應時發生錯誤。請稍後再試。")
+                    answer = result.get('running_summary')
+                    agent.remember_answer(cache_key, msg, answer)
+                    return answer or "抱歉，生成回應時發生錯誤。請稍後再試。"
                 except Exception as e:
                     console.print(f"[red]處理請求時發生錯誤: {str(e)}[/red]")
                     return f"處理您的請求時發生錯誤。錯誤信息：{str(e)}"
@@ -294,19 +458,19 @@ def chat():
 
         try:
             # Get image data from screenshots directory if exists
-            image_data = None
-            if os.path.exists(SCREENSHOTS_DIR):
-                png_files = [f for f in os.listdir(
-                    SCREENSHOTS_DIR) if f.endswith('.png')]
-                if png_files:
-                    image_path = os.path.join(SCREENSHOTS_DIR, png_files[0])
-                    with open(image_path, 'rb') as img_file:
-                        image_data = base64.b64encode(
-                            img_file.read()).decode('utf-8')
+            image_data = load_screenshot_data()
 
             # Extract parameters from request
             enable_web_research = data.get('enableWebResearch', False)
             enable_chat_with_picture = data.get('enableChatWithPicture', False)
+            search_corpus = data.get('searchCorpus', False)
+
+            # 相同文件與功能旗標下問過相似問題時直接使用先前的回答，forceRefresh 時重新研究
+            cache_key = agent.answer_cache_key(
+                pdf_filename, enable_web_research, enable_chat_with_picture,
+                image_data, search_corpus)
+            cached_answer = None if data.get('forceRefresh', False) else agent.lookup_answer(
+                cache_key, message)
 
             _, ai_message = chat_logger.process_chat(
                 message=message,
@@ -316,13 +480,15 @@ def chat():
                     pdf_filename=pdf_filename,
                     enable_web_research=enable_web_research,
                     enable_chat_with_picture=enable_chat_with_picture,
-                    image_data=image_data
+                    image_data=image_data,
+                    search_corpus=search_corpus
                 )
             )
 
             # 確保回應格式正確
             if not isinstance(ai_message, dict):
                 ai_message = {"response": ai_message}
+            ai_message = {**ai_message, 'cached': cached_answer is not None}
 
             return jsonify(ai_message), 200
         except ValueError as ve:
@@ -341,13 +507,153 @@ def chat():
         }), 500
 
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """以 Server-Sent Events 串流回應：先送出圖節點進度事件，再逐字送出最終總結"""
+    data = request.get_json(silent=True) or {}
+    message = data.get('message', '').strip()
+    pdf_filename = data.get('pdfFilename')
+    enable_web_research = data.get('enableWebResearch', False)
+    enable_chat_with_picture = data.get('enableChatWithPicture', False)
+    search_corpus = data.get('searchCorpus', False)
+
+    console.print(Panel(
+        f"[cyan]Received Message:[/cyan] [yellow]{message}[/yellow]\n"
+        f"[cyan]PDF File:[/cyan] [yellow]{pdf_filename or 'None'}[/yellow]\n"
+        f"[cyan]EnableChatWithPicture:[/cyan] [green]{enable_chat_with_picture}[/green]\n"
+        f"[cyan]EnableWebResearch:[/cyan] [green]{enable_web_research}[/green]",
+        title="Streaming Chat Request Info",
+        border_style="blue"
+    ))
+
+    if not message:
+        return jsonify({'error': 'Empty message'}), 400
+
+    conflict = ingestion_conflict(pdf_filename)
+    if conflict is not None:
+        return conflict
+
+    image_data = load_screenshot_data()
+    cache_key = agent.answer_cache_key(
+        pdf_filename, enable_web_research, enable_chat_with_picture,
+        image_data, search_corpus)
+    force_refresh = data.get('forceRefresh', False)
+
+    def generate_events(msg: str):
+        cached_answer = None if force_refresh else agent.lookup_answer(cache_key, msg)
+        if cached_answer is not None:
+            # 命中回答快取時一次送出完整回答
+            yield {'type': 'token', 'content': cached_answer['answer']}
+            yield {'type': 'done', 'content': cached_answer['answer'], 'elapsed': 0.0,
+                   'cached': True}
+            return
+        for event in agent.stream_input(
+                user_input=msg,
+                image_data=image_data,
+                enable_web_research=enable_web_research,
+                enable_chat_with_picture=enable_chat_with_picture,
+                pdf_filename=pdf_filename,
+                search_corpus=search_corpus):
+            if event.get('type') == 'done':
+                agent.remember_answer(cache_key, msg, event.get('content'))
+                event = {**event, 'cached': False}
+            yield event
+
+    def event_stream():
+        try:
+            events = chat_logger.process_chat_stream(
+                message=message,
+                pdf_filename=pdf_filename,
+                event_generator=generate_events
+            )
+            for event in events:
+                yield format_sse(event)
+        except Exception as e:
+            console.print(f"[red]串流聊天訊息時發生錯誤: {str(e)}[/red]")
+            yield format_sse({'type': 'error', 'content': f'處理聊天訊息時發生錯誤: {str(e)}'})
+
+    return Response(
+        stream_with_context(event_stream()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 避免 nginx 緩衝串流
+        }
+    )
+
+
+def ingestion_conflict(pdf_filename):
+    """PDF 仍在排隊或建立 index 時返回 409 回應（含工作 ID），否則返回 None"""
+    if not pdf_filename:
+        return None
+    job = ingestion_queue.find_active(pdf_name=pdf_filename)
+    if job is None:
+        return None
+    return jsonify({
+        'error': 'PDF is still being processed',
+        'status': job.status,
+        'jobId': job.id
+    }), 409
+
+
+def format_sse(event: dict) -> str:
+    """將事件格式化為 Server-Sent Events 訊息"""
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def load_screenshot_data():
+    """讀取截圖目錄中的圖片並轉為 base64，沒有截圖時返回 None"""
+    if os.path.exists(SCREENSHOTS_DIR):
+        png_files = [f for f in os.listdir(
+            SCREENSHOTS_DIR) if f.endswith('.png')]
+        if png_files:
+            image_path = os.path.join(SCREENSHOTS_DIR, png_files[0])
+            with open(image_path, 'rb') as img_file:
+                return base64.b64encode(img_file.read()).decode('utf-8')
+    return None
+
+
+@app.route('/search', methods=['POST'])
+def search_corpus():
+    """跨 PDF 搜索向量資料庫，結果包含來源 PDF 與頁碼"""
+    data = request.get_json(silent=True) or {}
+    query = data.get('query')
+    if not isinstance(query, str) or not query.strip():
+        return jsonify({'error': 'Empty query'}), 400
+    query = query.strip()
+
+    top_k = data.get('topK', 5)
+    # bool 是 int 的子類別，需另外排除
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or not 0 < top_k <= 100:
+        return jsonify({'error': 'topK must be an integer between 1 and 100'}), 400
+    pdf_filenames = data.get('pdfFilenames')
+    if pdf_filenames is not None and (
+            not isinstance(pdf_filenames, list)
+            or not all(isinstance(name, str) for name in pdf_filenames)):
+        return jsonify({'error': 'pdfFilenames must be a list of filenames'}), 400
+    results = agent.faiss_search_tool.search_corpus(
+        query=query, top_k=top_k, pdf_filenames=pdf_filenames)
+    return jsonify({'query': query, 'results': results}), 200
+
+
 @app.route('/chat-history/<path:filename>', methods=['GET'])
 def get_chat_history(filename):
     try:
-        messages = chat_logger.load_chat_history(filename)
+        limit = request.args.get('limit', type=int)
+        before = request.args.get('before', type=int)
+        if limit is not None and limit < 0:
+            return jsonify({'error': 'limit must be non-negative'}), 400
+        total = chat_logger.count_chat_history(filename)
+        messages = chat_logger.load_chat_history(filename, limit=limit, before=before)
+        # 下一頁從這一頁第一則訊息之前開始
+        end = total if before is None else max(0, min(before, total))
+        start = end - len(messages)
         return jsonify({
             'messages': messages,
-            'pdfFilename': filename
+            'pdfFilename': filename,
+            'total': total,
+            'hasMore': start > 0,
+            'nextBefore': start if start > 0 else None
         }), 200
     except Exception as e:
         return jsonify({
@@ -355,6 +661,37 @@ def get_chat_history(filename):
         }), 500
 
 
+@app.route('/chat-search', methods=['GET'])
+def search_chat_history():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    limit = request.args.get('limit', 20, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if not 0 < limit <= 100 or offset < 0:
+        return jsonify({'error': 'limit must be between 1 and 100 and offset non-negative'}), 400
+    try:
+        found = chat_logger.search_chat_history(
+            query,
+            pdf_filenames=request.args.getlist('pdfFilename') or None,
+            role=request.args.get('role'),
+            limit=limit,
+            offset=offset
+        )
+        return jsonify({
+            'query': query,
+            'total': found['total'],
+            'results': found['results'],
+            'limit': limit,
+            'offset': offset,
+            'hasMore': offset + len(found['results']) < found['total']
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'error': f'Error searching chat history: {str(e)}'
+        }), 500
+
+
 @app.route('/chat-history/<path:filename>', methods=['DELETE'])
 def clear_chat_history(filename):
     try:
@@ -430,6 +767,63 @@ def upload_screenshot():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/digest/<path:pdf_filename>', methods=['GET'])
+def get_paper_digest(pdf_filename):
+    content_hash = embedder.index_store.get_hash(pdf_filename)
+    if content_hash is None:
+        return jsonify({'error': 'File not found'}), 404
+    digest = embedder.index_store.load_digest(content_hash)
+    if digest is None:
+        return jsonify({'error': 'Digest not available'}), 404
+    return jsonify({'filename': pdf_filename, 'contentHash': content_hash, **digest}), 200
+
+
+@app.route('/pretranslations/<path:pdf_filename>', methods=['GET'])
+def get_pretranslation_status(pdf_filename):
+    content_hash = embedder.index_store.get_hash(pdf_filename)
+    if content_hash is None:
+        return jsonify({'error': 'File not found'}), 404
+    status = pretranslation_queue.get(content_hash)
+    if status is None:
+        # 沒有進行中的工作時回報已保存的語言
+        status = {
+            'status': 'not_started',
+            'error': None,
+            'languages': {lang: {'status': 'completed' if pretranslation_store.has(content_hash, lang)
+                                 else 'partial' if pretranslation_store.is_partial(content_hash, lang)
+                                 else 'pending'}
+                          for lang in pretranslation_queue.languages}
+        }
+    return jsonify({'filename': pdf_filename, 'contentHash': content_hash, **status}), 200
+
+
+@app.route('/translation-stats', methods=['GET'])
+def get_translation_stats():
+    return jsonify({'backends': translation_chain.stats()}), 200
+
+
+@app.route('/health/translation', methods=['GET'])
+def translation_health_check():
+    health = translation_chain.health()
+    return jsonify(health), 503 if health['status'] == 'unavailable' else 200
+
+
+@app.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        **agent.faiss_search_tool.cache_stats(),
+        'translation': translation_cache.stats(),
+        'chat_history': chat_logger.cache_stats(),
+        'answer': agent.answer_cache.stats()
+    }), 200
+
+
+@app.route('/llm-stats', methods=['GET'])
+def get_llm_stats():
+    # 各節點累計的 Ollama 提示處理（prompt eval）與生成（eval）耗時
+    return jsonify(agent.llm_timing_stats()), 200
+
+
 @app.route('/')
 def health_check():
     return jsonify({'status': 'healthy'}), 200
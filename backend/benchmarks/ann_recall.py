@@ -0,0 +1,77 @@
+"""
+Recall/latency benchmark of the ANN index types against the flat baseline.
+
+Builds flat, HNSW and IVF-PQ indexes with utils.ann_index over random
+vectors of embedding size and reports recall@k against exact search and the
+mean query latency for several efSearch / nprobe settings.
+
+Usage (from the backend directory):
+    python -m benchmarks.ann_recall [num_vectors] [dimension]
+"""
+import sys
+import time
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from utils.ann_index import apply_search_params, build_faiss_index
+
+
+def _clustered_vectors(rng, count, dimension, clusters=64):
+    """Vectors drawn around random centroids, closer to real embeddings than uniform noise"""
+    centroids = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    assignments = rng.integers(0, clusters, count)
+    noise = 0.3 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return centroids[assignments] + noise
+
+
+def _search(index, queries, k):
+    start = time.perf_counter()
+    _, ids = index.search(queries, k)
+    return ids, (time.perf_counter() - start) / len(queries)
+
+
+def run(num_vectors: int = 20000, dimension: int = 1024, num_queries: int = 200, k: int = 10):
+    rng = np.random.default_rng(0)
+    vectors = _clustered_vectors(rng, num_vectors + num_queries, dimension)
+    data, queries = vectors[:num_vectors], vectors[num_vectors:]
+
+    table = Table(title=f"ANN benchmark: {num_vectors} vectors, d={dimension}, recall@{k}")
+    table.add_column("Index", style="cyan")
+    table.add_column("Search param", style="cyan")
+    table.add_column("Build", style="yellow")
+    table.add_column("Latency / query", style="yellow")
+    table.add_column("Recall", style="green")
+
+    start = time.perf_counter()
+    flat = build_faiss_index(data, "flat")
+    flat_build = time.perf_counter() - start
+    truth, flat_latency = _search(flat, queries, k)
+    table.add_row("flat", "-", f"{flat_build:.2f}s", f"{flat_latency * 1000:.3f} ms", "1.000")
+
+    configs = [
+        ("hnsw", [("efSearch", ef) for ef in (16, 64, 128)]),
+        ("ivfpq", [("nprobe", nprobe) for nprobe in (1, 8, 32)]),
+    ]
+    for index_type, params in configs:
+        start = time.perf_counter()
+        index = build_faiss_index(data, index_type)
+        build_time = time.perf_counter() - start
+        for name, value in params:
+            if name == "efSearch":
+                apply_search_params(index, ef_search=value)
+            else:
+                apply_search_params(index, nprobe=value)
+            ids, latency = _search(index, queries, k)
+            recall = np.mean([len(set(row) & set(expected)) / k
+                              for row, expected in zip(ids, truth)])
+            table.add_row(index_type, f"{name}={value}", f"{build_time:.2f}s",
+                          f"{latency * 1000:.3f} ms", f"{recall:.3f}")
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    run(*args)
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark for the per-request overhead of the research graph.
+
+Compares the old single graph (every node visited with web research and image
+chat disabled) against the PDF-only graph compiled for that flag combination.
+The FAISS search and final LLM call are stubbed out so only graph and node
+overhead is measured.
+
+Usage (from the backend directory):
+    python -m benchmarks.graph_overhead [iterations]
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+
+def run(iterations: int = 200):
+    # 在暫存目錄中建立 agent，避免在工作目錄產生 FAISS_index
+    os.chdir(tempfile.mkdtemp(prefix="graph_overhead_"))
+
+    from utils import Agent
+    # 節點的 rich 輸出寫入記憶體，保留渲染成本但不輸出到終端
+    Agent.console = Console(file=io.StringIO(), width=120)
+
+    agent = Agent.ResearchAgent()
+    agent._search_faiss = lambda state: {"faiss_results": []}
+    agent._finalize_summary = lambda state: {"running_summary": "stub"}
+
+    inputs = {
+        "research_topic": "What is the main contribution of this paper?",
+        "enable_web_research": False,
+        "enable_chat_with_picture": False,
+        "base64_image": None,
+        "pdf_filename": "paper.pdf"
+    }
+    graphs = {
+        "full graph (before)": agent._build_graph(True, True),
+        "pdf-only graph (after)": agent._build_graph(False, False),
+    }
+
+    results = {}
+    for name, graph in graphs.items():
+        graph.invoke(inputs)  # warm-up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            graph.invoke(inputs)
+        results[name] = (time.perf_counter() - start) / iterations
+
+    table = Table(title=f"Graph overhead per request ({iterations} iterations)")
+    table.add_column("Graph", style="cyan")
+    table.add_column("Nodes", style="cyan")
+    table.add_column("Time / request", style="yellow")
+    for name, graph in graphs.items():
+        nodes = len([n for n in graph.get_graph().nodes if not n.startswith("__")])
+        table.add_row(name, str(nodes), f"{results[name] * 1000:.3f} ms")
+
+    before, after = results.values()
+    console = Console()
+    console.print(table)
+    console.print(f"Overhead removed: [green]{(before - after) * 1000:.3f} ms[/green] "
+                  f"per request ({before / after:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,135 @@
+"""
+Peak memory benchmark of PDF ingestion against document length.
+
+Generates synthetic PDFs of increasing page counts and ingests each one with
+PDFEmbedder.create_embeddings while tracemalloc records the peak Python heap.
+The index and docstore necessarily grow with the document, so the table also
+reports the heap retained when the index is complete and the difference
+between the two: the working set of the pipeline itself, which should stay
+roughly constant. The same documents are also ingested the pre-streaming way
+(load everything, split everything, embed everything, FAISS.from_embeddings)
+for comparison.
+
+A deterministic hashing embedding model stands in for Ollama so the benchmark
+runs offline; FAISS' own C++ allocations are not traced by tracemalloc.
+
+Usage (from the backend directory):
+    python -m benchmarks.ingest_memory [page_counts...]
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import fitz
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import PyMuPDFLoader
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from rich.console import Console
+from rich.table import Table
+
+import utils.embedding_pdf as embedding_pdf
+
+DIMENSION = 1024
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic pseudo-random vectors seeded by the text hash"""
+
+    def __init__(self, model=None, **kwargs):
+        self.model = model
+
+    def _vector(self, text):
+        seed = int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:16], 16)
+        return np.random.default_rng(seed).standard_normal(DIMENSION, dtype=np.float32).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def _make_pdf(path, pages):
+    doc = fitz.open()
+    for page_no in range(pages):
+        page = doc.new_page()
+        text = f"Page {page_no}. " + " ".join(
+            f"term{(page_no * 131 + i) % 5003}" for i in range(450))
+        page.insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=7)
+    doc.save(path)
+    doc.close()
+
+
+def _streaming(pdf_path):
+    """Current pipeline; returns (peak, retained) in bytes"""
+    retained = {}
+
+    def on_progress(stage, status, **details):
+        # The index and docstore are complete once saving starts
+        if stage == 'saving' and status == 'running':
+            retained['bytes'] = tracemalloc.get_traced_memory()[0]
+
+    embedder = embedding_pdf.PDFEmbedder(extraction_workers=1)
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    embedder.create_embeddings(pdf_path, force=True, progress_callback=on_progress)
+    peak = tracemalloc.get_traced_memory()[1]
+    return peak - baseline, retained['bytes'] - baseline
+
+
+def _materialized(pdf_path):
+    """Pre-streaming pipeline kept here as the comparison baseline"""
+    embeddings = HashingEmbeddings()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    documents = PyMuPDFLoader(pdf_path).load()
+    texts = RecursiveCharacterTextSplitter(
+        chunk_size=1000, chunk_overlap=200).split_documents(documents)
+    embedded_texts = []
+    for start in range(0, len(texts), 32):
+        batch = texts[start:start + 32]
+        vectors = embeddings.embed_documents([doc.page_content for doc in batch])
+        embedded_texts.extend(zip([doc.page_content for doc in batch], vectors))
+    db = FAISS.from_embeddings(
+        embedded_texts, embeddings, metadatas=[doc.metadata for doc in texts])
+    retained = tracemalloc.get_traced_memory()[0]
+    peak = tracemalloc.get_traced_memory()[1]
+    del db, embedded_texts, texts, documents
+    return peak - baseline, retained - baseline
+
+
+def _mb(value):
+    return f"{value / (1024 * 1024):.1f} MB"
+
+
+def run(page_counts=(50, 200, 800)):
+    embedding_pdf.OllamaEmbeddings = HashingEmbeddings
+    table = Table(title=f"Ingestion memory (tracemalloc), d={DIMENSION}")
+    table.add_column("Pages", style="cyan")
+    table.add_column("Pipeline", style="cyan")
+    table.add_column("Peak heap", style="yellow")
+    table.add_column("Index + docstore", style="yellow")
+    table.add_column("Pipeline overhead", style="green")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # PDFEmbedder writes Files/, FAISS_index/ and cache/ relative to the cwd
+        os.chdir(workdir)
+        tracemalloc.start()
+        for pages in page_counts:
+            pdf_path = os.path.join(workdir, f"synthetic_{pages}.pdf")
+            _make_pdf(pdf_path, pages)
+            for name, pipeline in (("streaming", _streaming), ("materialized", _materialized)):
+                peak, retained = pipeline(pdf_path)
+                table.add_row(str(pages), name, _mb(peak), _mb(retained), _mb(peak - retained))
+        tracemalloc.stop()
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]]
+    run(*([counts] if counts else []))
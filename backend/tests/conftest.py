@@ -0,0 +1,8 @@
+import os
+import sys
+
+# 測試從 backend 目錄匯入 utils，與 app.py 的執行方式相同
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 匯入模組時不在工作目錄建立翻譯磁碟快取
+os.environ.setdefault('TRANSLATION_CACHE_PATH', '')
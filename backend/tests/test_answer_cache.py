@@ -0,0 +1,89 @@
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import utils.answer_cache as answer_cache
+from utils.answer_cache import SemanticAnswerCache
+
+# 相同方向的向量視為相同問題；rephrased 與 original 的餘弦相似度約 0.995
+VECTORS = {
+    'original': [1.0, 0.0, 0.0],
+    'rephrased': [1.0, 0.1, 0.0],
+    'different': [0.0, 1.0, 0.0],
+    'third': [0.0, 0.0, 1.0],
+}
+
+
+class FixedEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return VECTORS[text]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(clock):
+    return SemanticAnswerCache(FixedEmbeddings(), threshold=0.9, ttl=60)
+
+
+def test_similar_question_hits(cache):
+    cache.store('paper', 'original', '答案')
+    hit = cache.lookup('paper', 'rephrased')
+    assert hit['answer'] == '答案' and hit['question'] == 'original'
+    assert hit['similarity'] == pytest.approx(0.995, abs=1e-3)
+    assert cache.lookup('paper', 'different') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_partitions_are_isolated(cache):
+    cache.store(('hash-a', 'web'), 'original', 'A')
+    assert cache.lookup(('hash-b', 'web'), 'original') is None
+    assert cache.lookup(('hash-a', 'no-web'), 'original') is None
+    assert cache.lookup(('hash-a', 'web'), 'original')['answer'] == 'A'
+
+
+def test_store_replaces_similar_question(cache):
+    cache.store('paper', 'original', 'old')
+    cache.store('paper', 'rephrased', 'new')
+    assert cache.lookup('paper', 'original')['answer'] == 'new'
+    assert cache.stats()['entries'] == 1
+
+
+def test_answers_expire_after_ttl(cache, clock):
+    cache.store('paper', 'original', '答案')
+    clock[0] += 61
+    assert cache.lookup('paper', 'original') is None
+    assert cache.expirations == 1
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_hit_answer_is_evicted(clock):
+    cache = SemanticAnswerCache(FixedEmbeddings(), threshold=0.9, max_entries=2, ttl=None)
+    cache.store('paper', 'original', 'first')
+    clock[0] += 1
+    cache.store('paper', 'different', 'second')
+    clock[0] += 1
+    cache.lookup('paper', 'original')
+    clock[0] += 1
+    cache.store('paper', 'third', 'third')
+    assert cache.evictions == 1
+    assert cache.lookup('paper', 'different') is None
+    assert cache.lookup('paper', 'original')['answer'] == 'first'
+    assert cache.lookup('paper', 'third')['answer'] == 'third'
+
+
+def test_invalidate(cache):
+    cache.store('a', 'original', 'A')
+    cache.store('b', 'original', 'B')
+    cache.invalidate('a')
+    assert cache.lookup('a', 'original') is None
+    assert cache.lookup('b', 'original')['answer'] == 'B'
+    cache.invalidate()
+    assert cache.stats()['partitions'] == 0
@@ -0,0 +1,74 @@
+import pytest
+
+from utils.chat_search import ChatSearchIndex
+
+
+def _message(number, content, role='user'):
+    return {'id': str(number), 'content': content, 'role': role,
+            'timestamp': f'2024-01-01T00:00:{number:02d}'}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ChatSearchIndex(str(tmp_path / 'search' / 'chat.sqlite3'))
+    yield index
+    index.close()
+
+
+def test_search_finds_messages_in_all_logs(index):
+    index.add_messages('paper', 0, [_message(0, '這篇論文的研究方法是什麼？'),
+                                    _message(1, 'The method uses attention.', 'assistant')])
+    index.add_messages('other', 0, [_message(0, 'attention heads in transformers')])
+    found = index.search('attention')
+    assert found['total'] == 2
+    assert {(result['log'], result['seq']) for result in found['results']} == \
+        {('paper', 1), ('other', 0)}
+    assert index.search('研究方法')['results'][0]['snippet'] == \
+        '這篇論文的<mark>研究方法</mark>是什麼？'
+
+
+def test_snippet_escapes_message_html(index):
+    index.add_messages('paper', 0, [
+        _message(0, '<img src=x onerror="alert(1)"> payload here'),
+        _message(1, 'ab <b>x</b>'),
+        _message(2, 'stray \x02marker\x03 payload'),
+    ])
+    snippets = {result['seq']: result['snippet'] for result in index.search('payload')['results']}
+    assert '<img' not in snippets[0]
+    assert snippets[0].startswith('&lt;img src=x onerror=&quot;alert(1)&quot;&gt;')
+    assert '<mark>payload</mark>' in snippets[0]
+    assert snippets[2] == 'stray marker <mark>payload</mark>'
+    # 短詞以 LIKE 比對，內容同樣需要跳脫
+    assert index.search('ab')['results'][0]['snippet'] == 'ab &lt;b&gt;x&lt;/b&gt;'
+
+def test_search_filters(index):
+    index.add_messages('paper', 0, [_message(0, 'dataset question'),
+                                    _message(1, 'dataset answer', 'assistant')])
+    index.add_messages('other', 0, [_message(0, 'dataset elsewhere')])
+    assert index.search('dataset', logs=['other'])['total'] == 1
+    assert index.search('dataset', logs=[])['total'] == 0
+    assert [result['seq'] for result in index.search('dataset', role='assistant')['results']] \
+        == [1]
+    assert index.search('dataset question')['total'] == 1
+    assert index.search('   ') == {'total': 0, 'results': []}
+    page = index.search('dataset', limit=2, offset=2)
+    assert page['total'] == 3 and len(page['results']) == 1
+
+
+def test_reindexing_from_start_replaces_tail(index):
+    index.add_messages('paper', 0, [_message(0, 'first message'), _message(1, 'old tail')])
+    assert index.indexed_count('paper') == 2
+    index.add_messages('paper', 1, [_message(1, 'new tail'), _message(2, 'more text')])
+    assert index.indexed_count('paper') == 3
+    assert index.search('old tail')['total'] == 0
+    assert index.search('new tail')['results'][0]['seq'] == 1
+
+
+def test_remove(index):
+    index.add_messages('paper', 0, [_message(0, 'keep searching')])
+    index.add_messages('other', 0, [_message(0, 'keep searching')])
+    index.remove('paper')
+    assert index.indexed_count('paper') == 0
+    assert [result['log'] for result in index.search('searching')['results']] == ['other']
+    index.remove()
+    assert index.search('searching')['total'] == 0
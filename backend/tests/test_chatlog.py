@@ -0,0 +1,248 @@
+import json
+import os
+import struct
+import threading
+
+import pytest
+
+from utils.chatlog import (CHATLOG_INDEX_NAME, CHATLOG_NAME, LEGACY_CHATLOG_NAME,
+                           LEGACY_CORRUPT_SUFFIX, ChatLogger,
+                           CustomFileChatMessageHistory)
+
+_OFFSET = struct.Struct('<Q')
+
+
+def _message(number):
+    return {'id': str(number), 'content': f'訊息 {number}', 'role': 'user',
+            'timestamp': f'2024-01-01T00:00:{number:02d}'}
+
+
+def _contents(messages):
+    return [message['content'] for message in messages]
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    return tmp_path / 'paper'
+
+
+def _open(log_dir):
+    return CustomFileChatMessageHistory(str(log_dir / CHATLOG_NAME))
+
+
+def _write_messages(log_dir, count):
+    history = _open(log_dir)
+    for number in range(count):
+        history.add_message(_message(number))
+    history.close()
+
+
+def _read_index(log_dir):
+    data = (log_dir / CHATLOG_INDEX_NAME).read_bytes()
+    return [value for (value,) in _OFFSET.iter_unpack(data)]
+
+
+def test_add_message_returns_sequence_numbers(log_dir):
+    history = _open(log_dir)
+    assert [history.add_message(_message(number)) for number in range(3)] == [0, 1, 2]
+    history.close()
+
+    reopened = _open(log_dir)
+    assert len(reopened) == 3
+    assert reopened.add_message(_message(3)) == 3
+    assert _contents(reopened.get_messages()) == [f'訊息 {n}' for n in range(4)]
+    reopened.close()
+
+
+@pytest.mark.parametrize('limit, before, expected', [
+    (None, None, list(range(10))),
+    (3, None, [7, 8, 9]),
+    (3, 5, [2, 3, 4]),
+    (3, 2, [0, 1]),
+    (None, 2, [0, 1]),
+    (3, 0, []),
+    (0, None, []),
+    (3, 10, [7, 8, 9]),
+    (3, 50, [7, 8, 9]),
+    (20, None, list(range(10))),
+    (3, -1, []),
+])
+def test_get_messages_paging(log_dir, limit, before, expected):
+    _write_messages(log_dir, 10)
+    history = _open(log_dir)
+    assert _contents(history.get_messages(limit=limit, before=before)) == \
+        [f'訊息 {n}' for n in expected]
+    history.close()
+
+
+def test_paging_walks_whole_log_without_gaps(log_dir):
+    _write_messages(log_dir, 7)
+    history = _open(log_dir)
+    seen, before = [], None
+    while True:
+        page = history.get_messages(limit=3, before=before)
+        if not page:
+            break
+        seen = page + seen
+        before = (len(history) if before is None else before) - len(page)
+    assert _contents(seen) == [f'訊息 {n}' for n in range(7)]
+    history.close()
+
+
+def test_torn_final_line_is_truncated(log_dir):
+    _write_messages(log_dir, 3)
+    log_path = log_dir / CHATLOG_NAME
+    valid_size = log_path.stat().st_size
+    with open(log_path, 'ab') as f:
+        f.write(b'{"id": "3", "content": "\xe5\x8d\x8a')
+
+    history = _open(log_dir)
+    assert len(history) == 3
+    assert log_path.stat().st_size == valid_size
+    assert history.add_message(_message(3)) == 3
+    assert _contents(history.get_messages(limit=2)) == ['訊息 2', '訊息 3']
+    history.close()
+
+
+def test_index_missing_trailing_entries_is_repaired(log_dir):
+    _write_messages(log_dir, 5)
+    index_path = log_dir / CHATLOG_INDEX_NAME
+    offsets = _read_index(log_dir)
+    # 寫入訊息後、寫入索引前中斷：索引少了最後幾筆，並殘留半筆位移
+    index_path.write_bytes(b''.join(_OFFSET.pack(offset) for offset in offsets[:2]) + b'\x01\x02')
+
+    history = _open(log_dir)
+    assert len(history) == 5
+    assert _read_index(log_dir) == offsets
+    assert _contents(history.get_messages(limit=1, before=4)) == ['訊息 3']
+    history.close()
+
+
+@pytest.mark.parametrize('corrupt', [
+    pytest.param(lambda offsets: offsets[:1] + offsets[2:3] + offsets[1:2] + offsets[3:],
+                 id='non-monotonic'),
+    pytest.param(lambda offsets: offsets[:-1] + [offsets[-1] + 10_000], id='beyond-end'),
+    pytest.param(lambda offsets: [0] + [offset + 3 for offset in offsets[1:]],
+                 id='mid-line'),
+])
+def test_stale_index_is_rebuilt(log_dir, corrupt):
+    _write_messages(log_dir, 6)
+    offsets = _read_index(log_dir)
+    (log_dir / CHATLOG_INDEX_NAME).write_bytes(
+        b''.join(_OFFSET.pack(offset) for offset in corrupt(offsets)))
+
+    history = _open(log_dir)
+    assert len(history) == 6
+    assert _read_index(log_dir) == offsets
+    assert _contents(history.get_messages(limit=2, before=3)) == ['訊息 1', '訊息 2']
+    history.close()
+
+
+def test_index_from_before_compaction_is_rebuilt(log_dir):
+    # 壓縮時取代記錄檔後、取代索引前中斷：索引仍是舊檔案的位移
+    _write_messages(log_dir, 20)
+    stale_index = (log_dir / CHATLOG_INDEX_NAME).read_bytes()
+    history = _open(log_dir)
+    history.compact(keep_last=12)
+    (log_dir / CHATLOG_INDEX_NAME).write_bytes(stale_index)
+
+    reopened = _open(log_dir)
+    assert len(reopened) == 12
+    assert _contents(reopened.get_messages()) == [f'訊息 {n}' for n in range(8, 20)]
+    reopened.close()
+
+
+def test_missing_index_is_rebuilt(log_dir):
+    _write_messages(log_dir, 4)
+    offsets = _read_index(log_dir)
+    os.remove(log_dir / CHATLOG_INDEX_NAME)
+
+    history = _open(log_dir)
+    assert len(history) == 4
+    assert _read_index(log_dir) == offsets
+    history.close()
+
+
+def test_legacy_json_is_migrated(log_dir):
+    log_dir.mkdir()
+    legacy = [_message(number) for number in range(3)]
+    (log_dir / LEGACY_CHATLOG_NAME).write_text(
+        json.dumps(legacy, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    history = _open(log_dir)
+    assert history.get_messages() == legacy
+    assert not (log_dir / LEGACY_CHATLOG_NAME).exists()
+    assert len(_read_index(log_dir)) == 3
+    history.close()
+
+
+def test_legacy_json_is_ignored_when_jsonl_exists(log_dir):
+    _write_messages(log_dir, 2)
+    (log_dir / LEGACY_CHATLOG_NAME).write_text(json.dumps([_message(9)]), encoding='utf-8')
+
+    history = _open(log_dir)
+    assert _contents(history.get_messages()) == ['訊息 0', '訊息 1']
+    assert (log_dir / LEGACY_CHATLOG_NAME).exists()
+    history.close()
+
+
+@pytest.mark.parametrize('content', ['[{"id": "0", "content": ', '{"not": "a list"}'])
+def test_unreadable_legacy_json_is_kept(log_dir, content):
+    log_dir.mkdir()
+    (log_dir / LEGACY_CHATLOG_NAME).write_text(content, encoding='utf-8')
+
+    history = _open(log_dir)
+    assert len(history) == 0
+    assert not (log_dir / LEGACY_CHATLOG_NAME).exists()
+    assert (log_dir / (LEGACY_CHATLOG_NAME + LEGACY_CORRUPT_SUFFIX)).read_text(
+        encoding='utf-8') == content
+    history.close()
+
+
+def test_compact_keeps_last_messages(log_dir):
+    _write_messages(log_dir, 10)
+    history = _open(log_dir)
+    history.compact(keep_last=4)
+    assert _contents(history.get_messages()) == [f'訊息 {n}' for n in range(6, 10)]
+    assert history.add_message(_message(10)) == 4
+    history.close()
+
+    reopened = _open(log_dir)
+    assert _contents(reopened.get_messages(limit=2)) == ['訊息 9', '訊息 10']
+    reopened.close()
+
+
+def test_clear_messages_removes_files(log_dir):
+    _write_messages(log_dir, 3)
+    history = _open(log_dir)
+    history.clear_messages()
+    assert len(history) == 0
+    assert not log_dir.exists()
+
+
+
+def test_append_does_not_race_with_eviction(tmp_path, monkeypatch):
+    logger = ChatLogger(str(tmp_path / 'logs'), max_cached_histories=1)
+    logger._append_message('paper0.pdf', _message(0))
+    original_add = CustomFileChatMessageHistory.add_message
+    other = threading.Thread(target=lambda: (
+        logger._append_message('paper1.pdf', _message(0)),
+        logger._append_message('paper0.pdf', _message(2))))
+
+    def add_message(self, message):
+        # 另一個執行緒在附加途中淘汰此對話歷史並寫入同一份記錄
+        if message['id'] == '1':
+            other.start()
+            other.join(timeout=0.5)
+        return original_add(self, message)
+
+    monkeypatch.setattr(CustomFileChatMessageHistory, 'add_message', add_message)
+    logger._append_message('paper0.pdf', _message(1))
+    other.join()
+
+    assert logger.count_chat_history('paper0.pdf') == 3
+    logger.close()
+    log_dir = tmp_path / 'logs' / 'paper0'
+    data = (log_dir / CHATLOG_NAME).read_bytes()
+    assert _read_index(log_dir) == [0] + [index + 1 for index, byte in enumerate(data[:-1])
+                                          if byte == ord('\n')]
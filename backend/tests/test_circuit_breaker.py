@@ -0,0 +1,88 @@
+import pytest
+
+import utils.circuit_breaker as circuit_breaker
+from utils.circuit_breaker import CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, 'time', lambda: now[0])
+    # 固定抖動為退避上限的一半，方便計算下一次探測時間
+    monkeypatch.setattr(circuit_breaker.random, 'uniform', lambda low, high: low)
+    return now
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker('svc', failure_threshold=3, base_backoff=10)
+    breaker.record_failure(RuntimeError('one'))
+    breaker.record_failure(RuntimeError('two'))
+    assert breaker.allow()
+    breaker.record_failure(RuntimeError('three'))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 5.0
+    snapshot = breaker.snapshot()
+    assert (snapshot['openCount'], snapshot['lastError']) == (1, 'three')
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker('svc', failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.retry_after() is None
+
+
+def test_half_open_request_without_probe(clock):
+    breaker = CircuitBreaker('svc', failure_threshold=1, base_backoff=10)
+    breaker.record_failure()
+    clock[0] += 4
+    assert not breaker.allow()
+    clock[0] += 1
+    # 退避時間到後只放行一個請求
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_failed_half_open_request_doubles_backoff(clock):
+    breaker = CircuitBreaker('svc', failure_threshold=1, base_backoff=10, max_backoff=15)
+    breaker.record_failure()
+    clock[0] += 5
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() == 7.5
+    assert breaker.open_count == 1
+
+
+def test_background_probe_recovers(clock):
+    calls = []
+    breaker = CircuitBreaker('svc', probe=lambda: calls.append('probe'),
+                             failure_threshold=1, base_backoff=3600)
+    breaker.record_failure()
+    clock[0] += 3600
+    # 有 probe 時請求端不負責探測
+    assert not breaker.allow()
+    breaker._run_probe()
+    assert calls == ['probe']
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker._timer is None
+
+
+def test_background_probe_failure_reopens(clock):
+    def probe():
+        raise ConnectionError('still down')
+
+    breaker = CircuitBreaker('svc', probe=probe, failure_threshold=1, base_backoff=3600,
+                             max_backoff=10_000)
+    breaker.record_failure()
+    breaker._run_probe()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.last_error == 'still down'
+    assert breaker.retry_after() == 3600.0
+    breaker.record_success()
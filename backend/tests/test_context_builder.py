@@ -0,0 +1,89 @@
+import pytest
+
+from utils.context_builder import (MIN_OVERLAP_CHARS, TRUNCATION_MARK, build_context,
+                                   estimate_tokens, merge_overlapping, truncate_to_tokens)
+
+
+def _result(content, score, page=0, digest=False, source='paper.pdf'):
+    metadata = {'pdf_filename': source, 'page': page}
+    if digest:
+        metadata['digest'] = True
+    return {'content': content, 'score': score, 'metadata': metadata}
+
+
+def _format(result):
+    return result['content']
+
+
+@pytest.mark.parametrize('text, expected', [
+    (None, 0),
+    ('', 0),
+    ('abcd', 1),
+    ('abcde', 2),
+    ('研究方法', 4),
+    ('研究 method', 2 + 2),
+])
+def test_estimate_tokens(text, expected):
+    assert estimate_tokens(text) == expected
+
+
+def test_truncate_to_tokens_prefers_sentence_boundary():
+    text = '第一句話。第二句話。' * 20
+    cut = truncate_to_tokens(text, 25)
+    assert estimate_tokens(cut) <= 25
+    assert cut.endswith('。' + TRUNCATION_MARK)
+    assert truncate_to_tokens('short', 10) == 'short'
+
+
+def test_merge_overlapping_joins_adjacent_chunks():
+    body = ''.join(f'sentence {n}. ' for n in range(40))
+    first, second = body[:300], body[300 - MIN_OVERLAP_CHARS - 10:]
+    merged, removed = merge_overlapping([_result(second, 0.2), _result(first, 0.5)])
+    assert removed == 1
+    assert merged[0]['content'] == body
+    assert merged[0]['score'] == 0.2
+
+
+def test_merge_overlapping_keeps_other_pages_and_digests():
+    chunk = 'x' * 100
+    results = [_result(chunk, 0.1, page=0), _result(chunk, 0.2, page=1),
+               _result(chunk[:50], 0.3, page=0), _result(chunk, 0.4, digest=True)]
+    merged, removed = merge_overlapping(results)
+    assert removed == 1
+    assert len(merged) == 3
+    # 原始結果不被修改
+    assert results[0]['content'] == chunk
+
+
+def test_build_context_trims_summary_to_its_share():
+    summary, _, stats = build_context('總結' * 200, [], budget=100, summary_share=0.3,
+                                      format_passage=_format)
+    assert stats['summary_trimmed']
+    assert stats['summary_tokens'] <= 30
+    assert summary.endswith(TRUNCATION_MARK)
+
+
+def test_build_context_fills_digest_tier_first():
+    results = [
+        _result('原文段落' * 10, 0.1, page=1),
+        _result('摘要段落' * 10, 0.9, digest=True),
+        _result('另一原文' * 10, 0.05, page=0),
+    ]
+    _, passages, stats = build_context(None, results, budget=82, summary_share=0.2,
+                                       format_passage=_format)
+    # 摘要即使分數較差也先放入；原文中分數較好的放入，另一段因預算不足被捨棄
+    assert stats['included'] == 2 and stats['dropped'] == 1
+    assert passages.startswith('摘要段落')
+    assert '另一原文' in passages and '原文段落原文段落' not in passages
+
+
+def test_build_context_truncates_last_passage_and_keeps_reading_order():
+    results = [_result('第二頁內容。' * 10, 0.1, page=2), _result('第一頁內容。' * 30, 0.2, page=1)]
+    _, passages, stats = build_context(None, results, budget=150, summary_share=0.2,
+                                       format_passage=_format)
+    assert (stats['included'], stats['truncated'], stats['dropped']) == (2, 1, 0)
+    # 分數較差而被截斷的第一頁仍排在第二頁之前
+    first, second = passages.split('\n\n')
+    assert first.startswith('第一頁內容') and first.endswith(TRUNCATION_MARK)
+    assert second == '第二頁內容。' * 10
+    assert estimate_tokens(passages) <= 150
@@ -0,0 +1,93 @@
+import hashlib
+import io
+import json
+import os
+
+import pytest
+
+from utils.index_store import IndexStore, compute_file_hash, save_and_hash
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IndexStore(str(tmp_path / 'FAISS_index'))
+
+
+def _make_index(store, content_hash):
+    os.makedirs(store.index_path(content_hash), exist_ok=True)
+    with open(os.path.join(store.index_path(content_hash), 'index.faiss'), 'wb') as f:
+        f.write(b'index')
+
+
+def test_save_and_hash_matches_file_hash(tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    path = tmp_path / 'paper.pdf'
+    content_hash = save_and_hash(io.BytesIO(data), str(path))
+    assert content_hash == hashlib.sha256(data).hexdigest()
+    assert content_hash == compute_file_hash(str(path))
+    assert path.read_bytes() == data
+
+
+def test_register_and_resolve(store):
+    _make_index(store, 'a' * 64)
+    store.register('uploads/paper.pdf', 'a' * 64)
+    assert store.get_hash('paper.pdf') == 'a' * 64
+    assert store.resolve('paper.pdf') == store.index_path('a' * 64)
+    assert store.resolve('missing.pdf') is None
+
+
+def test_resolve_requires_complete_index(store):
+    store.register('paper.pdf', 'b' * 64)
+    assert store.get_hash('paper.pdf') == 'b' * 64
+    assert store.resolve('paper.pdf') is None
+    assert store.names_by_hash() == {}
+
+
+def test_replacing_content_removes_unreferenced_index(store):
+    _make_index(store, 'a' * 64)
+    _make_index(store, 'b' * 64)
+    store.register('paper.pdf', 'a' * 64)
+    store.register('copy.pdf', 'a' * 64)
+    store.register('paper.pdf', 'b' * 64)
+    # 仍被 copy.pdf 引用的舊 index 保留
+    assert os.path.exists(store.index_path('a' * 64))
+    store.register('copy.pdf', 'b' * 64)
+    assert not os.path.exists(store.index_path('a' * 64))
+    assert store.names_by_hash() == {'b' * 64: ['copy.pdf', 'paper.pdf']}
+
+
+def test_manifest_changes_are_seen_by_other_instances(store):
+    other = IndexStore(store.root)
+    store.register('paper.pdf', 'a' * 64)
+    assert other.get_hash('paper.pdf') == 'a' * 64
+
+
+def test_corrupt_manifest_is_treated_as_empty(store):
+    with open(store.manifest_path, 'w', encoding='utf-8') as f:
+        f.write('{not json')
+    assert store.get_hash('paper.pdf') is None
+    store.register('paper.pdf', 'a' * 64)
+    with open(store.manifest_path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == {'names': {'paper.pdf': 'a' * 64}}
+
+
+def test_digest_and_pages_round_trip(store):
+    content_hash = 'c' * 64
+    assert store.load_digest(content_hash) is None
+    assert not store.has_digest(content_hash)
+    _make_index(store, content_hash)
+    store.save_digest(content_hash, {'version': 1, 'sections': []})
+    store.save_pages(content_hash, {'pages': {'0': 'hash'}})
+    assert store.has_digest(content_hash)
+    assert store.load_digest(content_hash) == {'version': 1, 'sections': []}
+    assert store.load_pages(content_hash)['pages'] == {'0': 'hash'}
+
+
+def test_iter_page_texts(store):
+    content_hash = 'd' * 64
+    assert store.iter_page_texts(content_hash) is None
+    os.makedirs(store.index_path(content_hash))
+    with open(store.page_texts_path(content_hash), 'w', encoding='utf-8') as f:
+        for page, text in [(0, '第一頁'), (1, 'second page')]:
+            f.write(json.dumps({'page': page, 'text': text}, ensure_ascii=False) + '\n')
+    assert list(store.iter_page_texts(content_hash)) == [(0, '第一頁'), (1, 'second page')]
@@ -0,0 +1,99 @@
+import threading
+
+from utils.lru_cache import LRUCache
+
+
+def test_evicts_least_recently_used_entry():
+    cache = LRUCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.evictions == 1
+
+
+def test_byte_budget_evicts_until_under_limit():
+    cache = LRUCache(max_bytes=10, size_fn=len)
+    cache.put('a', 'xxxx')
+    cache.put('b', 'yyyy')
+    cache.put('c', 'zzzzzz')
+    assert 'a' not in cache and 'b' in cache and 'c' in cache
+    assert cache.current_bytes == 10
+    # 單一項目超過總預算時不快取，也不影響既有項目
+    cache.put('d', 'w' * 11)
+    assert 'd' not in cache and 'c' in cache
+    assert cache.current_bytes == 10
+
+
+def test_put_replaces_size_of_existing_key():
+    cache = LRUCache(max_bytes=100)
+    cache.put('a', object(), size=40)
+    cache.put('a', object(), size=10)
+    assert cache.current_bytes == 10
+    assert len(cache) == 1
+
+
+def test_pop_and_clear_release_bytes():
+    cache = LRUCache(max_bytes=100)
+    cache.put('a', 1, size=30)
+    cache.put('b', 2, size=20)
+    assert cache.pop('a') == 1
+    assert cache.pop('missing', 'default') == 'default'
+    assert cache.current_bytes == 20
+    cache.clear()
+    assert cache.current_bytes == 0 and len(cache) == 0
+
+
+def test_ttl_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('utils.lru_cache.time.monotonic', lambda: now[0])
+    cache = LRUCache(ttl=5)
+    cache.put('a', 1)
+    now[0] += 4
+    assert cache.get('a') == 1
+    now[0] += 2
+    assert 'a' not in cache
+    assert cache.get('a') is None
+    assert cache.expirations == 1
+    assert cache.current_bytes == 0
+
+
+def test_on_evict_is_called_outside_the_lock():
+    evicted = []
+
+    def on_evict(key, value):
+        # 回呼中再次使用快取不會死結
+        evicted.append((key, value, len(cache)))
+
+    cache = LRUCache(max_entries=1, on_evict=on_evict)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert evicted == [('a', 1, 1)]
+
+
+def test_stats_count_hits_and_misses():
+    cache = LRUCache(max_entries=4)
+    cache.put('a', 1)
+    cache.get('a')
+    cache.get('b')
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_concurrent_puts_keep_limits():
+    cache = LRUCache(max_entries=50, max_bytes=500)
+
+    def writer(offset):
+        for number in range(500):
+            cache.put((offset, number), number, size=7)
+            cache.get((offset, number - 1))
+
+    threads = [threading.Thread(target=writer, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) <= 50
+    assert cache.current_bytes == 7 * len(cache) <= 500
@@ -0,0 +1,82 @@
+import pytest
+
+import utils.translation_batch as translation_batch
+from utils.translation_batch import pack_batches, translate_segments
+from utils.translation_cache import TranslationCache
+
+
+@pytest.mark.parametrize('segments, limit, expected', [
+    ([], 100, []),
+    (['a' * 10, 'b' * 10, 'c' * 10], 100, [[0, 1, 2]]),
+    # 10 + 2 (分隔符號) + 10 = 22 剛好等於上限
+    (['a' * 10, 'b' * 10, 'c' * 10], 22, [[0, 1], [2]]),
+    (['a' * 10, 'b' * 10], 21, [[0], [1]]),
+    (['a' * 30, 'b' * 5, 'c' * 5], 20, [[0], [1, 2]]),
+    # 含空行的片段無法拆回，單獨成為一個批次
+    (['a', 'b\n\nc', 'd', 'e'], 100, [[0], [1], [2, 3]]),
+])
+def test_pack_batches(segments, limit, expected):
+    assert pack_batches(segments, limit) == expected
+
+
+def test_pack_batches_respects_limit_and_order():
+    segments = ['x' * length for length in (5, 40, 13, 27, 1, 33, 8, 19, 2, 44)]
+    batches = pack_batches(segments, limit=50)
+    assert [index for batch in batches for index in batch] == list(range(len(segments)))
+    for batch in batches:
+        size = sum(len(segments[index]) for index in batch) + 2 * (len(batch) - 1)
+        assert size <= 50 or len(batch) == 1
+
+
+class FakeTranslator:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.requests = []
+
+    def translate_segments(self, segments, target_language):
+        self.requests.append(list(segments))
+        if any(segment in self.failing for segment in segments):
+            raise RuntimeError('batch failed')
+        return [f'{target_language}:{segment}' for segment in segments], 'fake'
+
+    def translate(self, text, target_language):
+        if text in self.failing:
+            raise RuntimeError(f'cannot translate {text}')
+        return f'{target_language}:{text}', 'fake'
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    cache = TranslationCache(disk_path=None)
+    monkeypatch.setattr(translation_batch, 'translation_cache', cache)
+    return cache
+
+
+def test_translate_segments_uses_cache_and_packs_rest(fresh_cache):
+    fresh_cache.put('cached', 'zh-TW', '已快取')
+    translator = FakeTranslator()
+    outcome = translate_segments(['one', 'cached', 'two'], 'zh-TW', translator)
+    assert outcome['requests'] == 1
+    assert translator.requests == [['one', 'two']]
+    assert [result['translatedText'] for result in outcome['results']] == \
+        ['zh-TW:one', '已快取', 'zh-TW:two']
+    assert [result['cached'] for result in outcome['results']] == [False, True, False]
+    assert fresh_cache.get('two', 'zh-TW')[0] == 'zh-TW:two'
+
+
+def test_failed_batch_is_retried_per_segment():
+    translator = FakeTranslator(failing={'bad'})
+    outcome = translate_segments(['good', 'bad', 'fine'], 'ja', translator)
+    results = outcome['results']
+    assert results[0]['translatedText'] == 'ja:good'
+    assert results[1]['translatedText'] is None
+    assert 'cannot translate bad' in results[1]['error']
+    assert results[2]['translatedText'] == 'ja:fine'
+
+
+def test_invalid_segments_are_reported_without_requests():
+    translator = FakeTranslator()
+    outcome = translate_segments(['', '   ', 'x' * 30], 'ko', translator, limit=20)
+    assert outcome['requests'] == 0
+    assert translator.requests == []
+    assert all(result['error'] for result in outcome['results'])
@@ -1,8 +1,10 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 import json
+import threading
 import time
 from datetime import datetime
 
+import numpy as np
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_ollama import ChatOllama
 from langgraph.graph import StateGraph, START, END
@@ -17,11 +19,15 @@ from .tools.prompts import (
     query_writer_instructions,
     summarizer_instructions,
     reflection_instructions,
-    final_summarize_instructions
+    final_summary_system_prompt
 )
 from .tools.web_search import WebSearchTool
 from .tools.image_analysis import ImageAnalysisTool
 from .tools.faiss_search import FAISSSearchTool
+from .answer_cache import SemanticAnswerCache
+from .lru_cache import LRUCache
+from .context_builder import build_context, estimate_tokens
+from .llm_metrics import OllamaTimingCallback
 
 # 創建rich console實例
 console = Console()
@@ -33,31 +39,153 @@ class ResearchAgent:
     def __init__(self):
         """Initialize the Research Agent with necessary components"""
         self.configuration = Configuration()
-        self.research_llm = ChatOllama(model=self.configuration.research_llm)
+        # 記錄每個節點的 Ollama 提示處理與生成耗時
+        self.llm_timing = OllamaTimingCallback()
+        llm_options = {
+            "keep_alive": self.configuration.ollama_keep_alive,
+            "callbacks": [self.llm_timing]
+        }
+        self.research_llm = ChatOllama(model=self.configuration.research_llm, **llm_options)
         self.research_llm_json = ChatOllama(
-            model=self.configuration.research_llm, format="json")
-        self.image_llm = ChatOllama(model=self.configuration.image_llm)
+            model=self.configuration.research_llm, format="json", **llm_options)
+        self.image_llm = ChatOllama(model=self.configuration.image_llm, **llm_options)
 
         # Initialize tools
         self.web_search_tool = WebSearchTool(
             self.research_llm, self.research_llm_json)
         self.image_analysis_tool = ImageAnalysisTool(self.image_llm)
-        self.faiss_search_tool = FAISSSearchTool()
+        self.faiss_search_tool = FAISSSearchTool(
+            max_cached_indexes=self.configuration.faiss_cache_max_indexes,
+            max_cache_bytes=self.configuration.faiss_cache_max_bytes,
+            ef_search=self.configuration.faiss_ef_search,
+            nprobe=self.configuration.faiss_nprobe)
+        # 問題向量與 FAISS 搜索共用同一個有快取的 embedding 模型
+        self.answer_cache = SemanticAnswerCache(
+            self.faiss_search_tool.embeddings,
+            threshold=self.configuration.answer_cache_threshold,
+            max_entries=self.configuration.answer_cache_max_entries,
+            max_partitions=self.configuration.answer_cache_max_papers,
+            ttl=self.configuration.answer_cache_ttl)
+
+        # 以內容雜湊為鍵的論文摘要與其章節向量，供階層式檢索使用
+        self._digests = LRUCache(max_entries=self.configuration.faiss_cache_max_indexes)
+
+        # 依功能旗標組合編譯的圖，避免停用的功能經過無作用的節點
+        self._graphs: Dict[Tuple[bool, bool, bool], Any] = {}
+        self._graphs_lock = threading.Lock()
+        self.graph = self._get_graph(True, True)
+
+        if self.configuration.ollama_warm_up:
+            threading.Thread(target=self._warm_up, daemon=True).start()
+
+    def _get_graph(self, enable_web_research: bool, enable_image_analysis: bool,
+                   include_finalize: bool = True):
+        """
+        Return the compiled graph for a feature-flag combination.
+
+        Graphs are compiled lazily and reused across requests. The streaming
+        variant (``include_finalize=False``) stops after the FAISS search.
+        """
+        key = (bool(enable_web_research), bool(enable_image_analysis), include_finalize)
+        with self._graphs_lock:
+            if key not in self._graphs:
+                self._graphs[key] = self._build_graph(*key)
+            return self._graphs[key]
+
+    def _build_inputs(self, user_input: str, image_data: Optional[str],
+                      enable_web_research: bool, enable_chat_with_picture: bool,
+                      pdf_filename: Optional[str],
+                      search_corpus: bool = False) -> Dict[str, Any]:
+        """Build the graph inputs from request parameters"""
+        return {
+            "research_topic": user_input,
+            "enable_web_research": enable_web_research,
+            "enable_chat_with_picture": enable_chat_with_picture,
+            "base64_image": image_data,
+            "pdf_filename": pdf_filename,
+            "search_corpus": search_corpus
+        }
+
+    def answer_cache_key(self, pdf_filename: Optional[str], enable_web_research: bool,
+                         enable_chat_with_picture: bool, image_data: Optional[str],
+                         search_corpus: bool = False) -> Optional[Tuple]:
+        """
+        Return the semantic answer cache key for a request, or None if it must not be cached.
+
+        Answers depend on the PDF content (or every indexed PDF when searching
+        the corpus) and on the enabled features. Requests that analyse a
+        screenshot are never cached because the answer depends on the image.
+        """
+        if not self.configuration.answer_cache_enabled:
+            return None
+        if enable_chat_with_picture and image_data:
+            return None
+        if search_corpus:
+            scope = ("corpus",) + tuple(sorted(self.faiss_search_tool.index_store.names_by_hash()))
+        elif pdf_filename:
+            index_store = self.faiss_search_tool.index_store
+            content_hash = index_store.get_hash(pdf_filename)
+            if content_hash is None or not index_store.has_index(content_hash):
+                return None
+            scope = content_hash
+        else:
+            return None
+        return scope, bool(enable_web_research), bool(search_corpus)
+
+    def lookup_answer(self, key: Optional[Tuple], question: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached answer; lookup errors are treated as misses."""
+        if key is None:
+            return None
+        try:
+            cached = self.answer_cache.lookup(key, question)
+        except Exception as e:
+            console.print(f"[yellow]查詢回答快取失敗：{str(e)}[/yellow]")
+            return None
+        if cached is not None:
+            console.print(Panel(
+                f"[cyan]Cached question:[/cyan] [yellow]{cached['question']}[/yellow]\n"
+                f"[cyan]Similarity:[/cyan] [green]{cached['similarity']:.3f}[/green]",
+                title="Answer Cache Hit",
+                border_style="green"))
+        return cached
+
+    def remember_answer(self, key: Optional[Tuple], question: str, answer: str):
+        """Store a generated answer; storage errors are only logged."""
+        if key is None or not answer:
+            return
+        try:
+            self.answer_cache.store(key, question, answer)
+        except Exception as e:
+            console.print(f"[yellow]儲存回答快取失敗：{str(e)}[/yellow]")
+
+    def _warm_up(self):
+        """
+        Load the research model and evaluate the static final-summary system prompt
+        once, so the first request can reuse the cached prefix.
+        """
+        try:
+            self.research_llm.invoke(
+                [SystemMessage(content=final_summary_system_prompt),
+                 HumanMessage(content="")],
+                options={"num_predict": 1},
+                config={"metadata": {"node": "warm_up"}})
+            console.print("[green]研究模型預熱完成[/green]")
+        except Exception as e:
+            console.print(f"[yellow]研究模型預熱失敗：{str(e)}[/yellow]")
 
-        self.graph = self._build_graph()
+    def llm_timing_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return the accumulated Ollama prompt-eval / eval timings per node."""
+        return self.llm_timing.stats()
 
     def process_input(self, user_input: str, image_data: Optional[str] = None,
                       enable_web_research: bool = False,
                       enable_chat_with_picture: bool = False,
-                      pdf_filename: Optional[str] = None) -> Dict[str, Any]:
+                      pdf_filename: Optional[str] = None,
+                      search_corpus: bool = False) -> Dict[str, Any]:
         """Process user input and optional image data"""
-        inputs = {
-            "research_topic": user_input,
-            "enable_web_research": enable_web_research,
-            "enable_chat_with_picture": enable_chat_with_picture,
-            "base64_image": image_data,
-            "pdf_filename": pdf_filename
-        }
+        inputs = self._build_inputs(user_input, image_data, enable_web_research,
+                                    enable_chat_with_picture, pdf_filename,
+                                    search_corpus)
 
         # Create a progress display
         with Progress(
@@ -69,8 +197,10 @@ class ResearchAgent:
             task = progress.add_task("[cyan]Processing input...", total=None)
             start_time = time.time()
 
-            # Execute the graph with inputs
-            result = self.graph.invoke(inputs)
+            # Execute the graph matching the enabled features
+            graph = self._get_graph(enable_web_research,
+                                    enable_chat_with_picture and bool(image_data))
+            result = graph.invoke(inputs)
 
             end_time = time.time()
             elapsed = end_time - start_time
@@ -83,37 +213,119 @@ class ResearchAgent:
 
         return result
 
-    def _build_graph(self) -> StateGraph:
+    def stream_input(self, user_input: str, image_data: Optional[str] = None,
+                     enable_web_research: bool = False,
+                     enable_chat_with_picture: bool = False,
+                     pdf_filename: Optional[str] = None,
+                     search_corpus: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the research process as events.
+
+        Yields a ``node`` event after each graph node finishes, then ``token``
+        events while the final summary is generated, and a ``done`` event
+        carrying the complete response.
+        """
+        inputs = self._build_inputs(user_input, image_data, enable_web_research,
+                                    enable_chat_with_picture, pdf_filename,
+                                    search_corpus)
+        start_time = time.time()
+        state_values: Dict[str, Any] = dict(inputs)
+
+        graph = self._get_graph(enable_web_research,
+                                enable_chat_with_picture and bool(image_data),
+                                include_finalize=False)
+        for mode, chunk in graph.stream(inputs, stream_mode=["updates", "values"]):
+            if mode == "values":
+                state_values = chunk
+                continue
+            for node_name in chunk:
+                yield {
+                    "type": "node",
+                    "node": node_name,
+                    "elapsed": time.time() - start_time
+                }
+
+        state = SummaryState(**state_values)
+        console.print("[yellow]正在串流最終總結...[/yellow]")
+        first_token_time = None
+        parts: List[str] = []
+
+        for message_chunk in self.research_llm.stream(
+                self._build_final_messages(state),
+                config={"metadata": {"node": "finalize_summary"}}):
+            if not message_chunk.content:
+                continue
+            if first_token_time is None:
+                first_token_time = time.time() - start_time
+            parts.append(message_chunk.content)
+            yield {"type": "token", "content": message_chunk.content}
+
+        final_summary = self._append_sources("".join(parts), state)
+        elapsed = time.time() - start_time
+        console.print(Panel(f"[green]Time to first token: {first_token_time or elapsed:.2f} seconds\n"
+                            f"Total execution time: {elapsed:.2f} seconds",
+                            title="Performance Metrics",
+                            border_style="green"))
+
+        yield {"type": "done", "content": final_summary, "elapsed": elapsed}
+
+    def _build_graph(self, enable_web_research: bool = True,
+                     enable_image_analysis: bool = True,
+                     include_finalize: bool = True) -> StateGraph:
         """Build the state graph for the research process"""
+        # 不含最終總結的圖輸出完整狀態，供串流模式組合提示
         builder = StateGraph(SummaryState,
                              input=SummaryStateInput,
-                             output=SummaryStateOutput)
+                             output=SummaryStateOutput if include_finalize else SummaryState)
 
         # Add nodes
-        builder.add_node("process_image", self._process_image)
-        builder.add_node("generate_query", self._generate_query)
-        builder.add_node("web_research", self._web_research)
-        builder.add_node("summarize_sources", self._summarize_sources)
-        builder.add_node("reflect_on_summary", self._reflect_on_summary)
+        if enable_image_analysis:
+            builder.add_node("process_image", self._process_image)
+        if enable_web_research:
+            builder.add_node("generate_query", self._generate_query)
+            builder.add_node("web_research", self._web_research)
+            builder.add_node("summarize_sources", self._summarize_sources)
+            builder.add_node("reflect_on_summary", self._reflect_on_summary)
         builder.add_node("search_faiss", self._search_faiss)
-        builder.add_node("finalize_summary", self._finalize_summary)
+        if include_finalize:
+            builder.add_node("finalize_summary", self._finalize_summary)
 
         # Add edges
-        builder.add_edge(START, "process_image")
-        builder.add_edge("process_image", "generate_query")
-        builder.add_edge("generate_query", "web_research")
-        builder.add_edge("web_research", "summarize_sources")
-        builder.add_edge("summarize_sources", "reflect_on_summary")
-        builder.add_conditional_edges(
-            "reflect_on_summary",
-            self._route_research,
-            {
-                "continue_research": "web_research",
-                "finalize": "search_faiss"
-            }
-        )
-        builder.add_edge("search_faiss", "finalize_summary")
-        builder.add_edge("finalize_summary", END)
+        # 停用的功能不加入圖中，PDF-only 路徑直接進入向量資料庫搜索
+        final_node = "finalize_summary" if include_finalize else END
+        parallel_faiss = self.configuration.faiss_query_mode == "topic"
+        # 以問題搜索時不需等待研究摘要，向量搜索作為並行分支與第一個節點同時執行。
+        # 它在第一個 superstep 內完成，後續節點執行時結果必定已寫入狀態
+        research_end = final_node if parallel_faiss else "search_faiss"
+        if parallel_faiss:
+            builder.add_edge(START, "search_faiss")
+
+        last_node = START
+        if enable_image_analysis:
+            builder.add_edge(last_node, "process_image")
+            last_node = "process_image"
+        if enable_web_research:
+            builder.add_edge(last_node, "generate_query")
+            builder.add_edge("generate_query", "web_research")
+            builder.add_edge("web_research", "summarize_sources")
+            builder.add_edge("summarize_sources", "reflect_on_summary")
+            builder.add_conditional_edges(
+                "reflect_on_summary",
+                self._route_research,
+                {
+                    "continue_research": "web_research",
+                    "finalize": research_end
+                }
+            )
+        elif last_node != START or not parallel_faiss:
+            builder.add_edge(last_node, research_end)
+
+        # 並行分支只有在沒有其他研究節點時才直接接到最終節點，否則由研究分支接續
+        research_branch = enable_image_analysis or enable_web_research
+        if not parallel_faiss or not research_branch:
+            builder.add_edge("search_faiss", final_node)
+        if include_finalize:
+            builder.add_edge("finalize_summary", END)
 
         return builder.compile()
 
@@ -216,13 +428,12 @@ class ResearchAgent:
             result = {}
         else:
             try:
-                reflection_prompt = reflection_instructions.format(
-                    research_topic=state.research_topic
-                )
+                # 系統提示保持固定，主題放在使用者訊息中以重用 Ollama 的提示快取
                 result = self.research_llm_json.invoke([
-                    SystemMessage(content=reflection_prompt),
+                    SystemMessage(content=reflection_instructions),
                     HumanMessage(
-                        content=f"Identify a knowledge gap and generate a follow-up web search query based on our existing knowledge: {state.running_summary}")
+                        content=f"Topic: {state.research_topic}\n\n"
+                                f"Identify a knowledge gap and generate a follow-up web search query based on our existing knowledge: {state.running_summary}")
                 ])
 
                 reflection_data = json.loads(result.content)
@@ -254,21 +465,48 @@ class ResearchAgent:
 
         return decision
 
+    def _faiss_query(self, state: SummaryState) -> str:
+        """Build the vector search query according to faiss_query_mode"""
+        mode = self.configuration.faiss_query_mode
+        summary = state.running_summary or ""
+        if mode == "summary" and summary:
+            return summary
+        if mode == "mixed" and summary:
+            limit = self.configuration.faiss_query_summary_chars
+            return f"{state.research_topic}\n\n{summary[:limit]}"
+        # 預設使用使用者問題，避免嵌入冗長摘要並提高檢索品質
+        return state.research_topic
+
     def _search_faiss(self, state: SummaryState) -> Dict[str, Any]:
         """Search in FAISS vector database"""
         console.print("[yellow]正在運行向量資料庫搜索分支...[/yellow]")
         start_time = time.time()
 
-        if not state.pdf_filename:
+        if not state.pdf_filename and not state.search_corpus:
             console.print("[yellow]未提供PDF檔名，跳過向量資料庫搜索[/yellow]")
             return {"faiss_results": []}
 
         try:
-            # 使用當前摘要作為搜索查詢
-            results = self.faiss_search_tool.search_similar_content(
-                query=state.running_summary,
-                pdf_filename=state.pdf_filename
-            )
+            hierarchical = None
+            if (self.configuration.retrieval_mode == "hierarchical"
+                    and not state.search_corpus):
+                try:
+                    hierarchical = self._search_hierarchical(state)
+                except Exception as e:
+                    console.print(f"[yellow]階層式檢索失敗，改用原文段落搜索: {e}[/yellow]")
+
+            if hierarchical is not None:
+                results = hierarchical
+            elif state.search_corpus:
+                # 跨文件搜索整個資料庫
+                results = self.faiss_search_tool.search_corpus(
+                    query=self._faiss_query(state)
+                )
+            else:
+                results = self.faiss_search_tool.search_similar_content(
+                    query=self._faiss_query(state),
+                    pdf_filename=state.pdf_filename
+                )
 
             elapsed = time.time() - start_time
             console.print(Panel(
@@ -285,92 +523,139 @@ class ResearchAgent:
             console.print(f"[red]向量資料庫搜索錯誤: {e}[/red]")
             return {"faiss_results": []}
 
-    def _finalize_summary(self, state: SummaryState) -> Dict[str, Any]:
-        """Finalize the summary with all gathered information"""
-        console.print("[yellow]正在運行最終總結分支...[/yellow]")
-        start_time = time.time()
-
-        # 準備FAISS搜索結果
-        faiss_content = ""
-        if state.faiss_results:
-            faiss_passages = [result["content"]
-                              for result in state.faiss_results]
-            faiss_content = "\n\n".join(faiss_passages)
+    def _load_digest(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Load a paper digest and embed its sections, caching both per content hash"""
+        cached = self._digests.get(content_hash)
+        if cached is not None:
+            return cached
+        digest = self.faiss_search_tool.index_store.load_digest(content_hash)
+        if digest is None or not digest.get("sections"):
+            return None
+        # 章節向量經由 embedding 快取計算，重新載入時不需再次呼叫模型
+        vectors = np.asarray(self.faiss_search_tool.embeddings.embed_documents([
+            f"{section['title']}\n{section['summary']}" for section in digest["sections"]
+        ]), dtype="float32")
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        cached = {"digest": digest, "vectors": vectors}
+        self._digests.put(content_hash, cached)
+        return cached
+
+    def _search_hierarchical(self, state: SummaryState) -> Optional[List[Dict[str, Any]]]:
+        """
+        Retrieve context from the paper digest first, then a few supporting chunks.
+
+        Returns the overview and the sections most similar to the question as
+        passages, followed by at most ``hierarchical_chunks`` chunks taken only
+        from the pages of those sections. Returns None when the paper has no
+        digest, so the caller falls back to plain chunk retrieval.
+        """
+        content_hash = self.faiss_search_tool.index_store.get_hash(state.pdf_filename)
+        loaded = self._load_digest(content_hash) if content_hash else None
+        if loaded is None:
+            return None
+        digest, vectors = loaded["digest"], loaded["vectors"]
+
+        query = self._faiss_query(state)
+        query_vector = np.asarray(self.faiss_search_tool.embeddings.embed_query(query),
+                                  dtype="float32")
+        query_vector /= np.linalg.norm(query_vector) + 1e-12
+        similarities = vectors @ query_vector
+        top = np.argsort(-similarities)[:max(1, self.configuration.hierarchical_sections)]
+        # 選出的章節依原文順序排列
+        selected = [(int(index), float(similarities[index])) for index in sorted(top)]
+
+        # 摘要段落的分數為餘弦距離（概述固定為 0，最優先），原文段落為 FAISS 的 L2 距離；
+        # build_context 以 metadata 的 digest 標記將摘要段落排在原文段落之前，不跨尺度比較分數
+        overview = digest.get("overview") or digest.get("abstract")
+        results: List[Dict[str, Any]] = []
+        if overview:
+            results.append({"content": f"[Paper overview]\n{overview}", "score": 0.0,
+                            "metadata": {"digest": True, "section": "overview"}})
+        for index, similarity in selected:
+            section = digest["sections"][index]
+            content = f"[{section['title']}]\n{section['summary']}"
+            if section.get("equations"):
+                content += "\nKey equations: " + "; ".join(section["equations"])
+            results.append({"content": content, "score": 1.0 - similarity,
+                            "metadata": {"digest": True, "section": section["title"],
+                                         "pages": section["pages"]}})
+
+        # 只從選出章節的頁面取少量原文段落補充細節
+        chunk_limit = self.configuration.hierarchical_chunks
+        if chunk_limit > 0:
+            ranges = [digest["sections"][index]["pages"] for index, _ in selected]
+            candidates = self.faiss_search_tool.search_similar_content(
+                query=query, pdf_filename=state.pdf_filename, top_k=chunk_limit * 4)
+            chunks = [result for result in candidates
+                      if any(first <= result["metadata"].get("page", -1) <= last
+                             for first, last in ranges)]
+            results.extend((chunks or candidates)[:chunk_limit])
+        return results
+
+    def _format_passage(self, result: Dict[str, Any]) -> str:
+        """Format a retrieved passage, labelling its source for cross-paper results"""
+        metadata = result.get("metadata") or {}
+        if "pdf_filename" not in metadata:
+            return result["content"]
+        page = metadata.get("page")
+        page_label = f" p.{page + 1}" if isinstance(page, int) else ""
+        return f"[{metadata['pdf_filename']}{page_label}]\n{result['content']}"
+
+    def _build_final_messages(self, state: SummaryState) -> List[Any]:
+        """Build the messages for the final summary LLM call"""
+        # 在 token 預算內組合研究總結與FAISS搜索結果（合併重疊段落，超出預算時截斷）
+        running_summary, faiss_content, context_stats = build_context(
+            state.running_summary or state.research_topic,
+            state.faiss_results or [],
+            budget=self.configuration.context_token_budget,
+            summary_share=self.configuration.context_summary_share,
+            format_passage=self._format_passage
+        )
 
-        # 準備提示
+        # 固定的系統提示（格式與數學公式規範）在前，動態內容只出現在其後的使用者訊息，
+        # 使每個請求的提示前綴完全相同，Ollama 可重用前綴的 KV 快取
         prompt = (
-            f"請使用繁體中文生成最終總結報告。\n\n"
             f"研究主題：{state.research_topic}\n\n"
-            f"當前總結內容：\n{state.running_summary}\n\n"
-            f"向量資料庫相關內容：\n{faiss_content}\n\n"
-            f"注意事項：\n"
-            f"1. 必須使用繁體中文輸出\n"
-            f"2. 技術術語可以附上英文原文\n"
-            f"3. 保持專業和學術性的寫作風格\n"
-            f"4. 確保內容的連貫性和完整性\n\n"
-            f"數學公式格式規範：\n"
-            f"1. 文字中的數學公式（行內公式）：\n"
-            f"   - 必須且只能使用單個 $ 符號，禁止使用其他分隔符如 \\( \\) 或 \\[ \\]\n"
-            f"   - 符號前後必須有空格\n"
-            f"   - 正確範例：\n"
-            f"     * 矩陣 $ K $ 的轉置記為 $ K^T $\n"
-            f"     * 向量 $ v $ 的長度為 $ \\|v\\| $\n"
-            f"     * 函數 $ f(x) $ 在點 $ x = a $ 的導數\n"
-            f"   - 錯誤範例：\n"
-            f"     * 矩陣\\(K\\)的轉置（使用了錯誤的分隔符）\n"
-            f"     * 向量$v$的長度（分隔符前後沒有空格）\n"
-            f"2. 獨立顯示的數學公式：\n"
-            f"   - 必須使用雙 $$ 符號\n"
-            f"   - 符號前後必須有空格\n"
-            f"   - 例如：\n"
-            f"     $$ \\frac{{d}}{{dx}}f(x) = \\lim_{{h \\to 0}}\\frac{{f(x+h)-f(x)}}{{h}} $$\n"
-            f"3. 重要規定：\n"
-            f"   - 所有數學符號和表達式都必須使用 $ 或 $$ 作為分隔符，禁止使用其他分隔符\n"
-            f"   - 複雜的數學表達式也必須使用 $ 符號，例如：\n"
-            f"     * 矩陣運算 $ A_{{ij}} = \\sum_{{k=1}}^n B_{{ik}}C_{{kj}} $\n"
-            f"     * 概率表達式 $ P(X \\leq x) = \\int_{{-\\infty}}^x f(t)dt $"
+            f"當前總結內容：\n{running_summary}\n\n"
+            f"向量資料庫相關內容：\n{faiss_content}"
         )
 
-        # 使用LLM生成最終總結
-        result = self.research_llm.invoke([
-            SystemMessage(content=final_summarize_instructions),
-            SystemMessage(content=(
-                "您必須嚴格遵守以下數學公式格式規則：\n\n"
-                "1. 行內數學公式的規定：\n"
-                "   - 必須使用單個 $ 符號作為分隔符\n"
-                "   - 嚴禁使用 \\( \\) 或其他分隔符\n"
-                "   - 分隔符前後必須有空格\n"
-                "   - 範例：\n"
-                "     * 正確：矩陣 $ K $ 和向量 $ v $ 的乘積為 $ Kv $\n"
-                "     * 正確：當 $ n \\to \\infty $ 時函數值為 $ f(x) $\n"
-                "     * 錯誤：\\(K\\) 和 \\(v\\) 的乘積（使用了錯誤的分隔符）\n"
-                "     * 錯誤：矩陣$K$的值（分隔符前後沒有空格）\n\n"
-                "2. 獨立數學公式的規定：\n"
-                "   - 必須使用雙 $$ 符號\n"
-                "   - 分隔符前後必須有空格\n"
-                "   - 範例：\n"
-                "     $$ \\int_{{0}}^{{\\infty}} e^{{-x}} dx = 1 $$\n\n"
-                "3. 數學符號使用規則：\n"
-                "   - 所有數學符號必須使用 LaTeX 語法\n"
-                "   - 必須使用 $ 或 $$ 作為分隔符，嚴禁使用其他分隔符\n"
-                "   - 範例：\n"
-                "     * 矩陣乘法：$ AB = \\sum_{{k=1}}^n a_{{ik}}b_{{kj}} $\n"
-                "     * 向量內積：$ \\langle u, v \\rangle = u^T v $\n"
-                "     * 概率密度：$ f(x) = \\frac{{1}}{{\\sqrt{{2\\pi}}}}e^{{-x^2/2}} $\n\n"
-                "4. 語言要求：\n"
-                "   - 使用繁體中文\n"
-                "   - 技術術語需要時可附上英文\n"
-                "   - 保持專業的學術寫作風格"
-            )),
+        messages = [
+            SystemMessage(content=final_summary_system_prompt),
             HumanMessage(content=prompt)
-        ])
-
-        final_summary = result.content
-
+        ]
+
+        prompt_tokens = sum(estimate_tokens(message.content) for message in messages)
+        console.print(Panel(
+            f"[cyan]Prompt tokens (estimated):[/cyan] [green]{prompt_tokens}[/green]\n"
+            f"[cyan]Context budget:[/cyan] {context_stats['budget']} "
+            f"(summary {context_stats['summary_tokens']}"
+            f"{', trimmed' if context_stats['summary_trimmed'] else ''}, "
+            f"passages {context_stats['passage_tokens']})\n"
+            f"[cyan]Passages:[/cyan] {context_stats['included']} of {context_stats['retrieved']} included, "
+            f"{context_stats['merged']} merged, {context_stats['truncated']} truncated, "
+            f"{context_stats['dropped']} dropped",
+            title="Final Prompt Context",
+            border_style="blue"))
+        return messages
+
+    def _append_sources(self, summary: str, state: SummaryState) -> str:
+        """Append gathered web sources to the summary"""
         # 添加來源信息
         if state.sources_gathered:
             sources_text = "\n".join(state.sources_gathered)
-            final_summary = f"{final_summary}\n\n### Sources:\n{sources_text}"
+            summary = f"{summary}\n\n### Sources:\n{sources_text}"
+        return summary
+
+    def _finalize_summary(self, state: SummaryState) -> Dict[str, Any]:
+        """Finalize the summary with all gathered information"""
+        console.print("[yellow]正在運行最終總結分支...[/yellow]")
+        start_time = time.time()
+
+        # 使用LLM生成最終總結
+        result = self.research_llm.invoke(self._build_final_messages(state))
+
+        final_summary = self._append_sources(result.content, state)
 
         result = {"running_summary": final_summary}
 
@@ -0,0 +1,194 @@
+import math
+from typing import List, Optional
+
+import faiss
+import numpy as np
+
+# 支援的 FAISS index 類型
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+# FAISS 建議每個 IVF 分群至少要有的訓練向量數量
+MIN_POINTS_PER_CENTROID = 39
+# 8-bit PQ 每個子空間有 256 個中心點，訓練向量至少要有這麼多
+PQ_CENTROIDS = 256
+# 串流建立 IVF-PQ 時用於訓練的向量數量，足以讓 PQ 的每個中心點都有足夠的訓練向量，
+# 超過後的向量直接加入已訓練的 index
+IVF_TRAIN_SAMPLE = MIN_POINTS_PER_CENTROID * PQ_CENTROIDS
+
+
+def _pq_subquantizers(dimension: int, requested: int) -> int:
+    """返回不大於 requested 且能整除向量維度的子量化器數量"""
+    for m in range(min(requested, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def build_faiss_index(vectors: np.ndarray, index_type: str = "flat",
+                      hnsw_m: int = 32, hnsw_ef_construction: int = 80,
+                      ivf_nlist: Optional[int] = None, pq_m: Optional[int] = None) -> faiss.Index:
+    """
+    依指定類型建立 FAISS index 並加入向量
+
+    IVF-PQ 需要訓練，向量數量不足以訓練時自動改用 flat index。
+
+    Args:
+        vectors (np.ndarray): float32 向量矩陣，形狀為 (n, d)
+        index_type (str): "flat"、"hnsw" 或 "ivfpq"
+        hnsw_m (int): HNSW 每個節點的鄰居數量
+        hnsw_ef_construction (int): HNSW 建構時的搜索寬度
+        ivf_nlist (Optional[int]): IVF 分群數量，None 表示依向量數量自動決定
+        pq_m (Optional[int]): PQ 子量化器數量（會調整為能整除維度的值），
+            None 表示每 4 個維度一個子量化器
+
+    Returns:
+        faiss.Index: 已加入向量的 index
+    """
+    index = create_faiss_index(vectors.shape[1], index_type, len(vectors),
+                               hnsw_m, hnsw_ef_construction, ivf_nlist, pq_m)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def create_faiss_index(dimension: int, index_type: str = "flat",
+                       expected_vectors: int = 0,
+                       hnsw_m: int = 32, hnsw_ef_construction: int = 80,
+                       ivf_nlist: Optional[int] = None, pq_m: Optional[int] = None) -> faiss.Index:
+    """
+    建立尚未加入向量的 FAISS index
+
+    Args:
+        dimension (int): 向量維度
+        index_type (str): "flat"、"hnsw" 或 "ivfpq"
+        expected_vectors (int): 可用於訓練的向量數量，決定 IVF 分群數量與是否退回 flat
+        其餘參數同 build_faiss_index
+
+    Returns:
+        faiss.Index: 空的 index，IVF-PQ 需要再呼叫 train()
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type: {index_type}")
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = hnsw_ef_construction
+        return index
+
+    if index_type == "ivfpq":
+        # 自動分群數量取 4*sqrt(n)，並確保每個分群有足夠的訓練向量
+        nlist = ivf_nlist or max(1, min(int(4 * math.sqrt(max(expected_vectors, 1))),
+                                        expected_vectors // MIN_POINTS_PER_CENTROID))
+        if expected_vectors >= max(nlist * MIN_POINTS_PER_CENTROID, PQ_CENTROIDS):
+            quantizer = faiss.IndexFlatL2(dimension)
+            return faiss.IndexIVFPQ(quantizer, dimension, nlist,
+                                    _pq_subquantizers(dimension, pq_m or dimension // 4), 8)
+        # 向量太少無法訓練，退回精確搜索
+
+    return faiss.IndexFlatL2(dimension)
+
+
+class IncrementalIndexBuilder:
+    """
+    逐批加入向量的 FAISS index 建構器
+
+    flat 與 HNSW 在收到第一批向量時建立 index，之後每批直接加入。
+    IVF-PQ 需要先訓練，會先暫存向量直到達到 train_sample 筆，以這些向量
+    訓練後再一併加入；向量總數不足時在 finish() 以現有向量建立（可能退回 flat）。
+    暫存量有上限，記憶體用量不隨文件長度增加。
+    """
+
+    def __init__(self, index_type: str = "flat", hnsw_m: int = 32,
+                 hnsw_ef_construction: int = 80, ivf_nlist: Optional[int] = None,
+                 pq_m: Optional[int] = None, train_sample: int = IVF_TRAIN_SAMPLE):
+        """
+        Args:
+            index_type (str): "flat"、"hnsw" 或 "ivfpq"
+            train_sample (int): IVF-PQ 訓練使用的向量數量
+            其餘參數同 build_faiss_index
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.ivf_nlist = ivf_nlist
+        self.pq_m = pq_m
+        self.train_sample = train_sample
+        self.index: Optional[faiss.Index] = None
+        self._pending: List[np.ndarray] = []
+        self._pending_count = 0
+
+    @property
+    def ntotal(self) -> int:
+        """已加入（含暫存）的向量數量"""
+        return (self.index.ntotal if self.index is not None else 0) + self._pending_count
+
+    def add(self, vectors: np.ndarray):
+        """
+        加入一批 float32 向量，順序即為 index 中的位置
+
+        Args:
+            vectors (np.ndarray): 形狀為 (n, d) 的向量
+        """
+        if len(vectors) == 0:
+            return
+        if self.index is not None:
+            self.index.add(vectors)
+            return
+        if self.index_type != "ivfpq":
+            self._create(vectors)
+            return
+        self._pending.append(vectors)
+        self._pending_count += len(vectors)
+        if self._pending_count >= self.train_sample:
+            self._flush()
+
+    def finish(self) -> Optional[faiss.Index]:
+        """
+        建立並返回 index，沒有任何向量時返回 None
+        """
+        if self.index is None and self._pending:
+            self._flush()
+        return self.index
+
+    def _flush(self):
+        """以暫存的向量建立（並訓練）index"""
+        vectors = np.vstack(self._pending)
+        self._pending, self._pending_count = [], 0
+        self._create(vectors)
+
+    def _create(self, vectors: np.ndarray):
+        self.index = create_faiss_index(vectors.shape[1], self.index_type, len(vectors),
+                                        self.hnsw_m, self.hnsw_ef_construction,
+                                        self.ivf_nlist, self.pq_m)
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.index.add(vectors)
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """返回 index 的類型名稱"""
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivfpq"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def apply_search_params(index: faiss.Index, ef_search: Optional[int] = None,
+                        nprobe: Optional[int] = None):
+    """
+    設定 ANN index 的搜索參數，flat index 不受影響
+
+    Args:
+        index (faiss.Index): FAISS index
+        ef_search (Optional[int]): HNSW 搜索寬度
+        nprobe (Optional[int]): IVF 搜索的分群數量
+    """
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    ivf = faiss.try_extract_index_ivf(index)
+    if nprobe is not None and ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
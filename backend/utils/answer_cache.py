@@ -0,0 +1,172 @@
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .lru_cache import LRUCache
+
+
+class _AnswerPartition:
+    """單一 (文件, 功能旗標) 組合的問題向量 index 與回答"""
+
+    def __init__(self, dimension: int):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self.entries: Dict[int, Dict[str, Any]] = {}
+        self.next_id = 0
+
+
+class SemanticAnswerCache:
+    """
+    研究問題的語意回答快取
+
+    以 (PDF 內容雜湊, 功能旗標) 分區，每個分區有一個小型 FAISS 內積 index，
+    存放正規化後的問題向量。新問題與已回答問題的餘弦相似度達到 threshold 時，
+    直接返回已儲存的回答而不執行研究流程。
+
+    淘汰策略：每個分區最多 max_entries 個回答，超出時移除最久未命中的回答；
+    回答在 ttl 秒後過期；最多保留 max_partitions 個分區（LRU）。
+    PDF 內容改變時雜湊隨之改變，舊回答不會再被命中，最後被 LRU 淘汰。
+    """
+
+    def __init__(self, embeddings: Embeddings, threshold: float = 0.92,
+                 max_entries: int = 256, max_partitions: int = 32,
+                 ttl: Optional[float] = 24 * 60 * 60):
+        """
+        Args:
+            embeddings (Embeddings): 計算問題向量的 embedding 模型
+            threshold (float): 視為相同問題的最低餘弦相似度
+            max_entries (int): 每個分區最多保留的回答數量
+            max_partitions (int): 最多保留的分區數量
+            ttl (Optional[float]): 回答的存活秒數，None 表示不過期
+        """
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.partitions = LRUCache(max_entries=max_partitions)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray([self.embeddings.embed_query(question)], dtype='float32')
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _nearest(self, partition: _AnswerPartition,
+                 vector: np.ndarray) -> Tuple[Optional[int], float]:
+        """返回最相似的回答 id 與相似度，分區為空時 id 為 None"""
+        if partition.index.ntotal == 0:
+            return None, 0.0
+        scores, ids = partition.index.search(vector, 1)
+        if ids[0][0] < 0:
+            return None, 0.0
+        return int(ids[0][0]), float(scores[0][0])
+
+    def _remove(self, partition: _AnswerPartition, entry_id: int):
+        partition.index.remove_ids(np.asarray([entry_id], dtype='int64'))
+        del partition.entries[entry_id]
+
+    def lookup(self, key: Hashable, question: str) -> Optional[Dict[str, Any]]:
+        """
+        查詢相似問題的回答
+
+        Args:
+            key (Hashable): 分區鍵，通常為 (PDF 內容雜湊, 功能旗標)
+            question (str): 使用者問題
+
+        Returns:
+            Optional[Dict[str, Any]]: {'answer', 'question', 'similarity', 'createdAt'}，未命中時返回 None
+        """
+        vector = self._embed(question)
+        with self._lock:
+            partition = self.partitions.get(key)
+            entry_id, similarity = (None, 0.0) if partition is None else self._nearest(
+                partition, vector)
+            if entry_id is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            entry = partition.entries[entry_id]
+            if self.ttl is not None and time.time() - entry['created_at'] > self.ttl:
+                self._remove(partition, entry_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            entry['last_hit'] = time.time()
+            entry['hits'] += 1
+            self.hits += 1
+            return {
+                'answer': entry['answer'],
+                'question': entry['question'],
+                'similarity': similarity,
+                'createdAt': entry['created_at']
+            }
+
+    def store(self, key: Hashable, question: str, answer: str):
+        """
+        儲存回答；已有相似度達門檻的問題時取代其回答
+
+        Args:
+            key (Hashable): 分區鍵
+            question (str): 使用者問題
+            answer (str): 研究流程產生的回答
+        """
+        vector = self._embed(question)
+        with self._lock:
+            partition = self.partitions.get(key)
+            if partition is None:
+                partition = _AnswerPartition(vector.shape[1])
+                self.partitions.put(key, partition)
+            entry_id, similarity = self._nearest(partition, vector)
+            if entry_id is not None and similarity >= self.threshold:
+                self._remove(partition, entry_id)
+            while len(partition.entries) >= self.max_entries:
+                oldest = min(partition.entries,
+                             key=lambda item: partition.entries[item]['last_hit'])
+                self._remove(partition, oldest)
+                self.evictions += 1
+
+            entry_id = partition.next_id
+            partition.next_id += 1
+            partition.index.add_with_ids(vector, np.asarray([entry_id], dtype='int64'))
+            now = time.time()
+            partition.entries[entry_id] = {
+                'question': question,
+                'answer': answer,
+                'created_at': now,
+                'last_hit': now,
+                'hits': 0
+            }
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """
+        清除回答
+
+        Args:
+            key (Optional[Hashable]): 分區鍵，None 表示清除全部
+        """
+        with self._lock:
+            if key is None:
+                self.partitions.clear()
+            else:
+                self.partitions.pop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回快取的統計資訊"""
+        with self._lock:
+            return {
+                'partitions': len(self.partitions),
+                'entries': sum(len(partition.entries)
+                               for partition in self.partitions.values()),
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'partition_evictions': self.partitions.evictions
+            }
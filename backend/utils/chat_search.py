@@ -0,0 +1,201 @@
+import html
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+# 預設的對話搜尋索引路徑
+DEFAULT_CHAT_SEARCH_PATH = os.getenv(
+    'CHAT_SEARCH_PATH', os.path.join('cache', 'chat_search.sqlite3'))
+# trigram 分詞器能比對的最短詞長，較短的詞改用 LIKE 比對
+MIN_MATCH_CHARS = 3
+# snippet() 標示符合處的暫用字元，內容跳脫 HTML 後才換成 <mark> 標籤
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+
+
+def _index_content(content: Any) -> str:
+    """返回要索引的訊息內容，移除與 snippet 暫用標示相同的控制字元"""
+    return str(content or '').replace(_MATCH_START, '').replace(_MATCH_END, '')
+
+
+def _snippet_html(snippet: str) -> str:
+    """跳脫對話內容中的 HTML，再將符合處的暫用字元換成 <mark> 標籤"""
+    escaped = html.escape(snippet)
+    return escaped.replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>')
+
+
+class ChatSearchIndex:
+    """
+    所有對話記錄的全文搜尋索引
+
+    以 SQLite FTS5 的 trigram 分詞器建立倒排索引，中英文都能以子字串搜尋，
+    搜尋時間不隨對話記錄檔的數量增加。訊息存放在 chat_messages 表，
+    FTS5 表以外部內容方式引用它並由觸發器維護。每則訊息寫入對話記錄時同步加入索引，
+    indexed_logs 表記錄每份對話記錄已索引的訊息數量，啟動時只需補上尾端缺少的訊息。
+    """
+
+    def __init__(self, path: str = DEFAULT_CHAT_SEARCH_PATH):
+        """
+        Args:
+            path (str): SQLite 資料庫路徑
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS indexed_logs ('
+            ' log TEXT PRIMARY KEY,'
+            ' count INTEGER NOT NULL);'
+            'CREATE TABLE IF NOT EXISTS chat_messages ('
+            ' id INTEGER PRIMARY KEY,'
+            ' log TEXT NOT NULL,'
+            ' seq INTEGER NOT NULL,'
+            ' message_id TEXT,'
+            ' role TEXT,'
+            ' timestamp TEXT,'
+            ' content TEXT NOT NULL);'
+            'CREATE UNIQUE INDEX IF NOT EXISTS chat_messages_log_seq'
+            ' ON chat_messages (log, seq);'
+            'CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5('
+            " content, content='chat_messages', content_rowid='id', tokenize='trigram');"
+            'CREATE TRIGGER IF NOT EXISTS chat_messages_insert AFTER INSERT ON chat_messages BEGIN'
+            ' INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);'
+            ' END;'
+            'CREATE TRIGGER IF NOT EXISTS chat_messages_delete AFTER DELETE ON chat_messages BEGIN'
+            " INSERT INTO messages_fts (messages_fts, rowid, content)"
+            " VALUES ('delete', old.id, old.content);"
+            ' END;')
+        self._conn.commit()
+
+    def indexed_count(self, log: str) -> int:
+        """返回對話記錄已索引的訊息數量"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT count FROM indexed_logs WHERE log = ?', (log,)).fetchone()
+        return row[0] if row else 0
+
+    def add_messages(self, log: str, start: int, messages: List[Dict[str, Any]]):
+        """
+        將對話記錄中從序號 start 開始的訊息加入索引
+
+        Args:
+            log (str): 對話記錄名稱（PDF 文件名稱去掉副檔名）
+            start (int): 第一則訊息在對話記錄中的序號
+            messages (List[Dict[str, Any]]): 依序排列的訊息
+        """
+        rows = [(_index_content(message.get('content')), log, start + offset,
+                 message.get('id'), message.get('role'), message.get('timestamp'))
+                for offset, message in enumerate(messages)]
+        with self._lock:
+            # 同一序號可能在中斷後重新索引，先刪除舊資料
+            self._conn.execute(
+                'DELETE FROM chat_messages WHERE log = ? AND seq >= ?', (log, start))
+            self._conn.executemany(
+                'INSERT INTO chat_messages (content, log, seq, message_id, role, timestamp)'
+                ' VALUES (?, ?, ?, ?, ?, ?)', rows)
+            self._conn.execute(
+                'INSERT INTO indexed_logs (log, count) VALUES (?, ?)'
+                ' ON CONFLICT(log) DO UPDATE SET count = excluded.count',
+                (log, start + len(messages)))
+            self._conn.commit()
+
+    def remove(self, log: Optional[str] = None):
+        """
+        從索引中移除對話記錄
+
+        Args:
+            log (Optional[str]): 對話記錄名稱，None 表示移除全部
+        """
+        with self._lock:
+            if log is None:
+                self._conn.execute('DELETE FROM chat_messages')
+                self._conn.execute('DELETE FROM indexed_logs')
+            else:
+                self._conn.execute('DELETE FROM chat_messages WHERE log = ?', (log,))
+                self._conn.execute('DELETE FROM indexed_logs WHERE log = ?', (log,))
+            self._conn.commit()
+
+    def search(self, query: str, logs: Optional[List[str]] = None,
+               role: Optional[str] = None, limit: int = 20,
+               offset: int = 0) -> Dict[str, Any]:
+        """
+        搜尋對話記錄
+
+        每個以空白分隔的詞都必須出現在訊息中；結果依 bm25 相關性排序。
+        短於三個字元的詞無法使用 trigram 索引，改以 LIKE 比對。
+
+        Args:
+            query (str): 搜尋字串
+            logs (Optional[List[str]]): 只搜尋這些對話記錄，None 表示全部
+            role (Optional[str]): 只搜尋此角色（'user' 或 'assistant'）的訊息
+            limit (int): 每頁結果數量
+            offset (int): 略過的結果數量
+
+        Returns:
+            Dict[str, Any]: {'total': 符合的訊息總數, 'results': 這一頁的結果}，
+                結果的 snippet 是已跳脫的 HTML，符合處以 <mark> 標示
+        """
+        terms = query.split()
+        if not terms:
+            return {'total': 0, 'results': []}
+
+        long_terms = [term for term in terms if len(term) >= MIN_MATCH_CHARS]
+        short_terms = [term for term in terms if len(term) < MIN_MATCH_CHARS]
+        conditions, params = [], []
+        if long_terms:
+            conditions.append('messages_fts MATCH ?')
+            params.append(' '.join('"{}"'.format(term.replace('"', '""'))
+                                   for term in long_terms))
+        for term in short_terms:
+            conditions.append("m.content LIKE ? ESCAPE '\\'")
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+        if logs is not None:
+            if not logs:
+                return {'total': 0, 'results': []}
+            conditions.append('m.log IN ({})'.format(', '.join('?' * len(logs))))
+            params.extend(logs)
+        if role:
+            conditions.append('m.role = ?')
+            params.append(role)
+        where = ' AND '.join(conditions)
+        # 只有 MATCH 查詢能計算 bm25 與片段，其餘依時間排序
+        if long_terms:
+            source = 'messages_fts JOIN chat_messages m ON m.id = messages_fts.rowid'
+            columns = ("bm25(messages_fts) AS score,"
+                       f" snippet(messages_fts, 0, '{_MATCH_START}', '{_MATCH_END}', '…', 64)")
+            order = 'score'
+        else:
+            source = 'chat_messages m'
+            columns = 'NULL AS score, substr(m.content, 1, 200)'
+            order = 'm.timestamp DESC'
+
+        with self._lock:
+            total = self._conn.execute(
+                f'SELECT COUNT(*) FROM {source} WHERE {where}', params).fetchone()[0]
+            rows = self._conn.execute(
+                f'SELECT m.log, m.seq, m.message_id, m.role, m.timestamp, {columns}'
+                f' FROM {source} WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?',
+                params + [limit, offset]).fetchall()
+
+        return {
+            'total': total,
+            'results': [{
+                'log': log,
+                'seq': seq,
+                'id': message_id,
+                'role': message_role,
+                'timestamp': timestamp,
+                'score': -score if score is not None else None,
+                'snippet': _snippet_html(snippet)
+            } for log, seq, message_id, message_role, timestamp, score, snippet in rows]
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
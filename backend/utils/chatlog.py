@@ -1,7 +1,13 @@
 import os
+import io
 import json
+import struct
+import threading
+import time
 import datetime
-from typing import List, Dict, Any, Optional, Tuple
+import atexit
+from array import array
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 from langchain_community.chat_message_histories import FileChatMessageHistory
 from langchain.schema import messages_from_dict, messages_to_dict, HumanMessage, AIMessage, BaseMessage
 from langchain.memory.chat_message_histories.in_memory import ChatMessageHistory
@@ -9,6 +15,8 @@ from rich.console import Console
 from rich import print as rprint
 from rich.panel import Panel
 from rich.traceback import install
+from .lru_cache import LRUCache
+from .chat_search import ChatSearchIndex
 
 # 安裝 rich 的異常追蹤
 install(show_locals=True)
@@ -17,70 +25,399 @@ install(show_locals=True)
 console = Console()
 
 
+# 舊版整份改寫的 JSON 對話記錄檔名，載入時自動遷移
+LEGACY_CHATLOG_NAME = 'chatlog.json'
+# 每行一則訊息的 JSONL 對話記錄與其位移索引
+CHATLOG_NAME = 'chatlog.jsonl'
+CHATLOG_INDEX_NAME = 'chatlog.idx'
+# 位移索引中每則訊息起始位置的格式（8 位元組無號整數）
+_OFFSET = struct.Struct('<Q')
+# 無法解析的舊版記錄檔改名保留，不直接刪除
+LEGACY_CORRUPT_SUFFIX = '.corrupt'
+# 載入時抽查索引位移是否指向行首的數量
+INDEX_SAMPLE_SIZE = 64
+# 串流途中用戶端中斷連線時，附加在已保存的部分回應之後
+INTERRUPTED_NOTE = '（回應因連線中斷而未完成）'
+
+
 class CustomFileChatMessageHistory:
-    """自定義的檔案對話歷史管理器"""
+    """
+    自定義的檔案對話歷史管理器
+
+    訊息以 JSONL 格式附加寫入，每則訊息只寫入一次，不會重寫整份檔案；
+    旁邊的位移索引記錄每則訊息的起始位置，讀取最近 N 則訊息時只需讀取檔案尾端。
+    寫入後立即 flush，fsync 則每 fsync_every 則訊息或 fsync_interval 秒批次執行一次。
+    """
 
-    def __init__(self, filepath: str, encoding: str = 'utf-8'):
+    def __init__(self, filepath: str, encoding: str = 'utf-8',
+                 fsync_every: int = 16, fsync_interval: float = 1.0):
+        """
+        Args:
+            filepath (str): JSONL 對話記錄檔案路徑
+            encoding (str): 檔案編碼
+            fsync_every (int): 累積多少則未 fsync 的訊息後執行 fsync
+            fsync_interval (float): 距離上次 fsync 超過多少秒後執行 fsync
+        """
         self.filepath = filepath
+        self.index_path = os.path.join(os.path.dirname(filepath), CHATLOG_INDEX_NAME)
         self.encoding = encoding
-        self.messages = []
-        self._load_messages()
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        # 以 8 位元組整數陣列保存位移，每則訊息只佔 8 位元組記憶體
+        self._offsets = array('Q')
+        self._log = None
+        self._index = None
+        self._pending = 0
+        self._last_fsync = time.monotonic()
+        self._lock = threading.Lock()
+        self._migrate_legacy()
+        self._load_index()
+
+    def _migrate_legacy(self):
+        """將舊版的 chatlog.json 轉換為 JSONL 與位移索引"""
+        legacy_path = os.path.join(os.path.dirname(self.filepath), LEGACY_CHATLOG_NAME)
+        if not os.path.exists(legacy_path) or os.path.exists(self.filepath):
+            return
+        try:
+            with open(legacy_path, 'r', encoding=self.encoding) as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            data = None
+        if not isinstance(data, list):
+            # 保留無法解析的原始檔案供人工救回，以空的記錄開始
+            os.replace(legacy_path, legacy_path + LEGACY_CORRUPT_SUFFIX)
+            console.print(f"[yellow]無法解析 {legacy_path}，已改名為 "
+                          f"{LEGACY_CHATLOG_NAME}{LEGACY_CORRUPT_SUFFIX}[/yellow]")
+            return
+        # 新記錄檔已 fsync 並以 os.replace 寫入後才刪除舊檔
+        self._rewrite(data)
+        os.remove(legacy_path)
+        console.print(f"[green]已將 {legacy_path} 遷移為 JSONL 格式[/green]")
+
+    def _load_index(self):
+        """
+        讀取位移索引，並以記錄檔尾端修正索引
 
-    def _load_messages(self):
-        """從檔案載入訊息"""
-        if os.path.exists(self.filepath):
-            try:
-                with open(self.filepath, 'r', encoding=self.encoding) as f:
-                    data = json.load(f)
-                    if isinstance(data, list):
-                        self.messages = data
-                    else:
-                        self.messages = []
-            except json.JSONDecodeError:
-                self.messages = []
-        else:
-            self.messages = []
-
-    def _save_messages(self):
-        """保存訊息到檔案"""
+        寫入中斷時，記錄檔可能多出索引中沒有的訊息或殘留不完整的最後一行：
+        從索引中最後一則訊息開始重新掃描，補上缺少的位移並截斷不完整的行。
+        """
+        if not os.path.exists(self.filepath):
+            self._offsets = array('Q')
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            return
+
+        offsets: List[int] = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % _OFFSET.size
+            offsets = [value for (value,) in _OFFSET.iter_unpack(data[:usable])]
+
+        size = os.path.getsize(self.filepath)
+        # 索引不是遞增、超出檔案範圍，或抽查的位移不在行首時（例如壓縮時在取代記錄檔
+        # 與取代索引之間中斷，留下舊檔案的索引），從頭重建
+        if (any(b <= a for a, b in zip(offsets, offsets[1:]))
+                or (offsets and offsets[-1] >= size)
+                or not self._offsets_at_line_starts(offsets)):
+            offsets = []
+
+        start = offsets.pop() if offsets else 0
+        valid_end = start
+        with open(self.filepath, 'rb') as f:
+            f.seek(start)
+            position = start
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                if line.strip():
+                    offsets.append(position)
+                position += len(line)
+                valid_end = position
+
+        if valid_end < size:
+            console.print(f"[yellow]截斷 {self.filepath} 尾端不完整的訊息[/yellow]")
+            with open(self.filepath, 'r+b') as f:
+                f.truncate(valid_end)
+        self._offsets = array('Q', offsets)
+        self._write_index(offsets)
+
+    def _offsets_at_line_starts(self, offsets: List[int]) -> bool:
+        """抽查最多 INDEX_SAMPLE_SIZE 個位移（含最後一個），確認前一個位元組為換行"""
+        if not offsets:
+            return True
+        step = max(1, len(offsets) // INDEX_SAMPLE_SIZE)
+        samples = set(offsets[::step]) | {offsets[-1]}
+        with open(self.filepath, 'rb') as f:
+            for offset in samples:
+                if offset == 0:
+                    continue
+                f.seek(offset - 1)
+                if f.read(1) != b'\n':
+                    return False
+        return True
+
+    def _write_index(self, offsets: List[int]):
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(b''.join(_OFFSET.pack(offset) for offset in offsets))
+        os.replace(temp_path, self.index_path)
+
+    def _rewrite(self, messages: List[Dict[str, Any]]):
+        """以原子方式將訊息寫成新的記錄檔與索引（遷移與壓縮時使用）"""
         os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
-        with open(self.filepath, 'w', encoding=self.encoding) as f:
-            json.dump(self.messages, f, ensure_ascii=False, indent=2)
+        offsets = []
+        position = 0
+        temp_path = self.filepath + '.tmp'
+        with open(temp_path, 'wb') as f:
+            for message in messages:
+                line = self._encode(message)
+                offsets.append(position)
+                f.write(line)
+                position += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.filepath)
+        self._write_index(offsets)
+        self._offsets = array('Q', offsets)
+
+    def _encode(self, message: Dict[str, Any]) -> bytes:
+        return (json.dumps(message, ensure_ascii=False) + '\n').encode(self.encoding)
+
+    def _close_files(self):
+        for handle in (self._log, self._index):
+            if handle is not None:
+                handle.flush()
+                os.fsync(handle.fileno())
+                handle.close()
+        self._log = self._index = None
+        self._pending = 0
+
+    def add_message(self, message: Dict[str, Any]) -> int:
+        """
+        附加一則新訊息
+
+        Returns:
+            int: 訊息在對話記錄中的序號
+        """
+        line = self._encode(message)
+        with self._lock:
+            if self._log is None:
+                os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+                self._log = open(self.filepath, 'ab')
+                self._index = open(self.index_path, 'ab')
+            offset = self._log.tell()
+            # 先寫訊息再寫索引：中斷時索引最多少一筆，載入時會補上
+            self._log.write(line)
+            self._log.flush()
+            self._index.write(_OFFSET.pack(offset))
+            self._index.flush()
+            self._offsets.append(offset)
+            self._pending += 1
+            if (self._pending >= self.fsync_every
+                    or time.monotonic() - self._last_fsync >= self.fsync_interval):
+                self._fsync()
+            return len(self._offsets) - 1
+
+    def _fsync(self):
+        os.fsync(self._log.fileno())
+        os.fsync(self._index.fileno())
+        self._pending = 0
+        self._last_fsync = time.monotonic()
+
+    def flush(self):
+        """將尚未 fsync 的訊息寫入磁碟"""
+        with self._lock:
+            if self._log is not None and self._pending:
+                self._fsync()
+
+    def close(self):
+        """fsync 並關閉檔案"""
+        with self._lock:
+            self._close_files()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def memory_size(self) -> int:
+        """估計此物件佔用的記憶體（位移陣列與開啟中檔案的緩衝區），以位元組計"""
+        size = self._offsets.itemsize * len(self._offsets)
+        for handle in (self._log, self._index):
+            if handle is not None:
+                size += io.DEFAULT_BUFFER_SIZE
+        return size
+
+    def get_messages(self, limit: Optional[int] = None,
+                     before: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        獲取訊息，可分頁讀取
 
-    def add_message(self, message: Dict[str, Any]):
-        """添加新訊息"""
-        self.messages.append(message)
-        self._save_messages()
+        Args:
+            limit (Optional[int]): 最多返回的訊息數量，None 表示全部
+            before (Optional[int]): 只返回序號小於此值的訊息，None 表示到最新一則
 
-    def get_messages(self) -> List[Dict[str, Any]]:
-        """獲取所有訊息"""
-        return self.messages
+        Returns:
+            List[Dict[str, Any]]: 依時間排序的訊息，只讀取所需範圍的檔案內容
+        """
+        with self._lock:
+            total = len(self._offsets)
+            end = total if before is None else max(0, min(before, total))
+            start = 0 if limit is None else max(0, end - limit)
+            if start >= end:
+                return []
+            begin = self._offsets[start]
+            stop = self._offsets[end] if end < total else None
+            with open(self.filepath, 'rb') as f:
+                f.seek(begin)
+                data = f.read() if stop is None else f.read(stop - begin)
+
+        messages = []
+        for line in data.decode(self.encoding).splitlines():
+            if line.strip():
+                try:
+                    messages.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return messages
+
+    def compact(self, keep_last: Optional[int] = None):
+        """
+        壓縮記錄檔：只保留最近 keep_last 則訊息並重寫檔案與索引
 
-    def clear_messages(self):
-        """清空所有訊息"""
-        self.messages = []
-        if os.path.exists(self.filepath):
-            os.remove(self.filepath)
+        Args:
+            keep_last (Optional[int]): 保留的訊息數量，None 表示全部保留；0 時刪除記錄檔
+        """
+        messages = [] if keep_last == 0 else self.get_messages(limit=keep_last)
+        with self._lock:
+            self._close_files()
+            if messages:
+                self._rewrite(messages)
+                return
+            self._offsets = array('Q')
+            for path in (self.filepath, self.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
             # 如果目錄為空，則刪除目錄
             directory = os.path.dirname(self.filepath)
             if os.path.exists(directory) and not os.listdir(directory):
                 os.rmdir(directory)
 
+    def clear_messages(self):
+        """清空所有訊息"""
+        self.compact(keep_last=0)
+
 
 class ChatLogger:
     """聊天記錄管理器，整合對話管理與記憶體管理功能"""
 
-    def __init__(self, base_dir: str = 'logs'):
+    def __init__(self, base_dir: str = 'logs',
+                 fsync_every: Optional[int] = None,
+                 fsync_interval: Optional[float] = None,
+                 max_cached_histories: Optional[int] = None,
+                 max_cache_bytes: Optional[int] = None,
+                 search_index: Optional[ChatSearchIndex] = None):
         """
         初始化聊天記錄管理器
 
         Args:
             base_dir (str): 對話記錄的基礎目錄
+            fsync_every (Optional[int]): 累積多少則訊息後 fsync，預設為 CHATLOG_FSYNC_EVERY 或 16
+            fsync_interval (Optional[float]): 距離上次 fsync 多少秒後 fsync，
+                預設為 CHATLOG_FSYNC_INTERVAL 或 1 秒
+            max_cached_histories (Optional[int]): 記憶體中保留的對話歷史數量上限，
+                預設為 CHAT_HISTORY_CACHE_SIZE 或 64
+            max_cache_bytes (Optional[int]): 記憶體中對話歷史的總大小上限，
+                預設為 CHAT_HISTORY_CACHE_BYTES 或 8 MB
+            search_index (Optional[ChatSearchIndex]): 對話記錄的全文搜尋索引，None 表示不建立索引
         """
         self.base_dir = base_dir
         if not os.path.exists(base_dir):
             os.makedirs(base_dir)
-        self.histories = {}  # 用於存儲每個PDF文件的對話歷史
+        self.fsync_every = fsync_every if fsync_every is not None else int(
+            os.getenv('CHATLOG_FSYNC_EVERY', 16))
+        self.fsync_interval = fsync_interval if fsync_interval is not None else float(
+            os.getenv('CHATLOG_FSYNC_INTERVAL', 1.0))
+        # 最近使用的對話歷史，超出數量或大小上限時關閉最久未使用的，需要時再從磁碟載入
+        self.histories = LRUCache(
+            max_entries=max_cached_histories if max_cached_histories is not None else int(
+                os.getenv('CHAT_HISTORY_CACHE_SIZE', 64)),
+            max_bytes=max_cache_bytes if max_cache_bytes is not None else int(
+                os.getenv('CHAT_HISTORY_CACHE_BYTES', 8 * 1024 * 1024)),
+            size_fn=lambda history: history.memory_size(),
+            on_evict=lambda _, history: history.close()
+        )
+        # 取得、寫入與放回快取需在同一個鎖內完成，避免淘汰途中產生第二個寫入同一檔案的實例
+        self._histories_lock = threading.RLock()
+        self.search_index = search_index
+        if search_index is not None:
+            self.sync_search_index()
+        # 結束時將尚未 fsync 的訊息寫入磁碟
+        atexit.register(self.close)
+
+    def close(self):
+        """fsync 並關閉所有對話記錄檔"""
+        for history in self.histories.values():
+            history.close()
+
+    def sync_search_index(self):
+        """將索引中缺少的訊息（例如索引建立前或中斷時寫入的訊息）補入搜尋索引"""
+        added = 0
+        for name in sorted(os.listdir(self.base_dir)):
+            index_path = os.path.join(self.base_dir, name, CHATLOG_INDEX_NAME)
+            log_path = os.path.join(self.base_dir, name, CHATLOG_NAME)
+            legacy_path = os.path.join(self.base_dir, name, LEGACY_CHATLOG_NAME)
+            if not (os.path.exists(log_path) or os.path.exists(legacy_path)):
+                continue
+            indexed = self.search_index.indexed_count(name)
+            # 由位移索引的大小得知訊息數量，已同步的記錄不需讀取
+            if (os.path.exists(index_path)
+                    and os.path.getsize(index_path) // _OFFSET.size == indexed):
+                continue
+            history = self._get_chat_history(name + '.pdf')
+            if len(history) < indexed:
+                self.search_index.remove(name)
+                indexed = 0
+            messages = history.get_messages(limit=len(history) - indexed)
+            if messages:
+                self.search_index.add_messages(name, indexed, messages)
+                added += len(messages)
+        if added:
+            console.print(f"[green]已將 {added} 則對話訊息加入搜尋索引[/green]")
+
+    def search_chat_history(self, query: str, pdf_filenames: Optional[List[str]] = None,
+                            role: Optional[str] = None, limit: int = 20,
+                            offset: int = 0) -> Dict[str, Any]:
+        """
+        全文搜尋所有對話記錄
+
+        Args:
+            query (str): 搜尋字串
+            pdf_filenames (Optional[List[str]]): 只搜尋這些 PDF 的對話記錄，None 表示全部
+            role (Optional[str]): 只搜尋此角色的訊息
+            limit (int): 每頁結果數量
+            offset (int): 略過的結果數量
+
+        Returns:
+            Dict[str, Any]: {'total', 'results'}，每筆結果包含 pdfFilename 與訊息序號 seq
+        """
+        if self.search_index is None:
+            raise Exception("未啟用對話搜尋索引")
+        logs = None if pdf_filenames is None else [
+            self._log_name(pdf_filename) for pdf_filename in pdf_filenames]
+        found = self.search_index.search(query, logs=logs, role=role,
+                                         limit=limit, offset=offset)
+        for result in found['results']:
+            result['pdfFilename'] = result.pop('log') + '.pdf'
+        return found
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """返回對話歷史快取的統計資訊"""
+        return self.histories.stats()
+
+    @staticmethod
+    def _log_name(pdf_filename: str) -> str:
+        """返回 PDF 對應的對話記錄名稱（去掉副檔名）"""
+        return os.path.splitext(pdf_filename)[0]
 
     def _get_dialog_path(self, pdf_filename: str) -> str:
         """
@@ -92,11 +429,10 @@ class ChatLogger:
         Returns:
             str: 對話記錄檔案的完整路徑
         """
-        pdf_dialog_dir = os.path.join(
-            self.base_dir, os.path.splitext(pdf_filename)[0])
+        pdf_dialog_dir = os.path.join(self.base_dir, self._log_name(pdf_filename))
         if not os.path.exists(pdf_dialog_dir):
             os.makedirs(pdf_dialog_dir)
-        return os.path.join(pdf_dialog_dir, 'chatlog.json')
+        return os.path.join(pdf_dialog_dir, CHATLOG_NAME)
 
     def _get_chat_history(self, pdf_filename: str) -> CustomFileChatMessageHistory:
         """
@@ -109,13 +445,19 @@ class ChatLogger:
             CustomFileChatMessageHistory: 聊天歷史記錄對象
         """
         try:
-            if pdf_filename not in self.histories:
-                chat_file = self._get_dialog_path(pdf_filename)
-                self.histories[pdf_filename] = CustomFileChatMessageHistory(
-                    chat_file,
-                    encoding='utf-8'
-                )
-            return self.histories[pdf_filename]
+            with self._histories_lock:
+                history = self.histories.get(pdf_filename)
+                if history is None:
+                    # 未快取或已被淘汰，從磁碟重新載入索引
+                    chat_file = self._get_dialog_path(pdf_filename)
+                    history = CustomFileChatMessageHistory(
+                        chat_file,
+                        encoding='utf-8',
+                        fsync_every=self.fsync_every,
+                        fsync_interval=self.fsync_interval
+                    )
+                    self.histories.put(pdf_filename, history)
+            return history
         except Exception as e:
             console.print(Panel(
                 f"[red]Error getting chat history for[/red] [yellow]{pdf_filename}[/yellow]\n"
@@ -125,19 +467,35 @@ class ChatLogger:
             ))
             raise Exception(f"無法獲取對話歷史: {str(e)}")
 
-    def load_chat_history(self, pdf_filename: str) -> List[Dict[str, Any]]:
+    def _append_message(self, pdf_filename: str, message: Dict[str, Any]):
+        """附加訊息到對話記錄，並更新快取中該對話歷史的大小"""
+        with self._histories_lock:
+            history = self._get_chat_history(pdf_filename)
+            seq = history.add_message(message)
+            self.histories.put(pdf_filename, history)
+        if self.search_index is not None:
+            # 索引失敗不影響對話，下次啟動時 sync_search_index 會補上
+            try:
+                self.search_index.add_messages(self._log_name(pdf_filename), seq, [message])
+            except Exception as e:
+                console.print(f"[yellow]無法更新對話搜尋索引：{str(e)}[/yellow]")
+
+    def load_chat_history(self, pdf_filename: str, limit: Optional[int] = None,
+                          before: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         載入對話歷史記錄
 
         Args:
             pdf_filename (str): PDF 文件名稱
+            limit (Optional[int]): 最多返回最近的幾則訊息，None 表示全部
+            before (Optional[int]): 只返回序號小於此值的訊息，用於往前翻頁
 
         Returns:
             List[Dict[str, Any]]: 對話歷史記錄列表
         """
         try:
             history = self._get_chat_history(pdf_filename)
-            return history.get_messages()
+            return history.get_messages(limit=limit, before=before)
         except Exception as e:
             console.print(Panel(
                 f"[red]Error loading chat history for[/red] [yellow]{pdf_filename}[/yellow]\n"
@@ -148,6 +506,18 @@ class ChatLogger:
             rprint("[yellow]Returning empty message list due to error[/yellow]")
             return []
 
+    def count_chat_history(self, pdf_filename: str) -> int:
+        """
+        返回對話記錄中的訊息數量
+
+        Args:
+            pdf_filename (str): PDF 文件名稱
+
+        Returns:
+            int: 訊息數量
+        """
+        return len(self._get_chat_history(pdf_filename))
+
     def clear_chat_history(self, pdf_filename: Optional[str] = None):
         """
         清空對話歷史記錄
@@ -157,15 +527,19 @@ class ChatLogger:
         """
         try:
             if pdf_filename:
-                # 清空特定PDF的對話記錄
-                if pdf_filename in self.histories:
-                    self.histories[pdf_filename].clear_messages()
-                    del self.histories[pdf_filename]
+                # 清空特定PDF的對話記錄（不在快取中時也需要清除磁碟上的記錄）
+                with self._histories_lock:
+                    self._get_chat_history(pdf_filename).clear_messages()
+                    self.histories.pop(pdf_filename)
+                if self.search_index is not None:
+                    self.search_index.remove(self._log_name(pdf_filename))
             else:
                 # 清空所有對話記錄
                 for history in self.histories.values():
                     history.clear_messages()
                 self.histories.clear()
+                if self.search_index is not None:
+                    self.search_index.remove()
 
                 # 刪除整個日誌目錄
                 if os.path.exists(self.base_dir):
@@ -215,8 +589,7 @@ class ChatLogger:
 
         if pdf_filename:
             try:
-                history = self._get_chat_history(pdf_filename)
-                history.add_message(user_message)
+                self._append_message(pdf_filename, user_message)
             except Exception as e:
                 console.print(Panel(
                     f"[red]Error adding human message to history for[/red] [yellow]{pdf_filename}[/yellow]\n"
@@ -242,8 +615,7 @@ class ChatLogger:
 
         if pdf_filename:
             try:
-                history = self._get_chat_history(pdf_filename)
-                history.add_message(assistant_message)
+                self._append_message(pdf_filename, assistant_message)
             except Exception as e:
                 console.print(Panel(
                     f"[red]Error adding AI message to history for[/red] [yellow]{pdf_filename}[/yellow]\n"
@@ -254,3 +626,102 @@ class ChatLogger:
                 raise Exception(f"無法保存AI回應到對話歷史: {str(e)}")
 
         return user_message, assistant_message
+
+    def _save_assistant_message(self, pdf_filename: Optional[str],
+                                content: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        創建並保存 AI 回應訊息
+
+        Returns:
+            Tuple[Dict[str, Any], Optional[str]]: (AI回應訊息, 保存失敗時的錯誤訊息)
+        """
+        assistant_message = {
+            'id': str(datetime.datetime.now().timestamp()),
+            'content': content,
+            'role': 'assistant',
+            'timestamp': datetime.datetime.now().isoformat()
+        }
+
+        if pdf_filename:
+            try:
+                self._append_message(pdf_filename, assistant_message)
+            except Exception as e:
+                console.print(Panel(
+                    f"[red]Error adding AI message to history for[/red] [yellow]{pdf_filename}[/yellow]\n"
+                    f"[red]Error details:[/red] {str(e)}",
+                    title="AI Response Save Error",
+                    border_style="red"
+                ))
+                return assistant_message, str(e)
+        return assistant_message, None
+
+    def process_chat_stream(self, message: str, pdf_filename: Optional[str],
+                            event_generator: callable) -> Iterator[Dict[str, Any]]:
+        """
+        處理串流對話流程，在串流完成後保存組合好的 AI 回應
+
+        Args:
+            message (str): 使用者輸入的訊息
+            pdf_filename (Optional[str]): PDF 文件名稱
+            event_generator (callable): 接收訊息並產生事件的函數。
+                'token' 事件的 content 為回應片段，'done' 事件的 content 為完整回應
+
+        Yields:
+            Dict[str, Any]: 串流事件，最後一個事件為包含 AI 回應訊息的 'message' 事件
+        """
+        # 創建使用者訊息
+        user_message = {
+            'id': str(datetime.datetime.now().timestamp()),
+            'content': message,
+            'role': 'user',
+            'timestamp': datetime.datetime.now().isoformat()
+        }
+
+        if pdf_filename:
+            try:
+                self._append_message(pdf_filename, user_message)
+            except Exception as e:
+                console.print(Panel(
+                    f"[red]Error adding human message to history for[/red] [yellow]{pdf_filename}[/yellow]\n"
+                    f"[red]Error details:[/red] {str(e)}",
+                    title="Message Save Error",
+                    border_style="red"
+                ))
+                raise Exception(f"無法保存對話歷史: {str(e)}")
+
+        # 收集串流片段，串流結束後組合成完整回應
+        parts = []
+        response = None
+        events = event_generator(message)
+        interrupted = True
+        try:
+            try:
+                for event in events:
+                    if event.get('type') == 'token':
+                        parts.append(event.get('content', ''))
+                    elif event.get('type') == 'done':
+                        response = event.get('content')
+                    yield event
+            except Exception as e:
+                response = f"抱歉，我無法理解您的問題。錯誤：{str(e)}"
+                yield {'type': 'error', 'content': response}
+            interrupted = False
+        finally:
+            if interrupted:
+                # 用戶端中斷連線時 Flask 關閉此產生器（GeneratorExit），
+                # 停止產生回應並保存已產生的部分，避免對話紀錄只剩使用者訊息
+                close = getattr(events, 'close', None)
+                if close is not None:
+                    close()
+                partial = response if response is not None else "".join(parts)
+                self._save_assistant_message(
+                    pdf_filename, f"{partial}\n\n{INTERRUPTED_NOTE}" if partial else INTERRUPTED_NOTE)
+
+        if response is None:
+            response = "".join(parts)
+
+        assistant_message, error = self._save_assistant_message(pdf_filename, response)
+        if error is not None:
+            yield {'type': 'error', 'content': f"無法保存AI回應到對話歷史: {error}"}
+
+        yield {'type': 'message', 'message': assistant_message}
@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from rich.console import Console
+
+# 創建 rich console 實例
+console = Console()
+
+
+class CircuitBreaker:
+    """
+    外部服務的斷路器
+
+    連續失敗達到 failure_threshold 次後進入 open 狀態，期間呼叫端直接略過該服務
+    （allow() 返回 False），不必等待逾時或重試。open 之後由背景計時器以加上抖動的
+    指數退避間隔執行 probe，成功即恢復 closed，失敗則加長間隔再次等待；
+    探測與重試都不佔用請求執行緒。未提供 probe 時，退避時間到後放行一個請求作為探測。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, probe: Optional[Callable[[], Any]] = None,
+                 failure_threshold: int = 3, base_backoff: float = 5.0,
+                 max_backoff: float = 300.0):
+        """
+        Args:
+            name (str): 服務名稱
+            probe (Optional[Callable[[], Any]]): 檢查服務是否恢復的函數，拋出例外表示仍不可用
+            failure_threshold (int): 進入 open 狀態所需的連續失敗次數
+            base_backoff (float): 第一次探測前的等待秒數，之後每次失敗加倍
+            max_backoff (float): 等待秒數上限
+        """
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.open_count = 0
+        self.last_error: Optional[str] = None
+        self.opened_at: Optional[float] = None
+        self.next_probe_at: Optional[float] = None
+        self._probe_attempts = 0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """是否可以呼叫服務；open 狀態下直接返回 False"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # 沒有 probe 時，退避時間到後放行一個請求作為探測
+            if (self.probe is None and self.state == self.OPEN
+                    and time.time() >= self.next_probe_at):
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """記錄一次成功呼叫，恢復 closed 狀態"""
+        with self._lock:
+            if self.state != self.CLOSED:
+                console.print(f"[green]{self.name} 已恢復，斷路器關閉[/green]")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_attempts = 0
+            self.opened_at = None
+            self.next_probe_at = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        """記錄一次失敗呼叫，連續失敗達門檻或探測失敗時進入 open 狀態"""
+        with self._lock:
+            self.consecutive_failures += 1
+            if error is not None:
+                self.last_error = str(error)
+            if self.state == self.HALF_OPEN or (
+                    self.state == self.CLOSED
+                    and self.consecutive_failures >= self.failure_threshold):
+                self._open()
+
+    def retry_after(self) -> Optional[float]:
+        """返回距離下一次探測的秒數，closed 狀態返回 None"""
+        with self._lock:
+            if self.next_probe_at is None:
+                return None
+            return max(0.0, self.next_probe_at - time.time())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回斷路器狀態"""
+        retry_after = self.retry_after()
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutiveFailures': self.consecutive_failures,
+                'openCount': self.open_count,
+                'lastError': self.last_error,
+                'openedAt': self.opened_at,
+                'nextProbeIn': retry_after
+            }
+
+    def _open(self):
+        # 加上抖動的指數退避：等待時間落在上限的一半到上限之間，避免多個實例同時探測
+        cap = min(self.max_backoff, self.base_backoff * (2 ** self._probe_attempts))
+        delay = cap / 2 + random.uniform(0, cap / 2)
+        self._probe_attempts += 1
+        if self.state == self.CLOSED:
+            self.open_count += 1
+            self.opened_at = time.time()
+            console.print(
+                f"[red]{self.name} 連續失敗 {self.consecutive_failures} 次，斷路器開啟[/red]")
+        self.state = self.OPEN
+        self.next_probe_at = time.time() + delay
+        if self.probe is not None:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self._run_probe)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run_probe(self):
+        """在背景計時器執行緒中探測服務"""
+        with self._lock:
+            if self.state != self.OPEN:
+                return
+            self.state = self.HALF_OPEN
+        try:
+            self.probe()
+        except Exception as e:
+            self.record_failure(e)
+        else:
+            self.record_success()
@@ -0,0 +1,199 @@
+import math
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 中日韓文字，每個字大約是一個 token
+CJK_CHARS = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿＀-￯]')
+# 其他文字平均每個 token 的字元數
+CHARS_PER_TOKEN = 4
+# 判定相鄰 chunk 重疊所需的最短共同字元數
+MIN_OVERLAP_CHARS = 40
+# 比對重疊時檢查的最長字元數（略大於 PDFEmbedder 的 chunk_overlap）
+MAX_OVERLAP_CHARS = 400
+# 剩餘預算少於此值時不再截斷段落放入
+MIN_PASSAGE_TOKENS = 48
+# 截斷內容的標記
+TRUNCATION_MARK = "…"
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    估計文字的 token 數量
+
+    中日韓文字每字計為一個 token，其餘文字每 CHARS_PER_TOKEN 個字元計為一個 token。
+    不需載入 tokenizer，誤差在預算控制可接受的範圍內。
+    """
+    if not text:
+        return 0
+    cjk = len(CJK_CHARS.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """將文字截斷到約 max_tokens 個 token，盡量在句子或換行處截斷"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # 二分搜尋符合預算的最長前綴
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) + 1 <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    cut = text[:low]
+    boundary = max(cut.rfind(mark) for mark in ('\n', '。', '. ', '！', '？'))
+    if boundary > len(cut) // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + TRUNCATION_MARK
+
+
+def _overlap(first: str, second: str) -> int:
+    """返回 first 的結尾與 second 的開頭重疊的字元數，沒有重疊時返回 0"""
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    start = max(0, len(first) - MAX_OVERLAP_CHARS)
+    position = first.find(probe, start)
+    while position != -1:
+        if second.startswith(first[position:]):
+            return len(first) - position
+        position = first.find(probe, position + 1)
+    return 0
+
+
+def _document_key(result: Dict[str, Any]) -> Tuple:
+    metadata = result.get("metadata") or {}
+    return (metadata.get("content_hash") or metadata.get("source")
+            or metadata.get("pdf_filename"), metadata.get("page"))
+
+
+def merge_overlapping(results: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    合併同一頁中彼此重疊或重複的 chunk
+
+    切分文本時相鄰 chunk 共享 chunk_overlap 個字元，同時被檢索到時會重複送入提示；
+    合併後的段落保留較好的（較小的）分數。論文摘要段落不合併。
+
+    Args:
+        results (List[Dict[str, Any]]): 搜索結果（content、score、metadata）
+
+    Returns:
+        Tuple[List[Dict[str, Any]], int]: (合併後的結果, 被合併或移除的結果數量)
+    """
+    merged: List[Dict[str, Any]] = []
+    removed = 0
+    groups: Dict[Tuple, List[Dict[str, Any]]] = {}
+    for result in results:
+        metadata = result.get("metadata") or {}
+        if metadata.get("digest"):
+            merged.append(result)
+            continue
+        groups.setdefault(_document_key(result), []).append(dict(result))
+
+    for group in groups.values():
+        kept: List[Dict[str, Any]] = []
+        for result in group:
+            content = result["content"]
+            for other in kept:
+                if content in other["content"]:
+                    break
+                if other["content"] in content:
+                    other["content"] = content
+                    break
+                tail = _overlap(other["content"], content)
+                if tail:
+                    other["content"] += content[tail:]
+                    break
+                head = _overlap(content, other["content"])
+                if head:
+                    other["content"] = content + other["content"][head:]
+                    break
+            else:
+                kept.append(result)
+                continue
+            other["score"] = min(other["score"], result["score"])
+            removed += 1
+        merged.extend(kept)
+    return merged, removed
+
+
+def _priority(result: Dict[str, Any]) -> Tuple:
+    """
+    放入預算的優先順序：論文摘要段落一律先於原文段落
+
+    摘要段落的分數是餘弦距離，原文段落的分數是 FAISS 的 L2 距離，兩者尺度不同，
+    只在同一層內以分數（越小越相關）排序。
+    """
+    metadata = result.get("metadata") or {}
+    return (0 if metadata.get("digest") else 1, result["score"])
+
+
+def _reading_order(result: Dict[str, Any]) -> Tuple:
+    metadata = result.get("metadata") or {}
+    page = metadata.get("page")
+    return (0 if metadata.get("digest") else 1,
+            str(metadata.get("pdf_filename") or metadata.get("source") or ""),
+            page if isinstance(page, int) else -1)
+
+
+def build_context(summary: Optional[str], results: List[Dict[str, Any]],
+                  budget: int, summary_share: float,
+                  format_passage: Callable[[Dict[str, Any]], str]
+                  ) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    在 token 預算內組合總結與檢索段落
+
+    總結最多使用 summary_share 比例的預算，剩餘預算先放論文摘要段落、再放原文段落，
+    同一層內依分數由好到差放入；放不下的段落在剩餘預算足夠時截斷放入，否則捨棄。
+    選出的段落依論文摘要、文件與頁碼排列，維持原文的閱讀順序。
+
+    Args:
+        summary (Optional[str]): 目前的研究總結
+        results (List[Dict[str, Any]]): 搜索結果（content、score、metadata）
+        budget (int): 總結與段落合計的 token 預算
+        summary_share (float): 總結最多可使用的預算比例
+        format_passage (Callable[[Dict[str, Any]], str]): 將結果格式化為提示文字的函數
+
+    Returns:
+        Tuple[str, str, Dict[str, Any]]: (總結文字, 段落文字, 統計資訊)
+    """
+    summary = summary or ""
+    summary_tokens = estimate_tokens(summary)
+    summary_limit = int(budget * summary_share)
+    summary_trimmed = summary_tokens > summary_limit
+    if summary_trimmed:
+        summary = truncate_to_tokens(summary, summary_limit)
+        summary_tokens = estimate_tokens(summary)
+
+    passages, merged_count = merge_overlapping(results)
+    remaining = budget - summary_tokens
+    selected: List[Tuple[Dict[str, Any], str]] = []
+    truncated = dropped = 0
+    for result in sorted(passages, key=_priority):
+        text = format_passage(result)
+        tokens = estimate_tokens(text) + 1
+        if tokens <= remaining:
+            selected.append((result, text))
+            remaining -= tokens
+        elif remaining >= MIN_PASSAGE_TOKENS:
+            selected.append((result, truncate_to_tokens(text, remaining - 1)))
+            remaining = 0
+            truncated += 1
+        else:
+            dropped += 1
+
+    selected.sort(key=lambda item: _reading_order(item[0]))
+    passages_text = "\n\n".join(text for _, text in selected)
+    stats = {
+        'budget': budget,
+        'summary_tokens': summary_tokens,
+        'summary_trimmed': summary_trimmed,
+        'passage_tokens': estimate_tokens(passages_text),
+        'retrieved': len(results),
+        'merged': merged_count,
+        'included': len(selected),
+        'truncated': truncated,
+        'dropped': dropped
+    }
+    return summary, passages_text, stats
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# 預設的快取資料庫路徑
+DEFAULT_CACHE_PATH = os.getenv(
+    'EMBEDDING_CACHE_PATH', os.path.join('cache', 'embeddings.sqlite3'))
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def text_key(text: str) -> str:
+    """
+    計算正規化文本的雜湊，作為快取鍵
+
+    正規化包含 Unicode NFC 與合併連續空白，空白差異不會產生不同的鍵。
+    """
+    normalized = _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    以 SQLite 儲存的 embedding 快取
+
+    以 (模型名稱, 正規化文本雜湊) 為鍵，向量以 float32 位元組儲存。
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        """
+        初始化 embedding 快取
+
+        Args:
+            path (str): SQLite 資料庫路徑
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            ' model TEXT NOT NULL,'
+            ' key TEXT NOT NULL,'
+            ' vector BLOB NOT NULL,'
+            ' PRIMARY KEY (model, key))')
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model: str, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        批次查詢向量
+
+        Args:
+            model (str): embedding 模型名稱
+            keys (List[str]): 文本雜湊列表
+
+        Returns:
+            Dict[str, List[float]]: 命中的鍵與向量
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # SQLite 單一查詢的參數數量有上限，分批查詢
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f'SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})',
+                    [model, *batch]).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            hit_count = sum(1 for key in keys if key in found)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        """
+        批次寫入向量
+
+        Args:
+            model (str): embedding 模型名稱
+            items (Dict[str, List[float]]): 文本雜湊與向量
+        """
+        rows = [(model, key, np.asarray(vector, dtype=np.float32).tobytes())
+                for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (model, key, vector) VALUES (?, ?, ?)',
+                rows)
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """返回快取命中統計"""
+        with self._lock:
+            entries = self._conn.execute(
+                'SELECT COUNT(*) FROM embeddings').fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                'entries': entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+_shared_caches: Dict[str, EmbeddingCache] = {}
+_shared_lock = threading.Lock()
+
+
+def get_embedding_cache(path: str = DEFAULT_CACHE_PATH) -> EmbeddingCache:
+    """取得指定路徑的共用 embedding 快取實例"""
+    with _shared_lock:
+        if path not in _shared_caches:
+            _shared_caches[path] = EmbeddingCache(path)
+        return _shared_caches[path]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    在 embedding 模型前加上持久化快取
+
+    相同的正規化文本只會送往模型一次，未命中的文本以單次批次請求計算。
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str,
+                 cache: Optional[EmbeddingCache] = None):
+        """
+        Args:
+            embeddings (Embeddings): 實際計算向量的 embedding 模型
+            model_name (str): 模型名稱，作為快取鍵的一部分
+            cache (Optional[EmbeddingCache]): 快取實例，預設使用共用快取
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache or get_embedding_cache()
+        # 此實例的命中統計（共用快取的統計見 cache.stats()）
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(text) for text in texts]
+        found = self.cache.get_many(self.model_name, keys)
+
+        # 同一批次中重複的文本只計算一次
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self.hits += len(keys) - sum(1 for key in keys if key in missing)
+        self.misses += sum(1 for key in keys if key in missing)
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model_name, computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
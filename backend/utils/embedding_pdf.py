@@ -1,15 +1,26 @@
-from langchain_community.document_loaders import PyMuPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_ollama import OllamaEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from tqdm.auto import tqdm
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import time
 from datetime import datetime
 import os
 import sys
+import json
+import uuid
+
+import numpy as np
+
+from .ann_index import IncrementalIndexBuilder, index_type_of
+from .embedding_cache import CachedEmbeddings, get_embedding_cache, text_key
+from .index_store import IndexStore, compute_file_hash
+from .pdf_extract import iter_pdf_pages
 
 
 class PDFEmbedder:
@@ -23,7 +34,9 @@ class PDFEmbedder:
     - Saving to FAISS index
     """
 
-    def __init__(self, model_name="mxbai-embed-large", chunk_size=1000, chunk_overlap=200):
+    def __init__(self, model_name="mxbai-embed-large", chunk_size=1000, chunk_overlap=200,
+                 batch_size=32, max_concurrency=4, index_type="flat",
+                 hnsw_m=32, ivf_nlist=None, pq_m=None, extraction_workers=None):
         """
         Initialize the PDFEmbedder.
 
@@ -31,12 +44,31 @@ class PDFEmbedder:
             model_name (str): Name of the Ollama model to use for embeddings
             chunk_size (int): Size of text chunks for splitting
             chunk_overlap (int): Overlap between text chunks
+            batch_size (int): Number of chunks sent to Ollama in one embedding request
+            max_concurrency (int): Maximum number of embedding requests in flight
+            index_type (str): FAISS index type: "flat" (exact), "hnsw" or "ivfpq".
+                IVF-PQ is trained automatically and falls back to flat when there
+                are too few vectors to train it
+            hnsw_m (int): Number of neighbours per node for HNSW
+            ivf_nlist (int): Number of IVF lists, derived from the vector count if None
+            pq_m (int): Number of PQ sub-quantizers for IVF-PQ, one per 4 dimensions if None
+            extraction_workers (int): Size of the page extraction process pool,
+                defaults to the CPU count
         """
         self.model_name = model_name
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.ivf_nlist = ivf_nlist
+        self.pq_m = pq_m
+        self.extraction_workers = extraction_workers
         self.console = Console()
         self._ensure_directories()
+        self.index_store = IndexStore()
+        self.embedding_cache = get_embedding_cache()
 
     def _ensure_directories(self):
         """Ensure required directories exist"""
@@ -51,19 +83,79 @@ class PDFEmbedder:
         seconds = seconds % 60
         return f"{minutes} minutes {seconds:.2f} seconds"
 
-    def _check_existing_index(self, pdf_name):
-        """Check if FAISS index already exists for the given PDF"""
-        base_name = os.path.splitext(pdf_name)[0]
-        index_path = os.path.join("FAISS_index", base_name)
-        return os.path.exists(index_path)
+    def _embed_batch(self, embeddings, batch):
+        """Embed one batch of chunks and return the vectors with the elapsed time"""
+        batch_start = time.time()
+        vectors = embeddings.embed_documents(
+            [doc.page_content for doc in batch])
+        return vectors, time.time() - batch_start
+
+    def _index_settings(self):
+        """Settings an index must have been built with to be updated incrementally"""
+        return {
+            'model': self.model_name,
+            'chunk_size': self.chunk_size,
+            'chunk_overlap': self.chunk_overlap,
+            'index_type': self.index_type
+        }
+
+    def _load_previous_version(self, pdf_name, content_hash, embeddings):
+        """
+        Load the index of the previous version of a re-uploaded PDF.
+
+        Returns:
+            tuple: ``(db, reusable)`` where ``reusable`` maps page text hashes to
+            queues of chunk id lists, or None when a full build is needed
+        """
+        previous_hash = self.index_store.get_hash(pdf_name)
+        if (previous_hash is None or previous_hash == content_hash
+                or not self.index_store.has_index(previous_hash)):
+            return None
+        # HNSW graphs do not support removing vectors
+        if self.index_type == "hnsw":
+            return None
+        record = self.index_store.load_pages(previous_hash)
+        settings = self._index_settings()
+        if record is None or any(record.get(key) != value for key, value in settings.items()):
+            return None
+
+        db = FAISS.load_local(
+            self.index_store.index_path(previous_hash),
+            embeddings,
+            allow_dangerous_deserialization=True
+        )
+        reusable = {}
+        for page in record.get('pages', []):
+            reusable.setdefault(page['hash'], deque()).append(page['ids'])
+        return db, reusable
+
+    def _check_existing_index(self, content_hash):
+        """Check if FAISS index already exists for the given PDF content hash"""
+        return self.index_store.has_index(content_hash)
+
+    def _report_progress(self, progress_callback, stage, status, **details):
+        """Forward stage progress to the optional progress callback"""
+        if progress_callback is not None:
+            progress_callback(stage, status, **details)
 
-    def create_embeddings(self, pdf_path, force=False):
+    def create_embeddings(self, pdf_path, force=False, content_hash=None,
+                          progress_callback=None):
         """
         Create embeddings for a PDF document and save them to a FAISS index.
 
+        Indexes are addressed by the SHA-256 of the PDF content, so identical
+        content is embedded once. When the file replaces an earlier version, only
+        pages whose text changed are embedded: vectors of unchanged pages are
+        reused from the previous index and those of removed or changed pages are
+        deleted.
+
         Args:
             pdf_path (str): Path to the PDF file
-            force (bool): If True, recreate embeddings even if they already exist
+            force (bool): If True, rebuild the whole index even if it already exists
+            content_hash (str): Precomputed SHA-256 of the PDF, computed if omitted
+            progress_callback (callable): Optional ``callback(stage, status, **details)``
+                invoked when the pdf_loading, text_splitting, embedding and saving
+                stages start, advance and complete
 
         Returns:
             dict: A dictionary containing timing information for each step
@@ -73,86 +165,233 @@ class PDFEmbedder:
         """
         pdf_name = os.path.basename(pdf_path)
 
-        # Check if index already exists
-        if not force and self._check_existing_index(pdf_name):
-            self.console.print(f"[green]FAISS index for '{
-                               pdf_name}' already exists.[/green]")
-            return None
-
         if not os.path.exists(pdf_path):
             raise FileNotFoundError(f"PDF file '{pdf_path}' not found")
 
         timings = {}
         total_start_time = time.time()
 
-        # Load PDF
-        pdf_start_time = time.time()
-        self.console.print(Panel("[blue]Loading PDF document...[/blue]"))
-        loader = PyMuPDFLoader(pdf_path)
-        data = loader.load()
-        timings['pdf_loading'] = time.time() - pdf_start_time
-        self.console.print(f"[green]✓[/green] Loaded {len(data)} pages in [yellow]{
-                           self._format_time(timings['pdf_loading'])}[/yellow]")
-
-        # Split documents
-        split_start_time = time.time()
-        self.console.print(
-            Panel("[blue]Splitting documents into chunks...[/blue]"))
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap
-        )
-        texts = text_splitter.split_documents(data)
-        timings['text_splitting'] = time.time() - split_start_time
-        self.console.print(f"[green]✓[/green] Created {len(texts)} text chunks in [yellow]{
-                           self._format_time(timings['text_splitting'])}[/yellow]")
+        # Hash PDF content
+        hash_start_time = time.time()
+        if content_hash is None:
+            content_hash = compute_file_hash(pdf_path)
+        timings['hashing'] = time.time() - hash_start_time
+
+        # Check if index already exists
+        if not force and self._check_existing_index(content_hash):
+            self.index_store.register(pdf_name, content_hash)
+            self.console.print(
+                f"[green]FAISS index for '{pdf_name}' already exists ({content_hash[:12]}).[/green]")
+            return None
 
         # Initialize Ollama embedding model
         init_start_time = time.time()
         self.console.print(
             Panel("[blue]Initializing embedding model...[/blue]"))
-        embeddings = OllamaEmbeddings(model=self.model_name)
+        # Unchanged chunks are served from the persistent embedding cache
+        embeddings = CachedEmbeddings(
+            OllamaEmbeddings(model=self.model_name),
+            self.model_name,
+            self.embedding_cache
+        )
         timings['model_init'] = time.time() - init_start_time
-        self.console.print(f"[green]✓[/green] Model initialized in [yellow]{
-                           self._format_time(timings['model_init'])}[/yellow]")
+        self.console.print(f"[green]✓[/green] Model initialized in [yellow]{self._format_time(timings['model_init'])}[/yellow]")
 
-        # Create FAISS vector store with progress bar
-        embed_start_time = time.time()
+        # Reuse the previous version's index when the file was re-uploaded
+        previous = None if force else self._load_previous_version(
+            pdf_name, content_hash, embeddings)
+        db, reusable = previous if previous else (None, {})
+        if db is not None:
+            self.console.print(
+                f"[blue]Updating the previous index of '{pdf_name}', only changed pages are embedded[/blue]")
+
+        # Load, split and embed as a bounded streaming pipeline: pages are
+        # extracted in a process pool, each page is split as it arrives and full
+        # batches are embedded while later pages are still extracted. Finished
+        # batches are added to the index in order, so only the batches in flight
+        # are held besides the index and docstore
+        pdf_start_time = embed_start_time = time.time()
+        self._report_progress(progress_callback, 'pdf_loading', 'running')
+        self._report_progress(progress_callback, 'text_splitting', 'running')
+        self._report_progress(progress_callback, 'embedding', 'running',
+                              completed=0, total=None)
         self.console.print(
-            Panel("[blue]Creating FAISS vector store...[/blue]"))
-        texts_with_progress = tqdm(
-            texts, desc="Embedding documents", unit="chunk")
-        embedded_texts = []
-        chunk_times = []
-
-        for doc in texts_with_progress:
-            chunk_start = time.time()
-            vector = embeddings.embed_documents([doc.page_content])
-            embedded_texts.append((doc.page_content, vector[0]))
-            chunk_time = time.time() - chunk_start
-            chunk_times.append(chunk_time)
-            texts_with_progress.set_postfix(
-                {"Last chunk": f"{chunk_time:.2f}s"})
-
-        db = FAISS.from_embeddings(
-            text_embeddings=embedded_texts,
-            embedding=embeddings
+            Panel("[blue]Loading, splitting and embedding PDF document...[/blue]"))
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap
+        )
+        builder = IncrementalIndexBuilder(
+            index_type=self.index_type,
+            hnsw_m=self.hnsw_m,
+            ivf_nlist=self.ivf_nlist,
+            pq_m=self.pq_m
         )
+        docstore = {}
+        index_to_docstore_id = {}
+        extraction_stats = {}
+        in_flight = deque()
+        pending = []
+        batch_times = []
+        page_records = []
+        page_count = 0
+        chunk_count = 0
+        embedded_count = 0
+        reused_count = 0
+        split_time = 0.0
+        max_in_flight = self.max_concurrency * 2
+
+        # Page texts are kept next to the index for later use, e.g. pre-translation
+        save_path = self.index_store.index_path(content_hash)
+        os.makedirs(save_path, exist_ok=True)
+        page_texts_path = self.index_store.page_texts_path(content_hash)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor, \
+                tqdm(desc="Embedding documents", unit="chunk") as progress, \
+                open(page_texts_path + '.tmp', 'w', encoding='utf-8') as page_texts_file:
+
+            def drain(limit):
+                # Wait for the oldest batches until at most `limit` are in flight
+                nonlocal embedded_count
+                while len(in_flight) > limit:
+                    future, batch = in_flight.popleft()
+                    vectors, elapsed = future.result()
+                    ids = [str(uuid.uuid4()) for _ in batch]
+                    if db is None:
+                        builder.add(np.asarray(vectors, dtype=np.float32))
+                        for doc_id, doc in zip(ids, batch):
+                            index_to_docstore_id[len(index_to_docstore_id)] = doc_id
+                            docstore[doc_id] = doc
+                    else:
+                        db.add_embeddings(
+                            zip([doc.page_content for doc in batch], vectors),
+                            metadatas=[doc.metadata for doc in batch],
+                            ids=ids
+                        )
+                    for doc_id, doc in zip(ids, batch):
+                        page_records[doc.metadata['page']]['ids'].append(doc_id)
+                    embedded_count += len(batch)
+                    batch_times.append(elapsed)
+                    progress.update(len(batch))
+                    progress.set_postfix({"Last batch": f"{elapsed:.2f}s"})
+                    self._report_progress(progress_callback, 'embedding', 'running',
+                                          completed=embedded_count,
+                                          total=chunk_count if limit == 0 else None)
+
+            def submit_batch(batch):
+                in_flight.append(
+                    (executor.submit(self._embed_batch, embeddings, batch), batch))
+                # Backpressure: stop reading pages while the embedder is behind
+                drain(max_in_flight)
+
+            for page in iter_pdf_pages(pdf_path, self.extraction_workers,
+                                       stats=extraction_stats):
+                page_count += 1
+                self._report_progress(progress_callback, 'pdf_loading', 'running',
+                                      pages=page_count,
+                                      total_pages=page.metadata.get('total_pages'))
+                page_texts_file.write(json.dumps(
+                    {'page': page.metadata['page'], 'text': page.page_content},
+                    ensure_ascii=False) + '\n')
+                page_hash = text_key(page.page_content)
+                reused_ids = reusable.get(page_hash)
+                if reused_ids:
+                    # Unchanged page: keep its vectors, refresh page numbers and document metadata
+                    ids = reused_ids.popleft()
+                    for doc_id in ids:
+                        db.docstore.search(doc_id).metadata = dict(page.metadata)
+                    page_records.append({'hash': page_hash, 'ids': ids})
+                    reused_count += len(ids)
+                    continue
+                page_records.append({'hash': page_hash, 'ids': []})
+
+                split_start = time.time()
+                chunks = text_splitter.split_documents([page])
+                split_time += time.time() - split_start
+                chunk_count += len(chunks)
+                pending.extend(chunks)
+                while len(pending) >= self.batch_size:
+                    submit_batch(pending[:self.batch_size])
+                    pending = pending[self.batch_size:]
+            if pending:
+                submit_batch(pending)
+                pending = []
+
+            timings['pdf_loading'] = time.time() - pdf_start_time
+            timings['text_splitting'] = split_time
+            timings['extraction_cpu'] = extraction_stats.get('extraction_cpu', 0.0)
+            timings['extraction_speedup'] = (
+                timings['extraction_cpu'] / extraction_stats['extraction_wall']
+                if extraction_stats.get('extraction_wall') else 1.0)
+            self._report_progress(progress_callback, 'pdf_loading', 'completed',
+                                  seconds=timings['pdf_loading'], pages=page_count)
+            self._report_progress(progress_callback, 'text_splitting', 'completed',
+                                  seconds=timings['text_splitting'], chunks=chunk_count)
+            progress.total = chunk_count
+            progress.refresh()
+
+            drain(0)
+
+        self.console.print(f"[green]✓[/green] Loaded {page_count} pages in [yellow]{self._format_time(timings['pdf_loading'])}[/yellow] "
+                           f"({timings['extraction_speedup']:.1f}x parallel extraction speedup)")
+        self.console.print(f"[green]✓[/green] Created {chunk_count} text chunks in [yellow]{self._format_time(timings['text_splitting'])}[/yellow]")
+
+        if chunk_count + reused_count == 0:
+            raise ValueError(f"No text could be extracted from '{pdf_name}'")
+
+        # Pages of the previous version that were not matched were removed or changed
+        stale_ids = [doc_id for queue in reusable.values()
+                     for ids in queue for doc_id in ids]
+        if db is None:
+            db = FAISS(
+                embedding_function=embeddings,
+                index=builder.finish(),
+                docstore=InMemoryDocstore(docstore),
+                index_to_docstore_id=index_to_docstore_id
+            )
+        elif stale_ids:
+            db.delete(stale_ids)
+        timings['index_type'] = index_type_of(db.index)
+        timings['incremental'] = previous is not None
+        timings['reused_chunks'] = reused_count
+        timings['removed_chunks'] = len(stale_ids)
 
         timings['embedding'] = time.time() - embed_start_time
-        timings['avg_chunk_time'] = sum(chunk_times) / len(chunk_times)
-        self.console.print(f"[green]✓[/green] Embedding completed in [yellow]{
-                           self._format_time(timings['embedding'])}[/yellow]")
-        self.console.print(f"[dim]Average time per chunk: {
-                           self._format_time(timings['avg_chunk_time'])}[/dim]")
+        timings['batch_times'] = batch_times
+        timings['batch_count'] = len(batch_times)
+        timings['avg_batch_time'] = sum(batch_times) / len(batch_times) if batch_times else 0.0
+        timings['max_batch_time'] = max(batch_times, default=0.0)
+        timings['avg_chunk_time'] = timings['embedding'] / chunk_count if chunk_count else 0.0
+        timings['cache_hits'] = embeddings.hits
+        timings['cache_misses'] = embeddings.misses
+        self._report_progress(progress_callback, 'embedding', 'completed',
+                              seconds=timings['embedding'],
+                              completed=chunk_count, total=chunk_count,
+                              reused=reused_count, removed=len(stale_ids))
+        if timings['incremental']:
+            self.console.print(f"[green]✓[/green] Reused {reused_count} chunks of unchanged pages, "
+                               f"removed {len(stale_ids)} stale chunks")
+        self.console.print(f"[green]✓[/green] Embedding completed in [yellow]{self._format_time(timings['embedding'])}[/yellow] "
+                           f"({len(batch_times)} batches of up to {self.batch_size} chunks, "
+                           f"{self.max_concurrency} in flight, {timings['index_type']} index)")
+        self.console.print(f"[dim]Average time per batch: {self._format_time(timings['avg_batch_time'])}, "
+                           f"average time per chunk: {self._format_time(timings['avg_chunk_time'])}, "
+                           f"embedding cache hits: {embeddings.hits}/{chunk_count}[/dim]")
 
         # Save the vector store locally
         save_start_time = time.time()
+        self._report_progress(progress_callback, 'saving', 'running')
         self.console.print(Panel("[blue]Saving vector store...[/blue]"))
-        base_name = os.path.splitext(pdf_name)[0]
-        save_path = os.path.join("FAISS_index", base_name)
         db.save_local(save_path)
+        os.replace(page_texts_path + '.tmp', page_texts_path)
+        self.index_store.save_pages(content_hash, {
+            **self._index_settings(),
+            'pages': page_records
+        })
+        self.index_store.register(pdf_name, content_hash)
         timings['saving'] = time.time() - save_start_time
+        self._report_progress(progress_callback, 'saving', 'completed',
+                              seconds=timings['saving'])
         self.console.print(f"[green]✓[/green] Successfully saved FAISS index in [yellow]{
                            self._format_time(timings['saving'])}[/yellow]")
 
@@ -174,6 +413,7 @@ class PDFEmbedder:
         total_time = timings['total']
 
         steps = [
+            ("Content Hashing", 'hashing'),
             ("PDF Loading", 'pdf_loading'),
             ("Text Splitting", 'text_splitting'),
             ("Model Initialization", 'model_init'),
@@ -192,7 +432,37 @@ class PDFEmbedder:
                 f"{percentage:.1f}%"
             )
 
+        if 'extraction_speedup' in timings:
+            table.add_row(
+                "Parallel Extraction",
+                f"{self._format_time(timings['extraction_cpu'])} CPU",
+                f"{timings['extraction_speedup']:.1f}x speedup"
+            )
+
         self.console.print("\n[bold]Time Analysis Summary[/bold]")
+        self.console.print(
+            "[dim]Loading, splitting and embedding overlap, so their percentages can exceed 100%.[/dim]")
         self.console.print(table)
+
+        batch_times = timings.get('batch_times')
+        if batch_times:
+            batch_table = Table(title="Embedding Batch Summary")
+            batch_table.add_column("Batches", style="cyan")
+            batch_table.add_column("Batch Size", style="cyan")
+            batch_table.add_column("Concurrency", style="cyan")
+            batch_table.add_column("Avg Batch", style="yellow")
+            batch_table.add_column("Slowest Batch", style="yellow")
+            batch_table.add_column("Avg Chunk", style="green")
+            batch_table.add_column("Cache Hits", style="green")
+            batch_table.add_row(
+                str(timings['batch_count']),
+                str(self.batch_size),
+                str(self.max_concurrency),
+                self._format_time(timings['avg_batch_time']),
+                self._format_time(timings['max_batch_time']),
+                self._format_time(timings['avg_chunk_time']),
+                f"{timings.get('cache_hits', 0)}/{timings.get('cache_hits', 0) + timings.get('cache_misses', 0)}"
+            )
+            self.console.print(batch_table)
         self.console.print(f"\n[dim]Process completed at: {
                            datetime.now().strftime('%Y-%m-%d %H:%M:%S')}[/dim]")
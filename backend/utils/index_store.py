@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+# FAISS index 根目錄
+INDEX_ROOT = "FAISS_index"
+# 檔名與內容雜湊的對照表
+MANIFEST_NAME = "manifest.json"
+# 每個 index 目錄中記錄各頁文字雜湊與 chunk ID 的檔案
+PAGES_NAME = "pages.json"
+# 每個 index 目錄中逐頁保存擷取文字的檔案（JSON Lines）
+PAGE_TEXTS_NAME = "page_texts.jsonl"
+# 每個 index 目錄中保存論文摘要（各節摘要與重要公式）的檔案
+DIGEST_NAME = "digest.json"
+# 串流讀取時每次讀取的大小
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def compute_file_hash(path: str) -> str:
+    """
+    以串流方式計算檔案的 SHA-256
+
+    Args:
+        path (str): 檔案路徑
+
+    Returns:
+        str: 十六進位的 SHA-256 雜湊值
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_and_hash(stream: BinaryIO, dest_path: str) -> str:
+    """
+    將串流寫入檔案，同時計算內容的 SHA-256
+
+    Args:
+        stream (BinaryIO): 來源串流（例如上傳檔案）
+        dest_path (str): 目標檔案路徑
+
+    Returns:
+        str: 十六進位的 SHA-256 雜湊值
+    """
+    digest = hashlib.sha256()
+    with open(dest_path, 'wb') as f:
+        for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+
+class IndexStore:
+    """
+    以 PDF 內容雜湊定址的 FAISS index 儲存區
+
+    每個 index 存放在 FAISS_index/<sha256>/，manifest.json 記錄
+    PDF 檔名對應的內容雜湊。相同內容只會有一份 index，內容變更則會對應到新的雜湊。
+    """
+
+    def __init__(self, root: str = INDEX_ROOT):
+        """
+        初始化 index 儲存區
+
+        Args:
+            root (str): index 根目錄
+        """
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        self._lock = threading.RLock()
+        self._names: Dict[str, str] = {}
+        self._manifest_mtime = None
+        os.makedirs(root, exist_ok=True)
+
+    def _reload_manifest(self):
+        """manifest 被其他實例修改時重新載入"""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            self._names, self._manifest_mtime = {}, None
+            return
+        if mtime == self._manifest_mtime:
+            return
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._names = data.get('names', {}) if isinstance(data, dict) else {}
+        except (json.JSONDecodeError, OSError):
+            self._names = {}
+        self._manifest_mtime = mtime
+
+    def _save_manifest(self):
+        """以暫存檔加上 os.replace 原子性地寫入 manifest"""
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'names': self._names}, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.manifest_path)
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def index_path(self, content_hash: str) -> str:
+        """返回內容雜湊對應的 index 目錄"""
+        return os.path.join(self.root, content_hash)
+
+    def has_index(self, content_hash: str) -> bool:
+        """檢查內容雜湊對應的 index 是否已完整存在"""
+        return os.path.exists(os.path.join(self.index_path(content_hash), 'index.faiss'))
+
+    def _read_json(self, content_hash: str, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.index_path(content_hash), name),
+                      'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, OSError):
+            return None
+        return data if isinstance(data, dict) else None
+
+    def _write_json(self, content_hash: str, name: str, data: Dict[str, Any]):
+        path = os.path.join(self.index_path(content_hash), name)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def load_pages(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        讀取 index 的頁面紀錄（各頁文字雜湊、chunk ID 與建立時的設定）
+
+        Args:
+            content_hash (str): PDF 內容雜湊
+
+        Returns:
+            Optional[Dict[str, Any]]: 頁面紀錄，不存在或無法解析時返回 None
+        """
+        return self._read_json(content_hash, PAGES_NAME)
+
+    def save_pages(self, content_hash: str, pages: Dict[str, Any]):
+        """
+        寫入 index 的頁面紀錄
+
+        Args:
+            content_hash (str): PDF 內容雜湊
+            pages (Dict[str, Any]): 頁面紀錄
+        """
+        self._write_json(content_hash, PAGES_NAME, pages)
+
+    def load_digest(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        讀取 index 的論文摘要
+
+        Args:
+            content_hash (str): PDF 內容雜湊
+
+        Returns:
+            Optional[Dict[str, Any]]: 論文摘要，不存在或無法解析時返回 None
+        """
+        return self._read_json(content_hash, DIGEST_NAME)
+
+    def save_digest(self, content_hash: str, digest: Dict[str, Any]):
+        """
+        寫入 index 的論文摘要
+
+        Args:
+            content_hash (str): PDF 內容雜湊
+            digest (Dict[str, Any]): 論文摘要
+        """
+        self._write_json(content_hash, DIGEST_NAME, digest)
+
+    def has_digest(self, content_hash: str) -> bool:
+        """檢查內容雜湊對應的 index 是否已有論文摘要"""
+        return os.path.exists(os.path.join(self.index_path(content_hash), DIGEST_NAME))
+
+    def page_texts_path(self, content_hash: str) -> str:
+        """返回 index 逐頁文字檔的路徑"""
+        return os.path.join(self.index_path(content_hash), PAGE_TEXTS_NAME)
+
+    def iter_page_texts(self, content_hash: str) -> Optional[Iterator[Tuple[int, str]]]:
+        """
+        依頁碼順序讀取建立 index 時擷取的頁面文字
+
+        Args:
+            content_hash (str): PDF 內容雜湊
+
+        Returns:
+            Optional[Iterator[Tuple[int, str]]]: (頁碼, 文字) 的迭代器，檔案不存在時返回 None
+        """
+        path = self.page_texts_path(content_hash)
+        if not os.path.exists(path):
+            return None
+
+        def read_pages():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    yield record['page'], record['text']
+        return read_pages()
+
+    def get_hash(self, pdf_name: str) -> Optional[str]:
+        """
+        查詢 PDF 檔名目前對應的內容雜湊
+
+        Args:
+            pdf_name (str): PDF 檔名
+
+        Returns:
+            Optional[str]: 內容雜湊，未登記時返回 None
+        """
+        with self._lock:
+            self._reload_manifest()
+            return self._names.get(os.path.basename(pdf_name))
+
+    def resolve(self, pdf_name: str) -> Optional[str]:
+        """
+        查詢 PDF 檔名目前對應的 index 目錄
+
+        Args:
+            pdf_name (str): PDF 檔名
+
+        Returns:
+            Optional[str]: index 目錄，未登記或 index 不存在時返回 None
+        """
+        content_hash = self.get_hash(pdf_name)
+        if content_hash is None or not self.has_index(content_hash):
+            return None
+        return self.index_path(content_hash)
+
+    def names_by_hash(self) -> Dict[str, List[str]]:
+        """
+        返回已建立 index 的內容雜湊與其對應的 PDF 檔名
+
+        Returns:
+            Dict[str, List[str]]: 內容雜湊對應的檔名列表
+        """
+        with self._lock:
+            self._reload_manifest()
+            names = dict(self._names)
+        grouped: Dict[str, List[str]] = {}
+        for pdf_name, content_hash in sorted(names.items()):
+            if self.has_index(content_hash):
+                grouped.setdefault(content_hash, []).append(pdf_name)
+        return grouped
+
+    def register(self, pdf_name: str, content_hash: str):
+        """
+        將 PDF 檔名指向內容雜湊，並清除不再被任何檔名引用的舊 index
+
+        Args:
+            pdf_name (str): PDF 檔名
+            content_hash (str): PDF 內容雜湊
+        """
+        pdf_name = os.path.basename(pdf_name)
+        with self._lock:
+            self._reload_manifest()
+            previous_hash = self._names.get(pdf_name)
+            if previous_hash == content_hash:
+                return
+            self._names[pdf_name] = content_hash
+            self._save_manifest()
+
+            if previous_hash and previous_hash not in self._names.values():
+                shutil.rmtree(self.index_path(previous_hash),
+                              ignore_errors=True)
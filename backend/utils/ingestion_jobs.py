@@ -0,0 +1,272 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from rich.console import Console
+from rich.panel import Panel
+
+from .embedding_pdf import PDFEmbedder
+from .paper_digest import PaperDigester
+
+# 創建 rich console 實例
+console = Console()
+
+# PDFEmbedder 計時的處理階段
+INGESTION_STAGES = ('pdf_loading', 'text_splitting', 'embedding', 'saving')
+
+
+class IngestionJob:
+    """單一 PDF 的背景處理工作"""
+
+    def __init__(self, pdf_path: str, pdf_name: str, content_hash: str,
+                 stages: Tuple[str, ...] = INGESTION_STAGES, digest: bool = False):
+        self.id = uuid.uuid4().hex
+        self.pdf_path = pdf_path
+        self.pdf_names: List[str] = [pdf_name]
+        self.content_hash = content_hash
+        self.status = 'queued'
+        self.error: Optional[str] = None
+        self.timings: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.stages: Dict[str, Dict[str, Any]] = {
+            stage: {'status': 'pending'} for stage in stages
+        }
+        # 論文摘要在工作完成（index 可使用）後另外產生，有獨立的狀態
+        self.digest: Optional[Dict[str, Any]] = {'status': 'pending'} if digest else None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉換為可序列化的狀態字典"""
+        return {
+            'jobId': self.id,
+            'filenames': list(self.pdf_names),
+            'contentHash': self.content_hash,
+            'status': self.status,
+            'stages': {stage: dict(info) for stage, info in self.stages.items()},
+            'digest': dict(self.digest) if self.digest is not None else None,
+            'error': self.error,
+            'createdAt': self.created_at,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+            'totalTime': self.timings.get('total') if self.timings else None
+        }
+
+
+class IngestionJobQueue:
+    """
+    PDF 處理工作佇列
+
+    /upload 將工作送入本地 worker pool 後立即返回工作 ID，
+    相同內容雜湊的進行中工作會被合併。index 建立完成後工作即標記為 completed，
+    論文摘要再由獨立的單一 worker 產生，不延遲工作完成與 on_complete。
+    """
+
+    def __init__(self, embedder: PDFEmbedder, max_workers: int = 2,
+                 max_finished_jobs: int = 200,
+                 on_complete: Optional[Callable[[IngestionJob], None]] = None,
+                 digester: Optional[PaperDigester] = None):
+        """
+        初始化工作佇列
+
+        Args:
+            embedder (PDFEmbedder): 執行處理流程的 embedder
+            max_workers (int): 同時處理的工作數量
+            max_finished_jobs (int): 保留的已完成工作數量
+            on_complete (Optional[Callable[[IngestionJob], None]]): 工作成功完成後呼叫，
+                例如送出預翻譯工作
+            digester (Optional[PaperDigester]): 工作完成後產生論文摘要，None 表示不產生
+        """
+        self.embedder = embedder
+        self.max_finished_jobs = max_finished_jobs
+        self.on_complete = on_complete
+        self.digester = digester
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='ingestion')
+        # 摘要每個章節都要呼叫 LLM，以單一 worker 依序產生，不佔用建立 index 的 worker
+        self.digest_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='digest') if digester is not None else None
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self.active_by_hash: Dict[str, IngestionJob] = {}
+        # 內容雜湊對應正在產生的摘要狀態，之後的工作共用同一份狀態
+        self.digests_by_hash: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, pdf_path: str, content_hash: str) -> Tuple[IngestionJob, bool]:
+        """
+        送出處理工作，相同內容雜湊的進行中工作會直接沿用
+
+        Args:
+            pdf_path (str): PDF 檔案路徑
+            content_hash (str): PDF 內容雜湊
+
+        Returns:
+            Tuple[IngestionJob, bool]: (工作, 是否為新建立的工作)
+        """
+        pdf_name = os.path.basename(pdf_path)
+        with self._lock:
+            existing = self.active_by_hash.get(content_hash)
+            if existing is not None:
+                if pdf_name not in existing.pdf_names:
+                    existing.pdf_names.append(pdf_name)
+                return existing, False
+
+            job = IngestionJob(pdf_path, pdf_name, content_hash,
+                               digest=self.digester is not None)
+            self.jobs[job.id] = job
+            self.active_by_hash[content_hash] = job
+            self._trim_finished_jobs()
+
+        self.executor.submit(self._run, job)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """取得工作狀態，工作不存在時返回 None"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def find_active(self, pdf_name: Optional[str] = None,
+                    pdf_path: Optional[str] = None) -> Optional[IngestionJob]:
+        """
+        尋找排隊中或執行中的工作
+
+        Args:
+            pdf_name (Optional[str]): 工作涵蓋的 PDF 檔名（含合併進來的檔名）
+            pdf_path (Optional[str]): 工作正在讀取的 PDF 檔案路徑
+
+        Returns:
+            Optional[IngestionJob]: 符合條件的進行中工作，沒有時返回 None
+        """
+        target_path = os.path.abspath(pdf_path) if pdf_path else None
+        with self._lock:
+            for job in self.active_by_hash.values():
+                if not job.active:
+                    continue
+                if pdf_name is not None and pdf_name in job.pdf_names:
+                    return job
+                if target_path is not None and os.path.abspath(job.pdf_path) == target_path:
+                    return job
+        return None
+
+    def _trim_finished_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items()
+                    if not job.active]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def _update_stage(self, job: IngestionJob, stage: str, status: str, **details):
+        with self._lock:
+            if stage in job.stages:
+                job.stages[stage].update(status=status, **details)
+
+    def _run(self, job: IngestionJob):
+        """在 worker 執行緒中執行處理流程"""
+        with self._lock:
+            job.status = 'running'
+            job.started_at = time.time()
+
+        try:
+            timings = self.embedder.create_embeddings(
+                job.pdf_path,
+                force=False,
+                content_hash=job.content_hash,
+                progress_callback=lambda stage, status, **details:
+                    self._update_stage(job, stage, status, **details)
+            )
+            with self._lock:
+                if timings is None:
+                    # index 已存在，建立 index 的階段皆略過
+                    for stage in INGESTION_STAGES:
+                        if job.stages[stage]['status'] == 'pending':
+                            job.stages[stage]['status'] = 'skipped'
+                job.timings = timings
+                pdf_names = list(job.pdf_names)
+
+            # 合併進來的其他檔名也指向同一份 index
+            for pdf_name in pdf_names:
+                self.embedder.index_store.register(pdf_name, job.content_hash)
+
+            # index 已可使用：先標記完成並通知，摘要之後另外產生
+            with self._lock:
+                job.status = 'completed'
+                job.finished_at = time.time()
+                if self.active_by_hash.get(job.content_hash) is job:
+                    del self.active_by_hash[job.content_hash]
+
+            if self.digester is not None:
+                self._submit_digest(job)
+
+            if self.on_complete is not None:
+                self.on_complete(job)
+
+        except Exception as e:
+            with self._lock:
+                job.status = 'failed'
+                job.error = str(e)
+                for info in job.stages.values():
+                    if info['status'] == 'running':
+                        info['status'] = 'failed'
+                if job.digest is not None and job.digest['status'] == 'pending':
+                    job.digest['status'] = 'skipped'
+            console.print(Panel(
+                f"[red]Ingestion job failed for[/red] [yellow]{', '.join(job.pdf_names)}[/yellow]\n"
+                f"[red]Error details:[/red] {str(e)}",
+                title="Ingestion Error",
+                border_style="red"
+            ))
+
+        finally:
+            with self._lock:
+                if job.finished_at is None:
+                    job.finished_at = time.time()
+                if self.active_by_hash.get(job.content_hash) is job:
+                    del self.active_by_hash[job.content_hash]
+
+    def _submit_digest(self, job: IngestionJob):
+        """送出摘要工作；相同內容的摘要正在產生時沿用其狀態"""
+        with self._lock:
+            running = self.digests_by_hash.get(job.content_hash)
+            if running is not None:
+                job.digest = running
+                return
+            self.digests_by_hash[job.content_hash] = job.digest
+        self.digest_executor.submit(self._run_digest, job)
+
+    def _update_digest(self, job: IngestionJob, status: str, **details):
+        with self._lock:
+            job.digest.update(status=status, **details)
+
+    def _run_digest(self, job: IngestionJob):
+        """
+        在摘要 worker 中產生論文摘要；index 已可使用，摘要失敗只標記摘要狀態
+        """
+        self._update_digest(job, 'running')
+        start_time = time.time()
+        try:
+            digest = self.digester.create_digest(
+                job.content_hash,
+                progress_callback=lambda done, total:
+                    self._update_digest(job, 'running', done=done, total=total)
+            )
+            self._update_digest(job, 'skipped' if digest is None else 'completed',
+                                time=time.time() - start_time)
+        except Exception as e:
+            self._update_digest(job, 'failed', error=str(e))
+            console.print(Panel(
+                f"[red]Paper digest failed for[/red] [yellow]{', '.join(job.pdf_names)}[/yellow]\n"
+                f"[red]Error details:[/red] {str(e)}",
+                title="Digest Error",
+                border_style="red"
+            ))
+        finally:
+            with self._lock:
+                self.digests_by_hash.pop(job.content_hash, None)
@@ -0,0 +1,120 @@
+import threading
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from rich.console import Console
+from rich.panel import Panel
+
+# 創建 rich console 實例
+console = Console()
+
+# Ollama 回應中以奈秒表示的耗時欄位
+DURATION_FIELDS = ('total_duration', 'load_duration', 'prompt_eval_duration', 'eval_duration')
+# Ollama 回應中的 token 數量欄位
+COUNT_FIELDS = ('prompt_eval_count', 'eval_count')
+
+
+def _ollama_timings(response: LLMResult) -> Optional[Dict[str, int]]:
+    """從 LLM 回應中取出 Ollama 的耗時與 token 數量，沒有這些欄位時返回 None"""
+    for generations in response.generations:
+        for generation in generations:
+            sources = [getattr(generation, 'generation_info', None)]
+            message = getattr(generation, 'message', None)
+            if message is not None:
+                sources.append(getattr(message, 'response_metadata', None))
+            for source in sources:
+                if source and 'eval_duration' in source:
+                    return {name: int(source.get(name) or 0)
+                            for name in DURATION_FIELDS + COUNT_FIELDS}
+    return None
+
+
+class OllamaTimingCallback(BaseCallbackHandler):
+    """
+    記錄每次 Ollama 呼叫的提示處理（prompt eval）與生成（eval）耗時
+
+    Ollama 只對提示快取未命中的部分計算 prompt_eval_count，系統提示前綴被重用時
+    prompt_eval_count 會明顯小於提示長度、prompt_eval_duration 隨之下降。
+    耗時依 LangGraph 節點名稱（或呼叫時 metadata 的 node）彙整。
+    """
+
+    def __init__(self, verbose: bool = True):
+        """
+        Args:
+            verbose (bool): 是否為每次呼叫輸出耗時面板
+        """
+        self.verbose = verbose
+        self._nodes: Dict[UUID, str] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _remember_node(self, run_id: UUID, metadata: Optional[Dict[str, Any]]):
+        metadata = metadata or {}
+        node = metadata.get('langgraph_node') or metadata.get('node') or 'unknown'
+        with self._lock:
+            self._nodes[run_id] = node
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *,
+                            run_id: UUID, metadata: Optional[Dict[str, Any]] = None,
+                            **kwargs: Any) -> None:
+        self._remember_node(run_id, metadata)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *,
+                     run_id: UUID, metadata: Optional[Dict[str, Any]] = None,
+                     **kwargs: Any) -> None:
+        self._remember_node(run_id, metadata)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._nodes.pop(run_id, None)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        timings = _ollama_timings(response)
+        with self._lock:
+            node = self._nodes.pop(run_id, 'unknown')
+            if timings is None:
+                return
+            stats = self._stats.setdefault(
+                node, dict.fromkeys(('calls',) + DURATION_FIELDS + COUNT_FIELDS, 0))
+            stats['calls'] += 1
+            for name, value in timings.items():
+                stats[name] += value
+
+        if self.verbose:
+            console.print(Panel(
+                f"[cyan]Prompt eval:[/cyan] [green]{timings['prompt_eval_count']} tokens, "
+                f"{timings['prompt_eval_duration'] / 1e6:.0f} ms[/green]\n"
+                f"[cyan]Eval:[/cyan] [green]{timings['eval_count']} tokens, "
+                f"{timings['eval_duration'] / 1e6:.0f} ms[/green]\n"
+                f"[cyan]Load:[/cyan] {timings['load_duration'] / 1e6:.0f} ms  "
+                f"[cyan]Total:[/cyan] {timings['total_duration'] / 1e6:.0f} ms",
+                title=f"Ollama Timing ({node})",
+                border_style="magenta"))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        返回各節點累計的耗時統計
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 節點名稱對應呼叫次數、token 數量與毫秒耗時
+        """
+        with self._lock:
+            result = {}
+            for node, stats in self._stats.items():
+                entry: Dict[str, Any] = {'calls': stats['calls']}
+                for name in COUNT_FIELDS:
+                    entry[name] = stats[name]
+                for name in DURATION_FIELDS:
+                    entry[name.replace('_duration', '_ms')] = round(stats[name] / 1e6, 1)
+                entry['avg_prompt_eval_ms'] = round(
+                    stats['prompt_eval_duration'] / 1e6 / stats['calls'], 1)
+                entry['avg_eval_ms'] = round(stats['eval_duration'] / 1e6 / stats['calls'], 1)
+                result[node] = entry
+            return result
+
+    def reset(self):
+        """清除累計的統計"""
+        with self._lock:
+            self._stats.clear()
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class LRUCache:
+    """
+    執行緒安全的 LRU 快取，可同時限制項目數量與總大小
+
+    項目大小由 size_fn 計算，超出 max_entries 或 max_bytes 時
+    會從最久未使用的項目開始淘汰。設定 ttl 時，項目在寫入 ttl 秒後過期。
+    設定 on_evict 時，被淘汰的項目會在釋放鎖之後交給 on_evict(key, value) 處理。
+    """
+
+    def __init__(self, max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 size_fn: Optional[Callable[[Any], int]] = None,
+                 ttl: Optional[float] = None,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        """
+        初始化 LRU 快取
+
+        Args:
+            max_entries (Optional[int]): 最大項目數量，None 表示不限制
+            max_bytes (Optional[int]): 最大總大小（位元組），None 表示不限制
+            size_fn (Optional[Callable[[Any], int]]): 計算項目大小的函數
+            ttl (Optional[float]): 項目存活秒數，None 表示不過期
+            on_evict (Optional[Callable[[Hashable, Any], None]]): 項目因超出限制被淘汰時呼叫的函數
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_fn = size_fn or (lambda value: 0)
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._expires: Dict[Hashable, float] = {}
+        self._lock = threading.RLock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """取得項目並將其標記為最近使用"""
+        with self._lock:
+            if key in self._data and self._expired(key):
+                self._remove(key)
+                self.expirations += 1
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None):
+        """
+        加入或更新項目，必要時淘汰最久未使用的項目
+
+        Args:
+            key (Hashable): 快取鍵
+            value (Any): 快取值
+            size (Optional[int]): 項目大小，未提供時使用 size_fn 計算
+        """
+        size = self.size_fn(value) if size is None else size
+        with self._lock:
+            self._remove(key)
+            # 單一項目超過總預算時不快取
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self.current_bytes += size
+            if self.ttl is not None:
+                self._expires[key] = time.monotonic() + self.ttl
+            evicted = self._evict()
+        if self.on_evict is not None:
+            for evicted_key, evicted_value in evicted:
+                self.on_evict(evicted_key, evicted_value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """移除項目並返回其值"""
+        with self._lock:
+            value = self._data.get(key, default)
+            self._remove(key)
+            return value
+
+    def clear(self):
+        """清空所有項目"""
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._expires.clear()
+            self.current_bytes = 0
+
+    def values(self):
+        """返回目前所有值的快照"""
+        with self._lock:
+            return list(self._data.values())
+
+    def stats(self) -> Dict[str, int]:
+        """返回快取的統計資訊"""
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self.current_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data and not self._expired(key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def _remove(self, key: Hashable):
+        if key in self._data:
+            del self._data[key]
+            self.current_bytes -= self._sizes.pop(key)
+            self._expires.pop(key, None)
+
+    def _expired(self, key: Hashable) -> bool:
+        expires = self._expires.get(key)
+        return expires is not None and expires <= time.monotonic()
+
+    def _evict(self) -> List[Tuple[Hashable, Any]]:
+        evicted = []
+        while self._data and (
+            (self.max_entries is not None and len(self._data) > self.max_entries) or
+            (self.max_bytes is not None and self.current_bytes > self.max_bytes)
+        ):
+            key, value = self._data.popitem(last=False)
+            self.current_bytes -= self._sizes.pop(key)
+            self._expires.pop(key, None)
+            self.evictions += 1
+            evicted.append((key, value))
+        return evicted
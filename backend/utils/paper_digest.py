@@ -0,0 +1,236 @@
+import json
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_ollama import ChatOllama
+from rich.console import Console
+from rich.panel import Panel
+
+from .index_store import IndexStore
+from .tools.configuration import Configuration
+from .tools.prompts import paper_overview_instructions, section_digest_instructions
+
+# 創建 rich console 實例
+console = Console()
+
+# 摘要格式版本，格式改變時遞增以重新產生
+DIGEST_VERSION = 1
+
+# 有編號的章節標題，例如 "3 Method"、"2.1 Setup"、"IV. RESULTS"
+NUMBERED_HEADING = re.compile(
+    r'^(?P<number>\d{1,2}(?:\.\d{1,2}){0,2}|[IVX]{1,5})\.?\s+(?P<title>[A-Z][^\n]{1,80})$')
+# 不帶編號也視為章節標題的常見名稱
+KNOWN_HEADINGS = {
+    'abstract', 'introduction', 'background', 'related work', 'method', 'methods',
+    'methodology', 'approach', 'experiments', 'experimental setup', 'results',
+    'evaluation', 'discussion', 'limitations', 'conclusion', 'conclusions',
+    'future work', 'appendix', 'references', 'bibliography', 'acknowledgments',
+    'acknowledgements'
+}
+# 這些章節之後的內容不納入摘要
+STOP_HEADINGS = ('references', 'bibliography', 'acknowledgments', 'acknowledgements')
+# 找不到章節標題時，每個段落涵蓋的頁數
+FALLBACK_PAGES_PER_SECTION = 4
+# 原文摘要保留的字元數
+ABSTRACT_MAX_CHARS = 2000
+
+
+def _heading_title(line: str) -> Optional[Tuple[str, bool]]:
+    """
+    判斷一行文字是否為章節標題
+
+    Returns:
+        Optional[Tuple[str, bool]]: (標題, 是否為子章節)，不是標題時返回 None
+    """
+    line = line.strip()
+    if not line or len(line) > 90:
+        return None
+    if line.lower().rstrip(':') in KNOWN_HEADINGS:
+        return line.rstrip(':'), False
+    match = NUMBERED_HEADING.match(line)
+    if match is None:
+        return None
+    title = match.group('title').strip()
+    # 排除句子（例如以句號結尾或含有多個逗號的行）與數字開頭的表格內容
+    if title.endswith('.') or title.count(',') > 1 or len(title.split()) > 10:
+        return None
+    return f"{match.group('number')} {title}", '.' in match.group('number')
+
+
+def split_sections(pages: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+    """
+    依章節標題將論文切分為章節
+
+    子章節併入所屬的章節；參考文獻與致謝之後的內容捨棄。
+    找不到任何章節標題時，改為每 FALLBACK_PAGES_PER_SECTION 頁一段。
+
+    Args:
+        pages (List[Tuple[int, str]]): (頁碼, 文字) 列表
+
+    Returns:
+        List[Dict[str, Any]]: 每個章節的 {'title', 'pages': [起始頁, 結束頁], 'text'}
+    """
+    sections: List[Dict[str, Any]] = []
+    preamble: List[str] = []
+    stopped = False
+    for page, text in pages:
+        for line in text.splitlines():
+            heading = _heading_title(line)
+            if heading is not None and not heading[1]:
+                title = heading[0]
+                if title.lower().split(' ', 1)[-1].startswith(STOP_HEADINGS):
+                    stopped = True
+                    break
+                sections.append({'title': title, 'pages': [page, page], 'lines': []})
+                continue
+            if sections:
+                sections[-1]['lines'].append(line)
+                sections[-1]['pages'][1] = page
+            else:
+                preamble.append(line)
+        if stopped:
+            break
+
+    if not sections:
+        sections = [{
+            'title': f"Pages {group[0][0] + 1}-{group[-1][0] + 1}",
+            'pages': [group[0][0], group[-1][0]],
+            'lines': [text for _, text in group]
+        } for group in (pages[start:start + FALLBACK_PAGES_PER_SECTION]
+                        for start in range(0, len(pages), FALLBACK_PAGES_PER_SECTION))]
+    elif preamble and not any(section['title'].lower() == 'abstract' for section in sections):
+        # 第一個標題之前的內容（標題、作者與未標示的摘要）作為前言
+        sections.insert(0, {'title': 'Front matter', 'pages': [pages[0][0], sections[0]['pages'][0]],
+                            'lines': preamble})
+
+    result = []
+    for section in sections:
+        text = '\n'.join(section['lines']).strip()
+        if text:
+            result.append({'title': section['title'], 'pages': section['pages'], 'text': text})
+    return result
+
+
+class PaperDigester:
+    """
+    在建立 index 後以研究用 LLM 產生論文摘要（digest.json）
+
+    摘要包含原文摘要、全文概述，以及每個章節的摘要、頁碼範圍與重要公式，
+    存放在 FAISS index 旁，供代理以階層式檢索先讀摘要、必要時再取原文段落。
+    """
+
+    def __init__(self, index_store: IndexStore, model: Optional[str] = None,
+                 max_section_chars: int = 6000, summary_words: int = 150):
+        """
+        Args:
+            index_store (IndexStore): 存放 index 與逐頁文字的 IndexStore
+            model (Optional[str]): Ollama 模型名稱，預設為研究用模型
+            max_section_chars (int): 單次 LLM 呼叫送出的章節文字上限，較長的章節分段摘要
+            summary_words (int): 每段摘要的字數上限
+        """
+        self.index_store = index_store
+        configuration = Configuration()
+        self.model = model or configuration.research_llm
+        self.llm = ChatOllama(model=self.model, format="json", temperature=0,
+                              keep_alive=configuration.ollama_keep_alive)
+        self.max_section_chars = max_section_chars
+        self.summary_words = summary_words
+
+    def _invoke_json(self, instructions: str, content: str) -> Dict[str, Any]:
+        response = self.llm.invoke([
+            SystemMessage(content=instructions),
+            HumanMessage(content=content)
+        ])
+        try:
+            parsed = json.loads(response.content)
+        except json.JSONDecodeError:
+            return {}
+        return parsed if isinstance(parsed, dict) else {}
+
+    def _digest_section(self, section: Dict[str, Any]) -> Dict[str, Any]:
+        """摘要單一章節，過長的章節分段摘要後合併"""
+        text = section['text']
+        parts = [text[start:start + self.max_section_chars]
+                 for start in range(0, len(text), self.max_section_chars)]
+        summaries, equations = [], []
+        # 章節標題放在使用者訊息中，所有章節共用相同的系統提示
+        instructions = section_digest_instructions.format(max_words=self.summary_words)
+        for part in parts:
+            result = self._invoke_json(instructions, f"Section: {section['title']}\n\n{part}")
+            summary = result.get('summary')
+            if isinstance(summary, str) and summary.strip():
+                summaries.append(summary.strip())
+            for equation in result.get('key_equations') or []:
+                if isinstance(equation, str) and equation.strip() and equation not in equations:
+                    equations.append(equation.strip())
+        return {
+            'title': section['title'],
+            'pages': section['pages'],
+            'summary': ' '.join(summaries),
+            'equations': equations
+        }
+
+    def create_digest(self, content_hash: str, force: bool = False,
+                      progress_callback: Optional[Callable[..., None]] = None
+                      ) -> Optional[Dict[str, Any]]:
+        """
+        產生並保存論文摘要
+
+        Args:
+            content_hash (str): PDF 內容雜湊
+            force (bool): 是否重新產生已存在的摘要
+            progress_callback (Optional[Callable[..., None]]): 以 (已完成章節數, 章節總數) 回報進度
+
+        Returns:
+            Optional[Dict[str, Any]]: 產生的摘要，已存在同版本的摘要時返回 None
+
+        Raises:
+            ValueError: index 沒有逐頁文字時拋出
+        """
+        if not force:
+            existing = self.index_store.load_digest(content_hash)
+            if existing is not None and existing.get('version') == DIGEST_VERSION:
+                return None
+
+        page_texts = self.index_store.iter_page_texts(content_hash)
+        if page_texts is None:
+            raise ValueError(f"No page texts stored for index {content_hash}")
+        pages = list(page_texts)
+        start_time = time.time()
+        sections = split_sections(pages)
+
+        abstract = next((section['text'][:ABSTRACT_MAX_CHARS] for section in sections
+                         if section['title'].lower() == 'abstract'), None)
+        digested = []
+        for number, section in enumerate(sections, start=1):
+            if section['title'].lower() != 'abstract':
+                digested.append(self._digest_section(section))
+            if progress_callback is not None:
+                progress_callback(number, len(sections))
+
+        overview = self._invoke_json(
+            paper_overview_instructions.format(max_words=self.summary_words * 2),
+            '\n\n'.join(f"{section['title']}: {section['summary']}"
+                        for section in digested if section['summary'])
+        ).get('overview') if digested else None
+
+        digest = {
+            'version': DIGEST_VERSION,
+            'model': self.model,
+            'created_at': time.time(),
+            'abstract': abstract,
+            'overview': overview if isinstance(overview, str) else None,
+            'sections': digested
+        }
+        self.index_store.save_digest(content_hash, digest)
+
+        console.print(Panel(
+            f"[cyan]Sections:[/cyan] [green]{len(digested)}[/green]\n"
+            f"[cyan]Pages:[/cyan] [green]{len(pages)}[/green]\n"
+            f"[cyan]Time:[/cyan] [green]{time.time() - start_time:.2f} seconds[/green]",
+            title="Paper Digest",
+            border_style="green"
+        ))
+        return digest
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import fitz
+from langchain_core.documents import Document
+
+# 每個工作負責的頁數
+DEFAULT_PAGES_PER_TASK = 16
+# 頁數少於此值時直接在目前行程中擷取，避免行程池的額外開銷
+MIN_PAGES_FOR_POOL = 48
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(max_workers: int) -> ProcessPoolExecutor:
+    """取得共用的行程池（spawn 模式，避免在多執行緒的伺服器中 fork）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _base_metadata(doc: fitz.Document, pdf_path: str) -> Dict[str, Any]:
+    """建立與 PyMuPDFLoader 相同格式的文件層級 metadata"""
+    metadata = {
+        key.lower(): value for key, value in (doc.metadata or {}).items()
+        if isinstance(value, (str, int))
+    }
+    metadata.update(source=pdf_path, file_path=pdf_path,
+                    total_pages=doc.page_count)
+    return metadata
+
+
+def _extract_range(pdf_path: str, start: int, end: int) -> Tuple[List[Tuple[str, Dict[str, Any]]], float]:
+    """
+    擷取指定頁碼範圍的文字（在子行程中執行）
+
+    Returns:
+        Tuple[List[Tuple[str, Dict[str, Any]]], float]: ((文字, metadata) 列表, 擷取耗時)
+    """
+    task_start = time.time()
+    with fitz.open(pdf_path) as doc:
+        base = _base_metadata(doc, pdf_path)
+        pages = [(doc[page_no].get_text(), {**base, 'page': page_no})
+                 for page_no in range(start, min(end, doc.page_count))]
+    return pages, time.time() - task_start
+
+
+def page_count(pdf_path: str) -> int:
+    """返回 PDF 頁數"""
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def _pooled_results(pdf_path: str, ranges: List[Tuple[int, int]],
+                    max_workers: int) -> Iterator[Tuple[List[Tuple[str, Dict[str, Any]]], float]]:
+    """
+    在行程池中擷取各頁碼範圍，依序返回結果
+
+    同時進行的工作數量限制為行程數的兩倍，取用端較慢時不會把整份文件的文字都堆在記憶體中。
+    """
+    pool = _get_pool(max_workers)
+    max_in_flight = max_workers * 2
+    pending = deque()
+    try:
+        for start, end in ranges:
+            pending.append(pool.submit(_extract_range, pdf_path, start, end))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # 取用端提前停止時取消尚未開始的工作
+        for future in pending:
+            future.cancel()
+
+
+def iter_pdf_pages(pdf_path: str, max_workers: Optional[int] = None,
+                   pages_per_task: int = DEFAULT_PAGES_PER_TASK,
+                   stats: Optional[Dict[str, float]] = None) -> Iterator[Document]:
+    """
+    依頁碼順序逐頁產生 PDF 內容
+
+    大型 PDF 會依頁碼範圍分配到行程池中平行擷取，前面的頁面完成後立即產生，
+    讓後續的切分與 embedding 可以在其他頁面仍在擷取時開始。
+
+    Args:
+        pdf_path (str): PDF 檔案路徑
+        max_workers (Optional[int]): 行程池大小，預設為 CPU 數量
+        pages_per_task (int): 每個擷取工作的頁數
+        stats (Optional[Dict[str, float]]): 若提供，寫入 'extraction_cpu'（各工作耗時總和）
+            與 'extraction_wall'（擷取實際耗時）
+
+    Yields:
+        Document: 每頁的內容與 metadata（含 page、total_pages、source）
+    """
+    start_time = time.time()
+    total_pages = page_count(pdf_path)
+    ranges = [(start, start + pages_per_task)
+              for start in range(0, total_pages, pages_per_task)]
+    cpu_time = 0.0
+
+    if total_pages < MIN_PAGES_FOR_POOL or len(ranges) == 1:
+        results = (_extract_range(pdf_path, start, end) for start, end in ranges)
+    else:
+        results = _pooled_results(pdf_path, ranges, max_workers or os.cpu_count() or 1)
+
+    # 依序等待各頁碼範圍，保證輸出的頁碼順序
+    for pages, elapsed in results:
+        cpu_time += elapsed
+        if stats is not None:
+            stats['extraction_cpu'] = cpu_time
+            stats['extraction_wall'] = time.time() - start_time
+        for text, metadata in pages:
+            yield Document(page_content=text, metadata=metadata)
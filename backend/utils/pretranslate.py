@@ -0,0 +1,416 @@
+import bisect
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from rich.console import Console
+from rich.panel import Panel
+
+from .index_store import IndexStore
+from .lru_cache import LRUCache
+from .pdf_extract import iter_pdf_pages
+from .translate import SUPPORTED_LANGUAGES, translation_cache, translation_chain
+from .translation_backends import TranslationChain
+from .translation_batch import pack_batches
+
+# 創建 rich console 實例
+console = Console()
+
+# 單一段落的最大長度，過長的段落依句子切開
+MAX_PARAGRAPH_CHARS = 1500
+# 每個 index 目錄中存放預翻譯結果的子目錄
+TRANSLATIONS_DIR = "translations"
+# 部分段落翻譯失敗時，與翻譯檔並存的標記檔副檔名
+PARTIAL_SUFFIX = ".partial"
+# 選取範圍至少要佔段落的比例，才直接以段落翻譯回應
+DEFAULT_MIN_COVERAGE = float(os.getenv('PRETRANSLATE_MIN_COVERAGE', 0.5))
+
+_WHITESPACE = re.compile(r'\s+')
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?。！？])\s+')
+_LINE_END = re.compile(r'[.!?:。！？：]["\')\]]?$')
+
+
+def normalize_text(text: str) -> str:
+    """Unicode NFC 正規化並合併連續空白，選取文字與頁面文字都以此比對"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def _split_long(paragraph: str) -> List[str]:
+    """將超過 MAX_PARAGRAPH_CHARS 的段落依句子切成較小的段落"""
+    if len(paragraph) <= MAX_PARAGRAPH_CHARS:
+        return [paragraph]
+    parts, current = [], ''
+    for sentence in _SENTENCE_END.split(paragraph):
+        # 沒有句號的超長句子直接截斷
+        while len(sentence) > MAX_PARAGRAPH_CHARS:
+            if current:
+                parts.append(current)
+                current = ''
+            parts.append(sentence[:MAX_PARAGRAPH_CHARS])
+            sentence = sentence[MAX_PARAGRAPH_CHARS:].lstrip()
+        if current and len(current) + 1 + len(sentence) > MAX_PARAGRAPH_CHARS:
+            parts.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_paragraphs(page_text: str) -> List[str]:
+    """
+    將 PyMuPDF 擷取的頁面文字切成段落
+
+    PyMuPDF 的純文字輸出通常沒有空行，除了空行之外，以句末標點結尾且明顯
+    短於一般行寬的行也視為段落結尾。
+
+    Args:
+        page_text (str): 頁面文字
+
+    Returns:
+        List[str]: 正規化後的段落
+    """
+    paragraphs = []
+    for block in _PARAGRAPH_BREAK.split(page_text):
+        lines = [line.strip() for line in block.splitlines() if line.strip()]
+        if not lines:
+            continue
+        full_width = max(len(line) for line in lines)
+        current: List[str] = []
+        for line in lines:
+            current.append(line)
+            if _LINE_END.search(line) and len(line) < 0.8 * full_width:
+                paragraphs.append(normalize_text(' '.join(current)))
+                current = []
+        if current:
+            paragraphs.append(normalize_text(' '.join(current)))
+    return [part for paragraph in paragraphs if paragraph
+            for part in _split_long(paragraph)]
+
+
+class PretranslationStore:
+    """
+    預翻譯結果的儲存區
+
+    每個 PDF 內容雜湊與語言對應 FAISS_index/<sha256>/translations/<lang>.json，
+    以正規化的頁面文字與各段落在其中的 [起點, 終點) 位移索引翻譯結果，
+    選取範圍可以用字串搜尋加上二分搜尋找到所在的段落。
+    """
+
+    def __init__(self, index_store: IndexStore, max_loaded: int = 16):
+        """
+        Args:
+            index_store (IndexStore): FAISS index 儲存區
+            max_loaded (int): 記憶體中保留的已載入翻譯檔數量
+        """
+        self.index_store = index_store
+        self.loaded = LRUCache(max_entries=max_loaded)
+
+    def path(self, content_hash: str, language: str) -> str:
+        """返回翻譯檔路徑"""
+        return os.path.join(self.index_store.index_path(content_hash),
+                            TRANSLATIONS_DIR, f"{language}.json")
+
+    def has(self, content_hash: str, language: str) -> bool:
+        """是否已有完整的翻譯檔；部分完成的翻譯檔不算，會再次送出預翻譯補上"""
+        path = self.path(content_hash, language)
+        return os.path.exists(path) and not os.path.exists(path + PARTIAL_SUFFIX)
+
+    def is_partial(self, content_hash: str, language: str) -> bool:
+        """翻譯檔是否有翻譯失敗的段落"""
+        return os.path.exists(self.path(content_hash, language) + PARTIAL_SUFFIX)
+
+    def save(self, content_hash: str, language: str, pages: List[Dict[str, Any]],
+             missing: int = 0):
+        """
+        以暫存檔加上 os.replace 原子性地寫入翻譯檔
+
+        Args:
+            content_hash (str): PDF 內容雜湊
+            language (str): 目標語言代碼
+            pages (List[Dict[str, Any]]): 每頁的 {'page', 'text', 'paragraphs': [[起點, 終點, 譯文], ...]}，
+                翻譯失敗的段落譯文為 None
+            missing (int): 翻譯失敗的段落數量，大於 0 時標記為部分完成
+        """
+        path = self.path(content_hash, language)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if missing:
+            # 先寫標記再寫翻譯檔，中途中斷時不會被誤認為完整
+            with open(path + PARTIAL_SUFFIX, 'w', encoding='utf-8') as f:
+                f.write(str(missing))
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'language': language, 'pages': pages, 'missing': missing},
+                      f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+        if not missing and os.path.exists(path + PARTIAL_SUFFIX):
+            os.remove(path + PARTIAL_SUFFIX)
+        self.loaded.pop((content_hash, language))
+
+    def _load(self, content_hash: str, language: str) -> Optional[List[Dict[str, Any]]]:
+        key = (content_hash, language)
+        pages = self.loaded.get(key)
+        if pages is not None:
+            return pages
+        try:
+            with open(self.path(content_hash, language), 'r', encoding='utf-8') as f:
+                pages = json.load(f)['pages']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, OSError):
+            return None
+        for page in pages:
+            page['starts'] = [start for start, _, _ in page['paragraphs']]
+        self.loaded.put(key, pages)
+        return pages
+
+    def lookup(self, content_hash: str, language: str, text: str,
+               page_hint: Optional[int] = None,
+               min_coverage: float = DEFAULT_MIN_COVERAGE) -> Optional[Dict[str, Any]]:
+        """
+        查詢選取範圍所在段落的預翻譯結果
+
+        選取範圍須完整落在單一段落內且佔該段落至少 min_coverage，
+        或恰好涵蓋連續的數個完整段落。
+
+        Args:
+            content_hash (str): PDF 內容雜湊
+            language (str): 目標語言代碼
+            text (str): 選取的文字
+            page_hint (Optional[int]): 前端回報的頁碼，優先搜尋該頁附近
+            min_coverage (float): 選取範圍佔段落長度的最低比例
+
+        Returns:
+            Optional[Dict[str, Any]]: {'translatedText', 'originalText', 'page', 'exact'}，
+                找不到時返回 None
+        """
+        pages = self._load(content_hash, language)
+        selection = normalize_text(text)
+        if not pages or not selection:
+            return None
+
+        order = list(range(len(pages)))
+        if page_hint is not None:
+            # 前端頁碼可能從 1 起算，先搜尋提示頁與前一頁
+            order.sort(key=lambda i: min(abs(pages[i]['page'] - page_hint),
+                                         abs(pages[i]['page'] - (page_hint - 1))))
+
+        for i in order:
+            page = pages[i]
+            position = page['text'].find(selection)
+            while position != -1:
+                match = self._match(page, position, position + len(selection), min_coverage)
+                if match is not None:
+                    return match
+                position = page['text'].find(selection, position + 1)
+        return None
+
+    def _match(self, page: Dict[str, Any], start: int, end: int,
+               min_coverage: float) -> Optional[Dict[str, Any]]:
+        paragraphs = page['paragraphs']
+        first = bisect.bisect_right(page['starts'], start) - 1
+        if first < 0:
+            return None
+        p_start, p_end, _ = paragraphs[first]
+
+        # 選取範圍在單一段落內（譯文為 None 的段落翻譯失敗，交由即時翻譯處理）
+        if end <= p_end:
+            if (end - start) / max(p_end - p_start, 1) < min_coverage:
+                return None
+            if paragraphs[first][2] is None:
+                return None
+            return {
+                'translatedText': paragraphs[first][2],
+                'originalText': page['text'][p_start:p_end],
+                'page': page['page'],
+                'exact': start == p_start and end == p_end
+            }
+
+        # 選取範圍涵蓋數個完整段落
+        if start != p_start:
+            return None
+        last = bisect.bisect_right(page['starts'], end - 1) - 1
+        if paragraphs[last][1] != end:
+            return None
+        if any(p[2] is None for p in paragraphs[first:last + 1]):
+            return None
+        return {
+            'translatedText': '\n\n'.join(p[2] for p in paragraphs[first:last + 1]),
+            'originalText': page['text'][p_start:end],
+            'page': page['page'],
+            'exact': True
+        }
+
+
+class PretranslationQueue:
+    """
+    上傳後在背景預先翻譯整份文件的工作佇列
+
+    逐頁切成段落後打包成不超過翻譯服務字元上限的請求，結果寫入
+    PretranslationStore，同時填入翻譯快取讓完全相同的選取直接命中。
+    """
+
+    def __init__(self, store: PretranslationStore, languages: Iterable[str],
+                 translator: TranslationChain = translation_chain,
+                 max_workers: int = 1):
+        """
+        Args:
+            store (PretranslationStore): 預翻譯結果儲存區
+            languages (Iterable[str]): 要預翻譯的語言代碼
+            translator (TranslationChain): 翻譯後端鏈
+            max_workers (int): 同時處理的文件數量
+        """
+        self.store = store
+        self.languages = [lang for lang in languages if lang in SUPPORTED_LANGUAGES]
+        self.translator = translator
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='pretranslate')
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, content_hash: str, pdf_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        送出預翻譯工作，已完成或進行中的文件不會重複處理
+
+        Args:
+            content_hash (str): PDF 內容雜湊
+            pdf_path (Optional[str]): 找不到已保存的頁面文字時用來重新擷取的 PDF 路徑
+
+        Returns:
+            Dict[str, Any]: 工作狀態
+        """
+        with self._lock:
+            job = self.jobs.get(content_hash)
+            if job is not None and job['status'] in ('queued', 'running'):
+                return self._snapshot(job)
+            languages = [lang for lang in self.languages
+                         if not self.store.has(content_hash, lang)]
+            job = {
+                'status': 'queued' if languages else 'completed',
+                'error': None,
+                'languages': {lang: {'status': 'pending' if lang in languages else 'completed'}
+                              for lang in self.languages}
+            }
+            self.jobs[content_hash] = job
+        if languages:
+            self.executor.submit(self._run, content_hash, pdf_path, languages)
+        return self.get(content_hash)
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """取得工作狀態，沒有工作時返回 None"""
+        with self._lock:
+            job = self.jobs.get(content_hash)
+            return self._snapshot(job) if job else None
+
+    def _snapshot(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {**job, 'languages': {lang: dict(info) for lang, info in job['languages'].items()}}
+
+    def _load_pages(self, content_hash: str, pdf_path: Optional[str]) -> List[Tuple[int, List[str]]]:
+        """取得每頁的段落，優先使用建立 index 時保存的頁面文字"""
+        page_texts = self.store.index_store.iter_page_texts(content_hash)
+        if page_texts is None:
+            if not pdf_path or not os.path.exists(pdf_path):
+                raise FileNotFoundError(f"No page texts for {content_hash[:12]}")
+            page_texts = ((doc.metadata['page'], doc.page_content)
+                          for doc in iter_pdf_pages(pdf_path))
+        return [(page_no, split_paragraphs(text)) for page_no, text in page_texts]
+
+    def _translate_document(self, content_hash: str, language: str,
+                            pages: List[Tuple[int, List[str]]]) -> int:
+        """
+        翻譯文件並寫入翻譯檔
+
+        單一批次失敗（例如翻譯後端全部熔斷）時，該批段落標記為缺少並繼續，
+        已翻譯的段落仍會寫入翻譯檔。
+
+        Returns:
+            int: 翻譯失敗的段落數量
+        """
+        job = self.jobs[content_hash]
+        paragraphs = [paragraph for _, page_paragraphs in pages for paragraph in page_paragraphs]
+        translated: List[Optional[str]] = []
+        for paragraph in paragraphs:
+            cached, _ = translation_cache.get(paragraph, language)
+            translated.append(cached)
+
+        # 只打包快取中沒有的段落
+        missing = [index for index, value in enumerate(translated) if value is None]
+        batches = pack_batches([paragraphs[index] for index in missing])
+        with self._lock:
+            job['languages'][language].update(
+                status='running', completed=0, total=len(batches))
+        failed = 0
+        last_error = None
+        for done, batch in enumerate(batches, start=1):
+            indexes = [missing[position] for position in batch]
+            try:
+                results, _ = self.translator.translate_segments(
+                    [paragraphs[index] for index in indexes], language)
+            except Exception as e:
+                failed += len(indexes)
+                last_error = str(e)
+                results = []
+            for index, result in zip(indexes, results):
+                translated[index] = result
+                translation_cache.put(paragraphs[index], language, result)
+            with self._lock:
+                job['languages'][language].update(completed=done, missing=failed)
+                if last_error is not None:
+                    job['languages'][language]['error'] = last_error
+
+        # 建立頁面文字與段落位移索引
+        records = []
+        position = 0
+        for page_no, page_paragraphs in pages:
+            offsets, text_parts, offset = [], [], 0
+            for paragraph in page_paragraphs:
+                offsets.append([offset, offset + len(paragraph), translated[position]])
+                text_parts.append(paragraph)
+                offset += len(paragraph) + 1
+                position += 1
+            records.append({'page': page_no, 'text': ' '.join(text_parts), 'paragraphs': offsets})
+        self.store.save(content_hash, language, records, missing=failed)
+        return failed
+
+    def _run(self, content_hash: str, pdf_path: Optional[str], languages: List[str]):
+        """在背景執行緒中翻譯各語言"""
+        job = self.jobs[content_hash]
+        start_time = time.time()
+        with self._lock:
+            job['status'] = 'running'
+        current = None
+        partial = []
+        try:
+            pages = self._load_pages(content_hash, pdf_path)
+            for current in languages:
+                failed = self._translate_document(content_hash, current, pages)
+                if failed:
+                    partial.append(current)
+                with self._lock:
+                    job['languages'][current]['status'] = 'partial' if failed else 'completed'
+            with self._lock:
+                # 部分完成的語言在下次送出同一文件時重試缺少的段落
+                job['status'] = 'partial' if partial else 'completed'
+            console.print(Panel(
+                f"[green]Pre-translated[/green] [yellow]{content_hash[:12]}[/yellow] "
+                f"into {', '.join(languages)} in {time.time() - start_time:.2f}s"
+                + (f"\n[yellow]Partial:[/yellow] {', '.join(partial)}" if partial else ""),
+                title="Pre-translation",
+                border_style="yellow" if partial else "green"
+            ))
+        except Exception as e:
+            with self._lock:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+                if current is not None:
+                    job['languages'][current]['status'] = 'failed'
+            console.print(Panel(
+                f"[red]Pre-translation failed for[/red] [yellow]{content_hash[:12]}[/yellow]\n"
+                f"[red]Error details:[/red] {str(e)}",
+                title="Pre-translation Error",
+                border_style="red"
+            ))
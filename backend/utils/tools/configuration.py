@@ -11,6 +11,33 @@ class Configuration:
     research_llm: str = "phi4"
     chat_with_picture: bool = False
     web_research: bool = False
+    faiss_cache_max_indexes: int = 8
+    faiss_cache_max_bytes: int = 512 * 1024 * 1024
+    # 向量搜索查詢來源："topic" 使用使用者問題（與其他分支並行），
+    # "summary" 使用研究摘要，"mixed" 使用問題加上摘要前段（兩者皆在研究結束後執行）
+    faiss_query_mode: str = "topic"
+    faiss_query_summary_chars: int = 500
+    faiss_ef_search: int = 64  # HNSW index 搜索寬度
+    faiss_nprobe: int = 8  # IVF index 搜索的分群數量
+    # 語意回答快取：相同文件與功能旗標下，問題向量餘弦相似度達門檻時直接返回先前的回答
+    answer_cache_enabled: bool = True
+    answer_cache_threshold: float = 0.92
+    answer_cache_max_entries: int = 256  # 每份文件（功能旗標組合）保留的回答數量
+    answer_cache_max_papers: int = 32
+    answer_cache_ttl: float = 24 * 60 * 60
+    # 檢索模式："chunks" 只使用向量搜索的原文段落；"hierarchical" 先使用建立 index 時產生的
+    # 論文摘要（概述與最相關章節的摘要），再只從這些章節的頁面取少量原文段落；
+    # 沒有摘要的文件與跨文件搜索仍使用原文段落
+    retrieval_mode: str = "hierarchical"
+    hierarchical_sections: int = 3  # 階層式檢索使用的章節摘要數量
+    hierarchical_chunks: int = 2  # 階層式檢索補充的原文段落數量，0 表示只使用摘要
+    # 最終總結提示中研究總結與檢索段落合計的 token 預算（估計值），總結最多使用其中的比例
+    context_token_budget: int = 3000
+    context_summary_share: float = 0.4
+    # Ollama 在最後一次請求後保留模型（與其提示 KV 快取）於記憶體中的時間，-1 表示永久保留
+    ollama_keep_alive: str = "30m"
+    # 啟動時以最終總結的固定系統提示預熱模型，讓第一個請求即可重用提示快取
+    ollama_warm_up: bool = True
 
     @classmethod
     def from_runnable_config(
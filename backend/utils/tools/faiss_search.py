@@ -1,23 +1,141 @@
+import heapq
+import itertools
 import os
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from langchain_community.vectorstores import FAISS
 from langchain_ollama import OllamaEmbeddings
 from rich.console import Console
 
+from ..ann_index import apply_search_params
+from ..embedding_cache import CachedEmbeddings, get_embedding_cache
+from ..index_store import IndexStore
+from ..lru_cache import LRUCache
+
 console = Console()
 
+# FAISS.save_local 寫出的檔案
+INDEX_FILES = ("index.faiss", "index.pkl")
+
 
 class FAISSSearchTool:
     """FAISS vector database search tool."""
 
-    def __init__(self, model_name: str = "mxbai-embed-large"):
+    def __init__(self, model_name: str = "mxbai-embed-large",
+                 max_cached_indexes: int = 8,
+                 max_cache_bytes: int = 512 * 1024 * 1024,
+                 max_search_workers: int = 8,
+                 ef_search: Optional[int] = 64,
+                 nprobe: Optional[int] = 8):
         """
         初始化 FAISS 搜索工具
 
         Args:
             model_name (str): Ollama embedding 模型名稱
+            max_cached_indexes (int): 記憶體中最多保留的 FAISS index 數量
+            max_cache_bytes (int): 已載入 FAISS index 的記憶體預算（位元組）
+            max_search_workers (int): 跨文件搜索時同時搜索的 index 數量
+            ef_search (Optional[int]): HNSW index 的搜索寬度（efSearch）
+            nprobe (Optional[int]): IVF index 搜索的分群數量
+        """
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        self.max_search_workers = max(1, max_search_workers)
+        # 查詢向量經由與 PDFEmbedder 共用的持久化快取計算
+        self.embeddings = CachedEmbeddings(
+            OllamaEmbeddings(model=model_name),
+            model_name,
+            get_embedding_cache()
+        )
+        self.index_store = IndexStore()
+        # 以 PDF 內容雜湊為鍵，值為 (vector store, 檔案簽章)
+        self.index_cache = LRUCache(
+            max_entries=max_cached_indexes,
+            max_bytes=max_cache_bytes
+        )
+
+    def _index_signature(self, index_path: str) -> Optional[Tuple]:
+        """
+        取得 index 檔案的簽章（mtime 與大小），用於判斷 index 是否被重寫
+
+        Returns:
+            Optional[Tuple]: 檔案簽章，檔案不存在時返回 None
+        """
+        try:
+            stats = [os.stat(os.path.join(index_path, name))
+                     for name in INDEX_FILES]
+        except FileNotFoundError:
+            return None
+        return tuple((stat.st_mtime_ns, stat.st_size) for stat in stats)
+
+    def _load_vector_store(self, content_hash: str, index_path: str) -> Optional[FAISS]:
+        """
+        從快取取得 vector store，若不存在或 index 已被 PDFEmbedder 重寫則重新載入
+
+        Args:
+            content_hash (str): PDF 內容雜湊
+            index_path (str): FAISS index 目錄
+
+        Returns:
+            Optional[FAISS]: 已載入的 vector store，index 不存在時返回 None
         """
-        self.embeddings = OllamaEmbeddings(model=model_name)
+        signature = self._index_signature(index_path)
+        if signature is None:
+            self.index_cache.pop(content_hash)
+            return None
+
+        cached = self.index_cache.get(content_hash)
+        if cached is not None and cached[1] == signature:
+            return cached[0]
+
+        # 加載 FAISS index，允許反序列化
+        db = FAISS.load_local(
+            folder_path=index_path,
+            embeddings=self.embeddings,
+            allow_dangerous_deserialization=True
+        )
+        apply_search_params(db.index, self.ef_search, self.nprobe)
+        # 以磁碟上的檔案大小估計載入後的記憶體用量
+        size = sum(file_size for _, file_size in signature)
+        self.index_cache.put(content_hash, (db, signature), size=size)
+        return db
+
+    def set_search_params(self, ef_search: Optional[int] = None,
+                          nprobe: Optional[int] = None):
+        """
+        調整 ANN 搜索參數，並套用到已載入的 index
+
+        Args:
+            ef_search (Optional[int]): HNSW 搜索寬度，None 表示不變
+            nprobe (Optional[int]): IVF 搜索的分群數量，None 表示不變
+        """
+        if ef_search is not None:
+            self.ef_search = ef_search
+        if nprobe is not None:
+            self.nprobe = nprobe
+        for db, _ in self.index_cache.values():
+            apply_search_params(db.index, self.ef_search, self.nprobe)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """返回 index 快取與 embedding 快取的統計資訊"""
+        return {
+            'faiss_index': self.index_cache.stats(),
+            'embedding': self.embeddings.cache.stats()
+        }
+
+    def invalidate(self, pdf_filename: Optional[str] = None):
+        """
+        使快取中的 index 失效
+
+        Args:
+            pdf_filename (Optional[str]): PDF 文件名稱，None 表示清空全部
+        """
+        if pdf_filename is None:
+            self.index_cache.clear()
+            return
+        content_hash = self.index_store.get_hash(pdf_filename)
+        if content_hash is not None:
+            self.index_cache.pop(content_hash)
 
     def search_similar_content(self, query: str, pdf_filename: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """
@@ -32,23 +150,18 @@ class FAISSSearchTool:
             List[Dict[str, Any]]: 搜索結果列表，每個結果包含內容和相似度分數
         """
         try:
-            # 獲取 FAISS index 路徑
-            base_name = os.path.splitext(pdf_filename)[0]
-            index_path = os.path.join("FAISS_index", base_name)
-
-            # 檢查 FAISS index 是否存在
-            if not os.path.exists(index_path):
+            # 透過 manifest 取得 PDF 內容雜湊與 FAISS index 路徑
+            content_hash = self.index_store.get_hash(pdf_filename)
+            db = None
+            if content_hash is not None:
+                # 從快取取得或加載 FAISS index
+                db = self._load_vector_store(
+                    content_hash, self.index_store.index_path(content_hash))
+            if db is None:
                 console.print(
                     f"[red]Error: FAISS index not found for {pdf_filename}[/red]")
                 return []
 
-            # 加載 FAISS index，允許反序列化
-            db = FAISS.load_local(
-                folder_path=index_path,
-                embeddings=self.embeddings,
-                allow_dangerous_deserialization=True
-            )
-
             # 執行相似度搜索
             results = db.similarity_search_with_score(query, k=top_k)
 
@@ -66,3 +179,66 @@ class FAISSSearchTool:
         except Exception as e:
             console.print(f"[red]Error searching FAISS index: {str(e)}[/red]")
             return []
+
+    def _search_shard(self, content_hash: str, pdf_names: List[str],
+                      query_vector: List[float], top_k: int) -> List[Dict[str, Any]]:
+        """搜索單一 PDF 的 index，結果依距離排序並附上來源資訊"""
+        db = self._load_vector_store(
+            content_hash, self.index_store.index_path(content_hash))
+        if db is None:
+            return []
+
+        formatted_results = []
+        for doc, score in db.similarity_search_with_score_by_vector(query_vector, k=top_k):
+            metadata = dict(doc.metadata)
+            metadata["pdf_filename"] = pdf_names[0]
+            metadata["pdf_filenames"] = pdf_names
+            metadata["content_hash"] = content_hash
+            formatted_results.append({
+                "content": doc.page_content,
+                "score": float(score),
+                "metadata": metadata
+            })
+        return formatted_results
+
+    def search_corpus(self, query: str, top_k: int = 5,
+                      pdf_filenames: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        跨多份 PDF 搜索與查詢相似的內容
+
+        查詢只嵌入一次，再並行搜索每份 PDF 的 index，最後以 heap 合併各自排序好的結果。
+        新增 PDF 只需建立該 PDF 的 index，不需重建其他 index。
+
+        Args:
+            query (str): 搜索查詢文本
+            top_k (int): 返回的最相似結果數量
+            pdf_filenames (Optional[List[str]]): 限定搜索的 PDF 文件，None 表示整個資料庫
+
+        Returns:
+            List[Dict[str, Any]]: 搜索結果列表，metadata 包含來源 PDF（pdf_filename）與頁碼（page）
+        """
+        try:
+            shards = self.index_store.names_by_hash()
+            if pdf_filenames is not None:
+                wanted = {os.path.basename(name) for name in pdf_filenames}
+                shards = {content_hash: names for content_hash, names in shards.items()
+                          if wanted.intersection(names)}
+            if not shards:
+                console.print("[yellow]No FAISS indexes available for corpus search[/yellow]")
+                return []
+
+            query_vector = self.embeddings.embed_query(query)
+
+            with ThreadPoolExecutor(max_workers=min(self.max_search_workers, len(shards))) as executor:
+                shard_results = list(executor.map(
+                    lambda item: self._search_shard(item[0], item[1], query_vector, top_k),
+                    shards.items()
+                ))
+
+            # 各 index 的結果已依 L2 距離遞增排序，以 heap 合併取前 top_k 個
+            merged = heapq.merge(*shard_results, key=lambda result: result["score"])
+            return list(itertools.islice(merged, top_k))
+
+        except Exception as e:
+            console.print(f"[red]Error searching FAISS corpus: {str(e)}[/red]")
+            return []
@@ -1,16 +1,16 @@
-query_writer_instructions = """Your goal is to generate targeted web search query.
+# 各提示詞皆為固定文字，動態內容（主題、摘要、檢索結果）一律放在其後的使用者訊息中，
+# 使每次呼叫的系統提示前綴完全相同，Ollama 可重用已計算的 KV 快取
 
-The query will gather information related to a specific topic.
+query_writer_instructions = """Your goal is to generate targeted web search query.
 
-Topic:
-{research_topic}
+The query will gather information related to the topic given in the user message.
 
 Return your query as a JSON object:
-{{
+{
     "query": "string",
-    "aspect": "string", 
+    "aspect": "string",
     "rationale": "string"
-}}
+}
 """
 
 summarizer_instructions = """Your goal is to generate a high-quality summary of the web search results.
@@ -43,7 +43,7 @@ CRITICAL REQUIREMENTS:
 - Begin directly with the summary text without any tags, prefixes, or meta-commentary
 """
 
-reflection_instructions = """You are an expert research assistant analyzing a summary about {research_topic}.
+reflection_instructions = """You are an expert research assistant analyzing a research summary about the topic given in the user message.
 
 Your tasks:
 1. Identify knowledge gaps or areas that need deeper exploration
@@ -53,10 +53,10 @@ Your tasks:
 Ensure the follow-up question is self-contained and includes necessary context for web search.
 
 Return your analysis as a JSON object:
-{{ 
+{
     "knowledge_gap": "string",
     "follow_up_query": "string"
-}}"""
+}"""
 
 final_summarize_instructions = """Your goal is to generate a high-quality summary of the web search results and Vector Database information.
 
@@ -102,3 +102,70 @@ CRITICAL REQUIREMENTS:
   * Never mix Simplified Chinese characters in the output
   * Maintain formal and technical writing style in Traditional Chinese
 """
+
+# 最終總結的數學公式與語言規範（原本分散在第二個系統訊息與使用者訊息中）
+final_format_rules = """您必須嚴格遵守以下數學公式格式規則：
+
+1. 行內數學公式的規定：
+   - 必須且只能使用單個 $ 符號作為分隔符
+   - 嚴禁使用 \\( \\) 或 \\[ \\] 等其他分隔符
+   - 分隔符前後必須有空格
+   - 範例：
+     * 正確：矩陣 $ K $ 的轉置記為 $ K^T $
+     * 正確：向量 $ v $ 的長度為 $ \\|v\\| $
+     * 正確：當 $ n \\to \\infty $ 時函數值為 $ f(x) $
+     * 錯誤：\\(K\\) 和 \\(v\\) 的乘積（使用了錯誤的分隔符）
+     * 錯誤：矩陣$K$的值（分隔符前後沒有空格）
+
+2. 獨立數學公式的規定：
+   - 必須使用雙 $$ 符號
+   - 分隔符前後必須有空格
+   - 範例：
+     $$ \\frac{d}{dx}f(x) = \\lim_{h \\to 0}\\frac{f(x+h)-f(x)}{h} $$
+     $$ \\int_{0}^{\\infty} e^{-x} dx = 1 $$
+
+3. 數學符號使用規則：
+   - 所有數學符號和表達式都必須使用 LaTeX 語法，並以 $ 或 $$ 作為分隔符
+   - 範例：
+     * 矩陣乘法：$ A_{ij} = \\sum_{k=1}^n B_{ik}C_{kj} $
+     * 向量內積：$ \\langle u, v \\rangle = u^T v $
+     * 概率表達式：$ P(X \\leq x) = \\int_{-\\infty}^x f(t)dt $
+
+4. 語言與寫作要求：
+   - 必須使用繁體中文輸出
+   - 技術術語可以附上英文原文
+   - 保持專業和學術性的寫作風格
+   - 確保內容的連貫性和完整性"""
+
+# 最終總結的完整系統提示，所有請求共用同一份文字
+final_summary_system_prompt = (
+    final_summarize_instructions
+    + "\n"
+    + final_format_rules
+    + "\n\n使用者訊息依序提供研究主題、當前總結內容與向量資料庫相關內容，"
+    "請據此以繁體中文生成最終總結報告。"
+)
+
+section_digest_instructions = """You are an expert research assistant writing a digest of one section of an academic paper.
+
+The user message starts with the section title followed by the section text.
+Summarize the section text so that a reader can answer questions about it without the full text.
+- Keep the summary factual and dense (at most {max_words} words)
+- Preserve the key definitions, methods, results and numbers
+- List the most important equations in LaTeX, enclosed in single "$"
+
+Return your digest as a JSON object:
+{{
+    "summary": "string",
+    "key_equations": ["string"]
+}}"""
+
+paper_overview_instructions = """You are an expert research assistant.
+
+The user message lists the section summaries of an academic paper.
+Write an overview of the whole paper (at most {max_words} words) covering its problem, approach, main results and limitations.
+
+Return your overview as a JSON object:
+{{
+    "overview": "string"
+}}"""
@@ -17,6 +17,7 @@ class SummaryState:
     enable_web_research: bool = field(default=False)  # Web research flag
     enable_chat_with_picture: bool = field(default=False)  # Image chat flag
     pdf_filename: str = field(default=None)  # PDF filename for FAISS search
+    search_corpus: bool = field(default=False)  # Search across all indexed PDFs
     faiss_results: Annotated[list, operator.add] = field(
         default_factory=list)  # Results from FAISS search
 
@@ -28,6 +29,7 @@ class SummaryStateInput(TypedDict):
     enable_chat_with_picture: bool = field(default=False)  # Image chat flag
     base64_image: str = field(default=None)  # Base64 encoded image if any
     pdf_filename: str = field(default=None)  # PDF filename for FAISS search
+    search_corpus: bool = field(default=False)  # Search across all indexed PDFs
 
 
 @dataclass(kw_only=True)
@@ -25,12 +25,10 @@ class WebSearchTool:
     def generate_query(self, research_topic: str, query_writer_instructions: str) -> Dict[str, Any]:
         """Generate a search query based on the research topic"""
         try:
-            query_prompt = query_writer_instructions.format(
-                research_topic=research_topic
-            )
+            # 系統提示保持固定，主題放在使用者訊息中以重用 Ollama 的提示快取
             result = self.llm_json.invoke([
-                SystemMessage(content=query_prompt),
-                HumanMessage(content="Generate a query for web search:")
+                SystemMessage(content=query_writer_instructions),
+                HumanMessage(content=f"Topic:\n{research_topic}\n\nGenerate a query for web search:")
             ])
 
             query_data = json.loads(result.content)
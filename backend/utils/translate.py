@@ -1,10 +1,12 @@
-from deep_translator import GoogleTranslator
 import os
-import time
+from typing import Optional, Tuple
 from rich.console import Console
 from rich.traceback import install
+from .translation_cache import TranslationCache
+from .translation_backends import TranslationUnavailableError, build_translation_chain
 
-# TODO: Fix the issue that the translate func is not working inside docker container.
+# GoogleTranslator 在無法連線外部服務的容器中無法使用，此時由 TRANSLATION_BACKENDS 中的
+# ollama 後端改用本地模型翻譯。
 
 # 安装 rich 的異常處理器
 install(show_locals=True)
@@ -22,9 +24,52 @@ SUPPORTED_LANGUAGES = {
 }
 
 
+# 翻譯結果快取（記憶體 LRU+TTL，加上選用的磁碟快取）
+translation_cache = TranslationCache()
+
+# 依優先順序排列的翻譯後端，前面的後端失敗時改用下一個（例如離線環境無法使用 Google）
+translation_chain = build_translation_chain(
+    os.getenv('TRANSLATION_BACKENDS', 'google,ollama'),
+    failure_threshold=int(os.getenv('GOOGLETRANS_RETRY', 3)),
+    base_backoff=float(os.getenv('GOOGLETRANS_TIMEOUT', 5)),
+    max_backoff=float(os.getenv('TRANSLATION_MAX_BACKOFF', 300))
+)
+
+
 class TranslationError(Exception):
     """翻譯相關的基礎異常"""
-    pass
+
+    def __init__(self, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message)
+        # 服務暫時不可用時，建議用戶端重試前等待的秒數
+        self.retry_after = retry_after
+
+
+def translate_text_cached(text: str, target_language: str = 'zh-TW') -> Tuple[str, Optional[str]]:
+    """
+    翻譯文本到目標語言，相同文本與目標語言的結果直接由快取返回
+
+    Args:
+        text (str): 要翻譯的文本
+        target_language (str): 目標語言代碼 (預設: 'zh-TW' 繁體中文)
+
+    Returns:
+        Tuple[str, Optional[str]]: (翻譯後的文本, 命中的快取層級 'memory' 或 'disk'，未命中為 None)
+
+    Raises:
+        TranslationError: 翻譯失敗時拋出
+        ValueError: 輸入參數無效時拋出
+    """
+    if target_language not in SUPPORTED_LANGUAGES:
+        raise ValueError(f"不支援的目標語言：{target_language}")
+
+    translated_text, cache_tier = translation_cache.get(text, target_language)
+    if translated_text is not None:
+        return translated_text, cache_tier
+
+    translated_text = translate_text(text, target_language)
+    translation_cache.put(text, target_language, translated_text)
+    return translated_text, None
 
 
 def translate_text(text: str, target_language: str = 'zh-TW') -> str:
@@ -50,51 +95,27 @@ def translate_text(text: str, target_language: str = 'zh-TW') -> str:
         # 取得目標語言代碼
         target = SUPPORTED_LANGUAGES[target_language]
 
-        # 從環境變量中獲取重試次數和等待時間
-        retry_count = int(os.getenv('GOOGLETRANS_RETRY', 3))
-        wait_time = int(os.getenv('GOOGLETRANS_TIMEOUT', 5))
-
-        # 嘗試翻譯，如果失敗則重試
-        last_error = None
-        for attempt in range(retry_count):
-            try:
-                # 創建翻譯器實例
-                translator = GoogleTranslator(source='auto', target=target)
-
-                # 進行翻譯
-                translated_text = translator.translate(text)
-
-                # 驗證翻譯結果
-                if not translated_text:
-                    raise TranslationError("翻譯服務返回空結果")
-
-                translated_text = translated_text.strip()
-                if not translated_text:
-                    raise TranslationError("翻譯結果為空")
-
-                # 檢查翻譯結果是否有效
-                source_text = text.strip().lower()
-                if translated_text.lower() == source_text:
-                    raise TranslationError("翻譯結果與原文相同，可能是服務暫時不可用")
-
-                console.print(f"[green]翻譯嘗試 {attempt + 1} 成功[/green]")
-                return translated_text
-
-            except Exception as e:
-                last_error = e
-                if attempt < retry_count - 1:
-                    console.print(
-                        f"[yellow]翻譯嘗試 {attempt + 1} 失敗: {str(e)}[/yellow]")
-                    console.print(f"[blue]等待 {wait_time} 秒後重試...[/blue]")
-                    time.sleep(wait_time)
-                    wait_time *= 2  # 指數退避策略
-                continue
-
-        # 如果所有重試都失敗了
-        error_msg = f"翻譯在 {retry_count} 次嘗試後失敗"
-        console.print(f"[red]{error_msg}[/red]")
-        console.print(f"[red]最後一次錯誤：{str(last_error)}[/red]")
-        raise TranslationError(error_msg)
+        # 請求執行緒中不重試也不等待：斷路器開啟的後端直接略過，
+        # 恢復與否由背景探測以加上抖動的指數退避決定
+        try:
+            translated_text, backend_name = translation_chain.translate(
+                text, target)
+        except TranslationUnavailableError as e:
+            raise TranslationError(
+                f"翻譯服務暫時不可用：{str(e)}", retry_after=e.retry_after) from e
+
+        # 驗證翻譯結果
+        translated_text = (translated_text or '').strip()
+        if not translated_text:
+            raise TranslationError("翻譯服務返回空結果")
+
+        # 檢查翻譯結果是否有效
+        source_text = text.strip().lower()
+        if translated_text.lower() == source_text:
+            raise TranslationError("翻譯結果與原文相同，可能是服務暫時不可用")
+
+        console.print(f"[green]翻譯成功（{backend_name}）[/green]")
+        return translated_text
 
     except ValueError as ve:
         console.print(f"[red]輸入驗證錯誤：{str(ve)}[/red]")
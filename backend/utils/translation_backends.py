@@ -0,0 +1,293 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from deep_translator import GoogleTranslator
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_ollama import ChatOllama
+
+from .circuit_breaker import CircuitBreaker
+from .tools.configuration import Configuration
+
+# 打包多個片段時使用的分隔符號，翻譯後依此拆回各片段
+SEGMENT_SEPARATOR = "\n\n"
+SEGMENT_BREAK = re.compile(r'\n\s*\n')
+
+# 提示詞中使用的語言名稱
+LANGUAGE_NAMES = {
+    'zh-TW': 'Traditional Chinese (Taiwan)',
+    'zh-CN': 'Simplified Chinese',
+    'en': 'English',
+    'ja': 'Japanese',
+    'ko': 'Korean',
+}
+
+OLLAMA_TRANSLATION_INSTRUCTIONS = """You are a professional translator of academic papers.
+Translate every segment of the JSON object in the user message into {language}.
+Keep formulas, symbols, citations, numbers and proper nouns unchanged.
+Respond with a JSON object that has exactly the same keys as the input, each mapped to the translation of that segment.
+Do not merge, split, omit or explain segments."""
+
+# 斷路器探測服務是否恢復時翻譯的文字
+PROBE_TEXT = "Hello"
+
+
+class TranslationBackendError(Exception):
+    """翻譯後端無法完成翻譯"""
+    pass
+
+
+class TranslationUnavailableError(TranslationBackendError):
+    """所有翻譯後端都無法使用（斷路器開啟或呼叫失敗）"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TranslationBackend:
+    """
+    翻譯後端介面
+
+    子類別實作 translate()；translate_segments() 預設逐段呼叫 translate()，
+    能以單次請求翻譯多個片段的後端應覆寫它。
+    """
+
+    name = "base"
+
+    def translate(self, text: str, target_language: str) -> str:
+        raise NotImplementedError
+
+    def translate_segments(self, segments: Sequence[str], target_language: str) -> List[str]:
+        return [self.translate(segment, target_language) for segment in segments]
+
+
+class GoogleTranslationBackend(TranslationBackend):
+    """透過 deep_translator 的 GoogleTranslator 翻譯（需要網路連線）"""
+
+    name = "google"
+
+    def translate(self, text: str, target_language: str) -> str:
+        # 失敗時直接拋出，不在請求執行緒中重試；由 TranslationChain 改用下一個後端，
+        # 並由熔斷器的背景探測決定何時恢復
+        translated = GoogleTranslator(source='auto', target=target_language).translate(text)
+        # 結果與原文相同時不視為錯誤（例如英文論文翻成英文）
+        return (translated or '').strip() or text
+
+    def translate_segments(self, segments: Sequence[str], target_language: str) -> List[str]:
+        """以空行連接片段成單次請求，無法依空行拆回時改為逐段翻譯"""
+        if len(segments) > 1:
+            parts = [part.strip() for part in SEGMENT_BREAK.split(
+                self.translate(SEGMENT_SEPARATOR.join(segments), target_language))]
+            if len(parts) == len(segments):
+                return parts
+        return [self.translate(segment, target_language) for segment in segments]
+
+
+class OllamaTranslationBackend(TranslationBackend):
+    """
+    以本地 Ollama 模型翻譯，可在無法連線外部服務的環境使用
+
+    多個片段以編號的 JSON 物件放入同一個提示詞，模型以 JSON 模式、temperature 0
+    與固定 seed 回應，輸出依編號解析；缺少編號時改為逐段翻譯。
+    """
+
+    name = "ollama"
+
+    def __init__(self, model: Optional[str] = None, seed: int = 0):
+        """
+        Args:
+            model (Optional[str]): Ollama 模型名稱，預設為 TRANSLATION_OLLAMA_MODEL 或研究用模型
+            seed (int): 取樣種子，使相同輸入得到相同輸出
+        """
+        self.model = model or os.getenv('TRANSLATION_OLLAMA_MODEL') or Configuration().research_llm
+        self.llm = ChatOllama(model=self.model, format="json", temperature=0, seed=seed,
+                              keep_alive=Configuration().ollama_keep_alive)
+
+    def _translate_numbered(self, segments: Sequence[str], target_language: str) -> Dict[str, str]:
+        numbered = {str(number): segment for number, segment in enumerate(segments, start=1)}
+        response = self.llm.invoke([
+            SystemMessage(content=OLLAMA_TRANSLATION_INSTRUCTIONS.format(
+                language=LANGUAGE_NAMES.get(target_language, target_language))),
+            HumanMessage(content=json.dumps(numbered, ensure_ascii=False))
+        ])
+        try:
+            parsed = json.loads(response.content)
+        except json.JSONDecodeError as e:
+            raise TranslationBackendError(f"Ollama 回應不是有效的 JSON：{e}") from e
+        if not isinstance(parsed, dict):
+            raise TranslationBackendError("Ollama 回應不是 JSON 物件")
+        return {key: value.strip() for key, value in parsed.items()
+                if key in numbered and isinstance(value, str) and value.strip()}
+
+    def translate(self, text: str, target_language: str) -> str:
+        translated = self._translate_numbered([text], target_language)
+        if '1' not in translated:
+            raise TranslationBackendError("Ollama 回應缺少翻譯結果")
+        return translated['1']
+
+    def translate_segments(self, segments: Sequence[str], target_language: str) -> List[str]:
+        translated = self._translate_numbered(segments, target_language)
+        return [translated.get(str(number)) or self.translate(segment, target_language)
+                for number, segment in enumerate(segments, start=1)]
+
+
+class TranslationChain:
+    """
+    依序嘗試多個翻譯後端，並記錄每個後端的延遲與失敗次數
+
+    每個後端各有一個斷路器：連續失敗的後端會被直接略過，由背景探測決定何時恢復。
+    前面的後端失敗或被略過時改用下一個，全部無法使用時拋出 TranslationUnavailableError。
+    """
+
+    def __init__(self, backends: Sequence[TranslationBackend],
+                 failure_threshold: int = 3, base_backoff: float = 5.0,
+                 max_backoff: float = 300.0):
+        """
+        Args:
+            backends (Sequence[TranslationBackend]): 依優先順序排列的翻譯後端
+            failure_threshold (int): 斷路器開啟所需的連續失敗次數
+            base_backoff (float): 斷路器第一次探測前的等待秒數
+            max_backoff (float): 斷路器探測間隔的上限秒數
+        """
+        if not backends:
+            raise ValueError("At least one translation backend is required")
+        self.backends = list(backends)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {
+            backend.name: {'calls': 0, 'failures': 0, 'rejected': 0, 'segments': 0,
+                           'total_ms': 0.0, 'max_ms': 0.0, 'last_error': None}
+            for backend in self.backends
+        }
+        self.breakers: Dict[str, CircuitBreaker] = {
+            backend.name: CircuitBreaker(
+                f"翻譯後端 {backend.name}",
+                probe=lambda backend=backend: backend.translate(PROBE_TEXT, 'zh-TW'),
+                failure_threshold=failure_threshold,
+                base_backoff=base_backoff,
+                max_backoff=max_backoff
+            )
+            for backend in self.backends
+        }
+
+    def _record(self, backend: TranslationBackend, elapsed: float, segments: int,
+                error: Optional[Exception] = None):
+        with self._lock:
+            stats = self._stats[backend.name]
+            stats['calls'] += 1
+            stats['segments'] += segments
+            stats['total_ms'] += elapsed * 1000
+            stats['max_ms'] = max(stats['max_ms'], elapsed * 1000)
+            if error is not None:
+                stats['failures'] += 1
+                stats['last_error'] = str(error)
+
+    def _call(self, method: str, payload: Any, target_language: str,
+              segments: int) -> Tuple[Any, str]:
+        last_error: Optional[Exception] = None
+        for backend in self.backends:
+            breaker = self.breakers[backend.name]
+            if not breaker.allow():
+                # 斷路器開啟中，不等待逾時直接改用下一個後端
+                with self._lock:
+                    self._stats[backend.name]['rejected'] += 1
+                continue
+            start = time.perf_counter()
+            try:
+                result = getattr(backend, method)(payload, target_language)
+            except Exception as e:
+                self._record(backend, time.perf_counter() - start, segments, e)
+                breaker.record_failure(e)
+                last_error = e
+                continue
+            self._record(backend, time.perf_counter() - start, segments)
+            breaker.record_success()
+            return result, backend.name
+
+        retry_after = min((value for value in (breaker.retry_after()
+                                               for breaker in self.breakers.values())
+                           if value is not None), default=None)
+        if last_error is None:
+            raise TranslationUnavailableError("所有翻譯後端的斷路器皆已開啟", retry_after)
+        raise TranslationUnavailableError(
+            f"所有翻譯後端皆失敗：{last_error}", retry_after) from last_error
+
+    def translate(self, text: str, target_language: str) -> Tuple[str, str]:
+        """
+        翻譯單一文本
+
+        Returns:
+            Tuple[str, str]: (譯文, 完成翻譯的後端名稱)
+        """
+        return self._call('translate', text, target_language, 1)
+
+    def translate_segments(self, segments: Sequence[str],
+                           target_language: str) -> Tuple[List[str], str]:
+        """
+        以單次請求翻譯多個片段
+
+        Returns:
+            Tuple[List[str], str]: (與 segments 順序相同的譯文, 完成翻譯的後端名稱)
+        """
+        return self._call('translate_segments', list(segments), target_language, len(segments))
+
+    def health(self) -> Dict[str, Any]:
+        """
+        返回各後端的斷路器狀態與呼叫統計
+
+        Returns:
+            Dict[str, Any]: status 為 healthy（所有後端可用）、degraded（部分可用）
+                或 unavailable（全部不可用），以及各後端的狀態
+        """
+        stats = self.stats()
+        backends = {name: {**breaker.snapshot(), 'stats': stats[name]}
+                    for name, breaker in self.breakers.items()}
+        closed = sum(1 for info in backends.values() if info['state'] == CircuitBreaker.CLOSED)
+        if closed == len(backends):
+            status = 'healthy'
+        elif closed:
+            status = 'degraded'
+        else:
+            status = 'unavailable'
+        return {'status': status, 'backends': backends}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """返回各後端的呼叫次數、失敗次數與延遲統計（毫秒）"""
+        with self._lock:
+            return {
+                name: {**stats, 'avg_ms': stats['total_ms'] / stats['calls'] if stats['calls'] else 0.0}
+                for name, stats in self._stats.items()
+            }
+
+
+TRANSLATION_BACKENDS = {
+    GoogleTranslationBackend.name: GoogleTranslationBackend,
+    OllamaTranslationBackend.name: OllamaTranslationBackend,
+}
+
+
+def build_translation_chain(names: str, **breaker_options) -> TranslationChain:
+    """
+    依逗號分隔的後端名稱建立翻譯後端鏈，例如 "google,ollama"
+
+    Args:
+        names (str): 依優先順序排列的後端名稱
+        **breaker_options: 傳給 TranslationChain 的斷路器設定
+
+    Returns:
+        TranslationChain: 翻譯後端鏈
+
+    Raises:
+        ValueError: 後端名稱不支援或未指定任何後端時拋出
+    """
+    backends = []
+    for name in (part.strip().lower() for part in names.split(',')):
+        if not name:
+            continue
+        if name not in TRANSLATION_BACKENDS:
+            raise ValueError(f"Unsupported translation backend: {name}")
+        backends.append(TRANSLATION_BACKENDS[name]())
+    return TranslationChain(backends, **breaker_options)
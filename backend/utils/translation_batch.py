@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .translate import translation_cache
+from .translation_backends import SEGMENT_BREAK, SEGMENT_SEPARATOR, TranslationChain
+
+# 翻譯服務單次請求的字元上限（GoogleTranslator 為 5000，保留一些餘裕）
+MAX_REQUEST_CHARS = 4500
+
+
+def pack_batches(segments: List[str], limit: int = MAX_REQUEST_CHARS) -> List[List[int]]:
+    """
+    將片段依序打包成不超過字元上限的批次
+
+    本身含有空行的片段無法在翻譯後依分隔符號拆回，會單獨成為一個批次。
+
+    Args:
+        segments (List[str]): 片段列表
+        limit (int): 單次請求的字元上限
+
+    Returns:
+        List[List[int]]: 每個批次包含的片段索引
+    """
+    batches: List[List[int]] = []
+    size = 0
+    packable = False
+    for index, segment in enumerate(segments):
+        solo = SEGMENT_BREAK.search(segment) is not None
+        if (batches and packable and not solo
+                and size + len(SEGMENT_SEPARATOR) + len(segment) <= limit):
+            batches[-1].append(index)
+            size += len(SEGMENT_SEPARATOR) + len(segment)
+        else:
+            batches.append([index])
+            size = len(segment)
+            packable = not solo
+    return batches
+
+
+def translate_segments(segments: List[str], target_language: str,
+                       translator: TranslationChain,
+                       max_workers: int = 4,
+                       limit: int = MAX_REQUEST_CHARS) -> Dict[str, Any]:
+    """
+    翻譯多個片段：先查詢翻譯快取，其餘打包成最少的請求並以有上限的執行緒池同時翻譯
+
+    打包的請求失敗時，該批次會逐段重試，只有仍然失敗的片段標記錯誤，
+    不會讓整批翻譯失敗。
+
+    Args:
+        segments (List[str]): 要翻譯的片段
+        target_language (str): 目標語言代碼
+        translator (TranslationChain): 翻譯後端鏈
+        max_workers (int): 同時進行的請求數量上限
+        limit (int): 單次請求的字元上限
+
+    Returns:
+        Dict[str, Any]: {'results': 每個片段的 {'index', 'translatedText', 'cached', 'error'}，
+            'requests': 打包後的請求數量}
+    """
+    results: List[Dict[str, Any]] = []
+    missing: List[int] = []
+    for index, segment in enumerate(segments):
+        result = {'index': index, 'translatedText': None, 'cached': False, 'error': None}
+        if not segment or not segment.strip():
+            result['error'] = '片段為空'
+        elif len(segment) > limit:
+            result['error'] = f'片段長度超過限制（最大{limit}字符）'
+        else:
+            cached, _ = translation_cache.get(segment, target_language)
+            if cached is not None:
+                result.update(translatedText=cached, cached=True)
+            else:
+                missing.append(index)
+        results.append(result)
+
+    batches = [[missing[position] for position in batch]
+               for batch in pack_batches([segments[index] for index in missing], limit)]
+
+    def run_batch(indexes: List[int]) -> Dict[int, Dict[str, Optional[str]]]:
+        texts = [segments[index] for index in indexes]
+        try:
+            translated, _ = translator.translate_segments(texts, target_language)
+            return {index: {'translatedText': text} for index, text in zip(indexes, translated)}
+        except Exception:
+            if len(indexes) == 1:
+                raise
+        # 打包的請求失敗時逐段重試，找出真正失敗的片段
+        outcome = {}
+        for index in indexes:
+            try:
+                outcome[index] = {'translatedText': translator.translate(
+                    segments[index], target_language)[0]}
+            except Exception as e:
+                outcome[index] = {'error': str(e)}
+        return outcome
+
+    if batches:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+            futures = [(indexes, executor.submit(run_batch, indexes)) for indexes in batches]
+            for indexes, future in futures:
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = {index: {'error': str(e)} for index in indexes}
+                for index, value in outcome.items():
+                    results[index].update(value)
+                    if value.get('translatedText') is not None:
+                        translation_cache.put(segments[index], target_language,
+                                              value['translatedText'])
+
+    return {'results': results, 'requests': len(batches)}
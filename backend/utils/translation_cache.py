@@ -0,0 +1,128 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from .embedding_cache import text_key
+from .lru_cache import LRUCache
+
+# 預設的磁碟快取路徑，設為空字串時停用磁碟快取
+DEFAULT_TRANSLATION_CACHE_PATH = os.getenv(
+    'TRANSLATION_CACHE_PATH', os.path.join('cache', 'translations.sqlite3'))
+# 記憶體快取的最大項目數量
+DEFAULT_TRANSLATION_CACHE_SIZE = int(os.getenv('TRANSLATION_CACHE_SIZE', 2000))
+# 翻譯結果的存活秒數（預設 7 天）
+DEFAULT_TRANSLATION_CACHE_TTL = float(
+    os.getenv('TRANSLATION_CACHE_TTL', 7 * 24 * 60 * 60))
+
+
+class TranslationCache:
+    """
+    翻譯結果快取
+
+    以 (正規化文本雜湊, 目標語言) 為鍵。第一層是記憶體中的 LRU+TTL 快取，
+    第二層是選用的 SQLite 磁碟快取，重新啟動後仍可命中；磁碟命中的結果會回填記憶體快取。
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_TRANSLATION_CACHE_SIZE,
+                 ttl: Optional[float] = DEFAULT_TRANSLATION_CACHE_TTL,
+                 disk_path: Optional[str] = DEFAULT_TRANSLATION_CACHE_PATH):
+        """
+        初始化翻譯快取
+
+        Args:
+            max_entries (int): 記憶體快取的最大項目數量
+            ttl (Optional[float]): 翻譯結果的存活秒數，None 表示不過期
+            disk_path (Optional[str]): SQLite 資料庫路徑，None 或空字串表示停用磁碟快取
+        """
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.disk_hits = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if disk_path:
+            directory = os.path.dirname(disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(disk_path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS translations ('
+                ' key TEXT NOT NULL,'
+                ' target TEXT NOT NULL,'
+                ' translated TEXT NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' PRIMARY KEY (key, target))')
+            # 啟動時清除已過期的結果
+            if ttl is not None:
+                self._conn.execute(
+                    'DELETE FROM translations WHERE created_at < ?', (time.time() - ttl,))
+            self._conn.commit()
+
+    def get(self, text: str, target_language: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        查詢翻譯結果
+
+        Args:
+            text (str): 原文
+            target_language (str): 目標語言代碼
+
+        Returns:
+            Tuple[Optional[str], Optional[str]]: (翻譯結果, 命中層級 'memory' 或 'disk')，
+                未命中時皆為 None
+        """
+        key = (text_key(text), target_language)
+        translated = self.memory.get(key)
+        if translated is not None:
+            return translated, 'memory'
+        if self._conn is None:
+            return None, None
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT translated, created_at FROM translations WHERE key = ? AND target = ?',
+                key).fetchone()
+        if row is None:
+            return None, None
+        translated, created_at = row
+        if self.ttl is not None and created_at + self.ttl <= time.time():
+            with self._lock:
+                self._conn.execute(
+                    'DELETE FROM translations WHERE key = ? AND target = ?', key)
+                self._conn.commit()
+            return None, None
+
+        self.disk_hits += 1
+        self.memory.put(key, translated)
+        return translated, 'disk'
+
+    def put(self, text: str, target_language: str, translated: str):
+        """
+        寫入翻譯結果（同時寫入記憶體與磁碟快取）
+
+        Args:
+            text (str): 原文
+            target_language (str): 目標語言代碼
+            translated (str): 翻譯結果
+        """
+        key = (text_key(text), target_language)
+        self.memory.put(key, translated)
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO translations (key, target, translated, created_at) '
+                'VALUES (?, ?, ?, ?)', (*key, translated, time.time()))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        """返回快取的統計資訊"""
+        stats = {'memory': self.memory.stats(), 'disk_hits': self.disk_hits,
+                 'disk_entries': None}
+        if self._conn is not None:
+            with self._lock:
+                stats['disk_entries'] = self._conn.execute(
+                    'SELECT COUNT(*) FROM translations').fetchone()[0]
+        return stats
@@ -9,6 +9,45 @@ import CustomPopup from '../utils/popup-utils';
 import 'react-pdf/dist/Page/AnnotationLayer.css';
 import 'react-pdf/dist/Page/TextLayer.css';
 
+// Interval between ingestion job status checks
+const JOB_POLL_INTERVAL_MS = 1000;
+// Give up waiting for an ingestion job after this long
+const JOB_POLL_TIMEOUT_MS = 15 * 60 * 1000;
+
+interface IngestionJobStatus {
+  jobId: string;
+  status: 'queued' | 'running' | 'completed' | 'failed';
+  error: string | null;
+}
+
+type IngestionWaitResult =
+  | { outcome: 'finished'; job: IngestionJobStatus }
+  // The backend no longer knows the job (restarted or trimmed its job records)
+  | { outcome: 'missing' }
+  | { outcome: 'timeout' };
+
+// Poll the backend until the ingestion job leaves the queued/running state,
+// the job disappears, or JOB_POLL_TIMEOUT_MS has passed
+const waitForIngestionJob = async (jobId: string): Promise<IngestionWaitResult> => {
+  const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    try {
+      const response = await axios.get<IngestionJobStatus>(`http://localhost:9999/jobs/${jobId}`);
+      if (response.data.status === 'completed' || response.data.status === 'failed') {
+        return { outcome: 'finished', job: response.data };
+      }
+    } catch (error) {
+      if (axios.isAxiosError(error) && error.response?.status === 404) {
+        return { outcome: 'missing' };
+      }
+      // Connection errors while the backend restarts are retried until the deadline
+      console.error('Error polling ingestion job:', error);
+    }
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+  return { outcome: 'timeout' };
+};
+
 interface PDFHandlerProps {
   onFileLoaded?: (file: File) => void;
   isCapturing?: boolean;
@@ -150,6 +189,23 @@ const PDFHandler: React.FC<PDFHandlerProps> = ({
         },
       });
       
+      // The index is built in the background; wait until the job finishes before
+      // loading, otherwise questions would be answered without the paper context
+      if (response.data.jobId) {
+        const result = await waitForIngestionJob(response.data.jobId);
+        if (result.outcome !== 'finished' || result.job.status === 'failed') {
+          if (result.outcome === 'missing') {
+            setErrorMessage('伺服器已找不到此檔案的處理工作，請重新上傳。');
+          } else if (result.outcome === 'timeout') {
+            setErrorMessage('檔案處理時間過長，請稍後重新上傳。');
+          } else {
+            setErrorMessage(`檔案處理失敗：${result.job.error ?? '未知錯誤'}`);
+          }
+          setShowErrorPopup(true);
+          return;
+        }
+      }
+
       if (response.data.status === 'exists') {
         setShowFileExistsPopup(true);
       } else {
@@ -157,7 +213,11 @@ const PDFHandler: React.FC<PDFHandlerProps> = ({
       }
     } catch (error) {
       console.error('Error uploading file:', error);
-      setErrorMessage('檔案上傳失敗，請再試一次。');
+      if (axios.isAxiosError(error) && error.response?.status === 409) {
+        setErrorMessage('同名檔案的先前版本仍在處理中，請稍後再試。');
+      } else {
+        setErrorMessage('檔案上傳失敗，請再試一次。');
+      }
       setShowErrorPopup(true);
     } finally {
       setIsUploading(false);